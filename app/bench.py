@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import argparse
+from datetime import date, datetime, timezone
+import json
+import multiprocessing
+from pathlib import Path
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable
+import urllib.request
+
+from .catalog import SongCatalog, load_catalog_entries
+from .config import Line, Timing
+from .dialer import DialController
+from .events import EventQueue
+from .history import HistoryProfile, generate_history
+from .line import PhoneLine
+from .scheduler import Scheduler
+from .stats import (
+    dashboard,
+    day_detail,
+    day_full,
+    list_calendar_for_month,
+    list_session_files,
+    top_songs_all_time,
+    top_songs_for_day,
+)
+from .stats import StatsRecorder
+from .watchdog import process_memory
+from .web import StatsWebServer
+from .webproc import WebProcess
+
+# Fixed so generated histories, and therefore reports, are comparable between runs.
+BENCH_END_DAY = date(2025, 6, 30)
+DIGIT_GAP_SEC = 0.05
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_call(fn: Callable[[], Any], repeat: int, warmup: int = 1) -> dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    # Peak memory is measured in a separate run so tracing does not skew latency.
+    tracemalloc.start()
+    try:
+        fn()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "runs": repeat,
+        "p50_ms": round(_percentile(samples, 50), 3),
+        "p90_ms": round(_percentile(samples, 90), 3),
+        "p99_ms": round(_percentile(samples, 99), 3),
+        "max_ms": round(max(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "peak_alloc_kb": round(peak / 1024, 1),
+    }
+
+
+def _http_get(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.read()
+
+
+def _latest_day(stats_dir: Path) -> date:
+    files = list_session_files(stats_dir)
+    if not files:
+        return datetime.now(timezone.utc).date()
+    return date.fromisoformat(files[-1].name[len("stats_") : len("stats_") + 10])
+
+
+def run_query_benchmarks(stats_dir: Path, repeat: int, day: date | None = None) -> dict[str, dict[str, float]]:
+    day = day or _latest_day(stats_dir)
+    day_text = day.isoformat()
+    cases: dict[str, Callable[[], Any]] = {
+        "list_calendar_for_month": lambda: list_calendar_for_month(stats_dir, day.year, day.month),
+        "day_detail": lambda: day_detail(stats_dir, day_text),
+        "top_songs_for_day": lambda: top_songs_for_day(stats_dir, day_text),
+        "top_songs_all_time": lambda: top_songs_all_time(stats_dir),
+        "day_full": lambda: day_full(stats_dir, day_text),
+        "dashboard": lambda: dashboard(stats_dir, day.year, day.month, day_text),
+    }
+    project_root = Path(__file__).resolve().parent.parent
+    catalog = SongCatalog(load_catalog_entries(project_root / "songs.txt", project_root / "media" / "songs"))
+    for query in ("sailor moon", "1992", "ca"):
+        cases[f"catalog_search {query}"] = lambda query=query: catalog.search(query)
+
+    web = StatsWebServer(
+        host="127.0.0.1",
+        port=0,
+        stats_dir=stats_dir,
+        get_live_snapshot=lambda: {"counters": {}},
+        refresh_seconds=2,
+        catalog=catalog,
+    )
+    web.start()
+    base = f"http://127.0.0.1:{web.address[1]}"
+    http_cases = {
+        "http /api/calendar": f"/api/calendar?year={day.year}&month={day.month}",
+        "http /api/day/<day>": f"/api/day/{day_text}",
+        "http /api/top/day/<day>": f"/api/top/day/{day_text}",
+        "http /api/top/all": "/api/top/all",
+        "http /api/live": "/api/live",
+        "http /api/day/<day>/full": f"/api/day/{day_text}/full",
+        "http /api/dashboard": f"/api/dashboard?year={day.year}&month={day.month}&day={day_text}",
+        "http /api/catalog/search": "/api/catalog/search?q=sailor",
+    }
+    for name, path in http_cases.items():
+        cases[name] = lambda url=base + path: _http_get(url)
+
+    results = {}
+    try:
+        for name, fn in cases.items():
+            results[name] = time_call(fn, repeat)
+    finally:
+        web.stop()
+    return results
+
+
+class _SilentPlayer:
+    # Player interface without audio, so the dial benchmark times only event handling.
+    def play_file(self, audio_file: Path, loop_count: int | None = None) -> None:
+        return None
+
+    def play_effect(self, audio_file: Path) -> None:
+        return None
+
+    def play_file_blocking(self, audio_file: Path) -> None:
+        return None
+
+    def play_sequence_blocking(self, files: list[Path]) -> None:
+        return None
+
+    def stop(self) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
+
+
+def _http_load(base: str, paths: list[str], clients: int, duration_sec: float, result: Any) -> None:
+    # Runs in its own process so the load generator does not compete for the measured interpreter.
+    deadline = time.monotonic() + duration_sec
+    counts = [0] * clients
+
+    def client(index: int) -> None:
+        i = index
+        while time.monotonic() < deadline:
+            try:
+                _http_get(base + paths[i % len(paths)])
+                counts[index] += 1
+            except OSError:
+                time.sleep(0.05)
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.put(sum(counts))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_http(url: str, timeout_sec: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout_sec
+    while True:
+        try:
+            _http_get(url)
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _replay_dial(line: PhoneLine, duration_sec: float, rng: random.Random) -> list[float]:
+    # Hook lifted, three digits from the GPIO callbacks, hook replaced; measures each digit
+    # from the end of its pulse train until the line worker has handled it.
+    samples = []
+    deadline = time.monotonic() + duration_sec
+    while time.monotonic() < deadline:
+        line.events.put("hook_on")
+        for _ in range(3):
+            line.on_rotary_start()
+            for _ in range(rng.randint(1, 10)):
+                line.pulses.pulse()
+            handled = threading.Event()
+            started = time.perf_counter()
+            line.on_rotary_stop()
+            line.events.put("call", handled.set)
+            if handled.wait(10):
+                samples.append((time.perf_counter() - started) * 1000)
+            time.sleep(DIGIT_GAP_SEC)
+        line.events.put("hook_off")
+    # Let already dispatched song starts run before the recorder is closed.
+    drained = threading.Event()
+    line.events.put("call", drained.set)
+    drained.wait(10)
+    return samples
+
+
+def run_dial_benchmark(
+    stats_dir: Path,
+    duration_sec: float,
+    clients: int = 4,
+    day: date | None = None,
+) -> dict[str, dict[str, float]]:
+    day = day or _latest_day(stats_dir)
+    paths = ["/api/top/all", f"/api/dashboard?year={day.year}&month={day.month}&day={day.isoformat()}"]
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for mode in ("idle", "thread", "process"):
+        with tempfile.TemporaryDirectory(prefix="marrabbio-dial-") as tmp:
+            stats = StatsRecorder(Path(tmp))
+            scheduler = Scheduler()
+            scheduler.start()
+            events = EventQueue()
+            player = _SilentPlayer()
+            dial = DialController(
+                player=player,
+                songs_by_code={},
+                fallback_song_file=Path(tmp) / "fallback.mp3",
+                digit_audio_dir=Path(tmp),
+                media_dir=Path(tmp),
+                dial_tone_file=Path(tmp) / "dial.mp3",
+                timing=Timing(play_song_delay_sec=DIGIT_GAP_SEC),
+                stats=stats,
+                scheduler=scheduler,
+                dispatch=lambda fn: events.put("call", fn),
+            )
+            line = PhoneLine(Line(), player, dial, events)
+            line.start()
+
+            web: StatsWebServer | WebProcess | None = None
+            port = _free_port()
+            if mode == "thread":
+                web = StatsWebServer("127.0.0.1", port, stats_dir, stats.snapshot, 2)
+            elif mode == "process":
+                web = WebProcess("127.0.0.1", port, stats_dir, stats.snapshot, 2)
+            load = None
+            queue = context.Queue()
+            try:
+                if web is not None:
+                    web.start()
+                    _wait_http(f"http://127.0.0.1:{port}/api/live")
+                    load = context.Process(
+                        target=_http_load,
+                        args=(f"http://127.0.0.1:{port}", paths, clients, duration_sec, queue),
+                    )
+                    load.start()
+                samples = _replay_dial(line, duration_sec, random.Random(1))
+                requests = queue.get(timeout=60) if load is not None else 0
+            finally:
+                if load is not None:
+                    load.join(timeout=10)
+                if web is not None:
+                    web.stop()
+                line.stop()
+                scheduler.stop()
+                stats.close()
+
+        results[f"dial {mode}"] = {
+            "digits": len(samples),
+            "http_requests": requests,
+            "p50_ms": round(_percentile(samples, 50), 3),
+            "p90_ms": round(_percentile(samples, 90), 3),
+            "p99_ms": round(_percentile(samples, 99), 3),
+            "max_ms": round(max(samples, default=0.0), 3),
+        }
+    return results
+
+
+def _as_text(report: dict[str, Any]) -> str:
+    # One "case metric value" row per line, stable order, easy to diff between releases.
+    rows = [f"# {key} {report[key]}" for key in sorted(report) if key != "results"]
+    for case in sorted(report["results"]):
+        for metric, value in sorted(report["results"][case].items()):
+            rows.append(f"{case.replace(' ', '_')} {metric} {value}")
+    return "\n".join(rows) + "\n"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Marrabbio dashboard queries")
+    parser.add_argument("--stats-dir", type=Path, help="existing stats directory (default: generate one)")
+    parser.add_argument("--days", type=int, default=365, help="days of synthetic history to generate")
+    parser.add_argument("--sessions-per-day", type=int, default=1)
+    parser.add_argument("--songs-per-hour", type=float, default=20.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--dial-seconds", type=float, default=0.0, help="replay dial traffic under HTTP load per web mode")
+    parser.add_argument("--http-clients", type=int, default=4, help="concurrent dashboard clients during the dial replay")
+    parser.add_argument("--format", choices=("json", "text"), default="json")
+    parser.add_argument("--out", type=Path, help="write the report to a file instead of stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="marrabbio-bench-") as tmp:
+        stats_dir = args.stats_dir
+        if stats_dir is None:
+            stats_dir = Path(tmp) / "stats"
+            profile = HistoryProfile(
+                days=args.days,
+                end_day=BENCH_END_DAY,
+                sessions_per_day=args.sessions_per_day,
+                songs_per_hour=args.songs_per_hour,
+            )
+            generate_history(stats_dir, Path(__file__).resolve().parent.parent / "songs.txt", profile)
+
+        files = list_session_files(stats_dir)
+        report = {
+            "python": sys.version.split()[0],
+            "session_files": len(files),
+            "stats_bytes": sum(p.stat().st_size for p in files),
+            "results": run_query_benchmarks(stats_dir, args.repeat),
+        }
+        if args.dial_seconds > 0:
+            report["results"].update(run_dial_benchmark(stats_dir, args.dial_seconds, args.http_clients))
+        report["memory"] = process_memory()
+
+    text = json.dumps(report, indent=2, sort_keys=True) + "\n" if args.format == "json" else _as_text(report)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
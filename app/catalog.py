@@ -1,11 +1,42 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from pathlib import Path
 import logging
+import re
+import unicodedata
+from typing import Any
 
+MAX_SEARCH_LIMIT = 100
+_YEAR = re.compile(r"\s*\((\d{4})\)")
+_NON_WORD = re.compile(r"[\W_]+")
 
-def load_song_catalog(songs_file: Path, songs_dir: Path) -> dict[str, Path]:
-    songs: dict[str, Path] = {}
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    code: str
+    title: str
+    year: int | None
+    path: Path
+
+    @property
+    def name(self) -> str:
+        # The name the song is known by in songs.txt, file names and stats events.
+        return self.path.stem
+
+
+def _parse_entry(code: str, song_name: str, songs_dir: Path) -> CatalogEntry:
+    # "Title (1992)", also "Title (2002) (ITA - INTERROTTA)": the last (YYYY) is the year.
+    matches = list(_YEAR.finditer(song_name))
+    if not matches:
+        return CatalogEntry(code, song_name, None, songs_dir / f"{song_name}.mp3")
+    year = matches[-1]
+    title = (song_name[: year.start()] + song_name[year.end() :]).strip()
+    return CatalogEntry(code, title, int(year.group(1)), songs_dir / f"{song_name}.mp3")
+
+
+def load_catalog_entries(songs_file: Path, songs_dir: Path) -> list[CatalogEntry]:
+    entries: list[CatalogEntry] = []
     with songs_file.open("r", encoding="utf-8") as f:
         for line_no, raw_line in enumerate(f, start=1):
             line = raw_line.strip()
@@ -19,8 +50,114 @@ def load_song_catalog(songs_file: Path, songs_dir: Path) -> dict[str, Path]:
 
             song_code = parts[0]
             song_name = " ".join(parts[1:])
-            songs[song_code] = songs_dir / f"{song_name}.mp3"
+            entries.append(_parse_entry(song_code, song_name, songs_dir))
+    return entries
+
 
+def load_song_catalog(songs_file: Path, songs_dir: Path) -> dict[str, Path]:
+    songs = {entry.code: entry.path for entry in load_catalog_entries(songs_file, songs_dir)}
     logging.info("Loaded %s songs from %s", len(songs), songs_file)
     return songs
 
+
+def _normalize(text: str) -> str:
+    # Case and accent insensitive, punctuation folded to single spaces.
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", stripped).strip()
+
+
+def _trigrams(token: str) -> set[str]:
+    return {token[i : i + 3] for i in range(len(token) - 2)}
+
+
+class SongCatalog:
+    # Read-only catalog with a trigram index over title, year and code.
+    def __init__(self, entries: list[CatalogEntry]) -> None:
+        self.entries = tuple(entries)
+        self._by_code = {entry.code: entry for entry in self.entries}
+        self._texts: list[str] = []
+        self._words: list[tuple[str, ...]] = []
+        self._grams: dict[str, set[int]] = {}
+        # Tokens shorter than a trigram are matched as word prefixes.
+        self._prefixes: dict[str, set[int]] = {}
+        for i, entry in enumerate(self.entries):
+            text = _normalize(f"{entry.title} {entry.year or ''} {entry.code}")
+            words = tuple(text.split())
+            self._texts.append(text)
+            self._words.append(words)
+            for word in words:
+                for gram in _trigrams(word):
+                    self._grams.setdefault(gram, set()).add(i)
+                for size in (1, 2):
+                    if len(word) >= size:
+                        self._prefixes.setdefault(word[:size], set()).add(i)
+        self._browse_order = sorted(range(len(self.entries)), key=lambda i: self.entries[i].code)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, code: str) -> CatalogEntry | None:
+        return self._by_code.get(code)
+
+    def _candidates(self, token: str) -> set[int]:
+        if len(token) < 3:
+            return self._prefixes.get(token, set())
+        postings = [self._grams.get(gram, set()) for gram in _trigrams(token)]
+        candidates = set.intersection(*sorted(postings, key=len))
+        # Trigrams may come from different words, confirm the token really occurs.
+        return {i for i in candidates if any(token in word for word in self._words[i])}
+
+    def _score(self, i: int, tokens: list[str], query: str) -> int:
+        entry = self.entries[i]
+        words = self._words[i]
+        score = 100 if entry.code == query else 0
+        if self._texts[i].startswith(query):
+            score += 10
+        for token in tokens:
+            if token in words:
+                score += 3
+            elif any(word.startswith(token) for word in words):
+                score += 2
+            else:
+                score += 1
+        return score
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> tuple[int, list[CatalogEntry]]:
+        offset = max(0, offset)
+        limit = max(1, min(MAX_SEARCH_LIMIT, limit))
+        normalized = _normalize(query)
+        tokens = normalized.split()
+        if not tokens:
+            order = self._browse_order
+        else:
+            matches = self._candidates(tokens[0])
+            for token in tokens[1:]:
+                if not matches:
+                    break
+                matches = matches & self._candidates(token)
+            scored = [(-self._score(i, tokens, normalized), self._texts[i], i) for i in matches]
+            order = [i for _score, _text, i in sorted(scored)]
+        return len(order), [self.entries[i] for i in order[offset : offset + limit]]
+
+    def search_page(
+        self,
+        query: str,
+        offset: int = 0,
+        limit: int = 20,
+        play_counts: dict[str, int] | None = None,
+    ) -> dict[str, Any]:
+        offset = max(0, offset)
+        limit = max(1, min(MAX_SEARCH_LIMIT, limit))
+        total, entries = self.search(query, offset, limit)
+        counts = play_counts or {}
+        return {
+            "q": query,
+            "offset": offset,
+            "limit": limit,
+            "total": total,
+            "next_offset": offset + limit if offset + limit < total else None,
+            "items": [
+                {"code": e.code, "title": e.title, "year": e.year, "count": counts.get(e.code, 0)} for e in entries
+            ],
+        }
@@ -35,6 +35,12 @@ class Web:
     host: str = "0.0.0.0"
     port: int = 80
     refresh_seconds: int = 2
+    mode: str = "device"
+    ingest_token: str = ""
+    process: bool = False
+    snapshot_interval_sec: float = 0.5
+    max_media_streams: int = 2
+    trace_allocations: bool = False
 
 
 @dataclass(frozen=True)
@@ -42,6 +48,53 @@ class Runtime:
     gpio_enabled: bool = True
 
 
+@dataclass(frozen=True)
+class Audio:
+    backend: str = "mpg123"
+    sink: str = "alsa"
+    device: str = ""
+    sample_rate: int = 44100
+    channels: int = 2
+    wav_file: str = ""
+
+
+@dataclass(frozen=True)
+class Events:
+    queue_size: int = 64
+    overflow: str = "drop_oldest"
+
+
+@dataclass(frozen=True)
+class Uplink:
+    enabled: bool = False
+    url: str = ""
+    device_id: str = ""
+    token: str = ""
+    interval_sec: float = 30.0
+    batch_max_bytes: int = 256 * 1024
+
+
+@dataclass(frozen=True)
+class Watchdog:
+    enabled: bool = True
+    stall_timeout_sec: float = 15.0
+    check_interval_sec: float = 1.0
+
+
+@dataclass(frozen=True)
+class Jukebox:
+    enabled: bool = False
+    max_queue: int = 10
+    prebuffer_sec: float = 10.0
+
+
+@dataclass(frozen=True)
+class Line:
+    id: str = "main"
+    pins: Pins = Pins()
+    audio_device: str = ""
+
+
 @dataclass(frozen=True)
 class AppConfig:
     pins: Pins
@@ -50,6 +103,12 @@ class AppConfig:
     logging: Logging
     web: Web
     runtime: Runtime
+    audio: Audio
+    events: Events
+    lines: tuple[Line, ...]
+    uplink: Uplink
+    watchdog: Watchdog
+    jukebox: Jukebox
 
 
 def _load_toml(path: str) -> dict:
@@ -71,6 +130,32 @@ def _as_bool(value: object, default: bool = True) -> bool:
     return text in ("1", "true", "yes", "on")
 
 
+def _load_lines(lines_data: object, default_pins: Pins, default_device: str) -> tuple[Line, ...]:
+    if not isinstance(lines_data, list) or not lines_data:
+        return (Line(id="main", pins=default_pins, audio_device=default_device),)
+
+    lines = []
+    for index, line_data in enumerate(lines_data, start=1):
+        if not isinstance(line_data, dict):
+            continue
+        pins_data = line_data.get("pins", {})
+        line_id = str(line_data.get("id", f"line{index}")).strip() or f"line{index}"
+        if any(line.id == line_id for line in lines):
+            raise ValueError(f"Duplicate line id in config: {line_id}")
+        lines.append(
+            Line(
+                id=line_id,
+                pins=Pins(
+                    rotary_enable=int(pins_data.get("rotary_enable", default_pins.rotary_enable)),
+                    rotary_pulse=int(pins_data.get("rotary_pulse", default_pins.rotary_pulse)),
+                    hook=int(pins_data.get("hook", default_pins.hook)),
+                ),
+                audio_device=str(line_data.get("audio_device", default_device)),
+            )
+        )
+    return tuple(lines)
+
+
 def load_config(project_root) -> AppConfig:
     from pathlib import Path
 
@@ -83,6 +168,11 @@ def load_config(project_root) -> AppConfig:
     logging_data = data.get("logging", {})
     web_data = data.get("web", {})
     runtime_data = data.get("runtime", {})
+    audio_data = data.get("audio", {})
+    events_data = data.get("events", {})
+    uplink_data = data.get("uplink", {})
+    watchdog_data = data.get("watchdog", {})
+    jukebox_data = data.get("jukebox", {})
 
     pins = Pins(
         rotary_enable=int(pins_data.get("rotary_enable", 5)),
@@ -106,7 +196,57 @@ def load_config(project_root) -> AppConfig:
         host=str(web_data.get("host", "0.0.0.0")),
         port=int(web_data.get("port", 80)),
         refresh_seconds=int(web_data.get("refresh_seconds", 2)),
+        mode=str(web_data.get("mode", "device")).lower(),
+        ingest_token=str(web_data.get("ingest_token", "")),
+        process=_as_bool(web_data.get("process", False), default=False),
+        snapshot_interval_sec=float(web_data.get("snapshot_interval_sec", 0.5)),
+        max_media_streams=max(1, int(web_data.get("max_media_streams", 2))),
+        trace_allocations=_as_bool(web_data.get("trace_allocations", False), default=False),
     )
     runtime = Runtime(gpio_enabled=_as_bool(runtime_data.get("gpio_enabled", True), default=True))
+    audio = Audio(
+        backend=str(audio_data.get("backend", "mpg123")).lower(),
+        sink=str(audio_data.get("sink", "alsa")).lower(),
+        device=str(audio_data.get("device", "")),
+        sample_rate=int(audio_data.get("sample_rate", 44100)),
+        channels=int(audio_data.get("channels", 2)),
+        wav_file=str(audio_data.get("wav_file", "")),
+    )
+    events = Events(
+        queue_size=int(events_data.get("queue_size", 64)),
+        overflow=str(events_data.get("overflow", "drop_oldest")).lower(),
+    )
+    lines = _load_lines(data.get("lines"), pins, audio.device)
+    uplink = Uplink(
+        enabled=_as_bool(uplink_data.get("enabled", False), default=False),
+        url=str(uplink_data.get("url", "")),
+        device_id=str(uplink_data.get("device_id", "")),
+        token=str(uplink_data.get("token", "")),
+        interval_sec=float(uplink_data.get("interval_sec", 30.0)),
+        batch_max_bytes=int(uplink_data.get("batch_max_bytes", 256 * 1024)),
+    )
+    watchdog = Watchdog(
+        enabled=_as_bool(watchdog_data.get("enabled", True), default=True),
+        stall_timeout_sec=float(watchdog_data.get("stall_timeout_sec", 15.0)),
+        check_interval_sec=float(watchdog_data.get("check_interval_sec", 1.0)),
+    )
+    jukebox = Jukebox(
+        enabled=_as_bool(jukebox_data.get("enabled", False), default=False),
+        max_queue=max(1, int(jukebox_data.get("max_queue", 10))),
+        prebuffer_sec=max(0.0, float(jukebox_data.get("prebuffer_sec", 10.0))),
+    )
 
-    return AppConfig(pins=pins, debounce=debounce, timing=timing, logging=logging_cfg, web=web, runtime=runtime)
+    return AppConfig(
+        pins=pins,
+        debounce=debounce,
+        timing=timing,
+        logging=logging_cfg,
+        web=web,
+        runtime=runtime,
+        audio=audio,
+        events=events,
+        lines=lines,
+        uplink=uplink,
+        watchdog=watchdog,
+        jukebox=jukebox,
+    )
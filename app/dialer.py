@@ -7,10 +7,16 @@ import socket
 import subprocess
 import threading
 from pathlib import Path
+from typing import Callable
 
 from .config import Timing
-from .player import AudioPlayer
-from .stats import StatsRecorder
+from .player import AudioPlayer, MixerAudioPlayer
+from .scheduler import ScheduledCall, Scheduler
+from .stats import LineStats, StatsRecorder
+
+# Watchdog grace for the IP announcement and the reboot/shutdown codes, which block
+# the line worker for longer than a normal stall timeout.
+BLOCKING_CALL_GRACE_SEC = 60.0
 
 
 class DialState(Enum):
@@ -22,7 +28,6 @@ class DialState(Enum):
 
 @dataclass
 class DialContext:
-    pulses: int = 0
     typed_number: str = ""
 
 
@@ -35,14 +40,18 @@ class DialController:
 
     def __init__(
         self,
-        player: AudioPlayer,
+        player: AudioPlayer | MixerAudioPlayer,
         songs_by_code: dict[str, Path],
         fallback_song_file: Path,
         digit_audio_dir: Path,
         media_dir: Path,
         dial_tone_file: Path,
         timing: Timing,
-        stats: StatsRecorder,
+        stats: StatsRecorder | LineStats,
+        scheduler: Scheduler,
+        dispatch: Callable[[Callable[[], None]], None] | None = None,
+        jukebox: bool = False,
+        expect_block: Callable[[float], None] | None = None,
     ) -> None:
         self._player = player
         self._songs = songs_by_code
@@ -52,16 +61,27 @@ class DialController:
         self._dial_tone_file = dial_tone_file
         self._timing = timing
         self._stats = stats
+        self._scheduler = scheduler
+        # Delayed work is handed back to the owner's worker so it never blocks the scheduler.
+        self._dispatch = dispatch or (lambda fn: fn())
+        # Jukebox mode: codes dialed during playback are queued instead of replacing the song.
+        self._jukebox = jukebox
+        # Tells the watchdog before the few calls that block this worker on purpose.
+        self._expect_block = expect_block or (lambda _seconds: None)
 
         self._state = DialState.IDLE
         self._ctx = DialContext()
         self._lock = threading.Lock()
-        self._pending_song_timer: threading.Timer | None = None
+        self._pending_song_call: ScheduledCall | None = None
+
+    @property
+    def state(self) -> DialState:
+        return self._state
 
     def _cancel_pending_song_timer(self) -> None:
-        if self._pending_song_timer is not None:
-            self._pending_song_timer.cancel()
-            self._pending_song_timer = None
+        if self._pending_song_call is not None:
+            self._pending_song_call.cancel()
+            self._pending_song_call = None
 
     def on_hook_lifted(self) -> None:
         with self._lock:
@@ -82,27 +102,20 @@ class DialController:
     def on_rotary_engaged(self) -> None:
         with self._lock:
             if self._state in (DialState.OFF_HOOK, DialState.PLAYING):
-                if self._state == DialState.PLAYING:
+                if self._state == DialState.PLAYING and self._jukebox:
+                    logging.info("Dial started during playback: next code will be queued")
+                elif self._state == DialState.PLAYING:
                     logging.info("Dial started during playback: auto-reset current song")
                     self._cancel_pending_song_timer()
                     self._player.stop()
                 self._state = DialState.DIALING
-                self._ctx.pulses = 0
                 logging.info("Rotary engaged")
 
-    def on_rotary_pulse(self) -> None:
-        with self._lock:
-            if self._state == DialState.DIALING:
-                self._ctx.pulses += 1
-                logging.debug("Pulse %s", self._ctx.pulses)
-
-    def on_rotary_released(self) -> None:
+    def on_rotary_released(self, pulses: int) -> None:
+        # Pulses are counted at the GPIO edge and delivered once per digit.
         with self._lock:
             if self._state != DialState.DIALING:
                 return
-
-            pulses = self._ctx.pulses
-            self._ctx.pulses = 0
             self._state = DialState.OFF_HOOK
 
         digit = self._digit_from_pulses(pulses)
@@ -119,26 +132,37 @@ class DialController:
             completed = self._is_code_complete(number)
             if completed:
                 self._state = DialState.PLAYING
+                if self._jukebox:
+                    # The code is kept by the scheduled call, the next one starts from scratch.
+                    self._ctx = DialContext()
+            over_song = self._jukebox and self._player.queue_snapshot()["playing"] is not None
 
-        self._play_digit_feedback(digit)
+        if not over_song or self._player.overlays_effects:
+            self._play_digit_feedback(digit)
 
         if completed:
-            timer = threading.Timer(self._timing.play_song_delay_sec, self._play_selected_song, args=(number,))
             with self._lock:
-                self._pending_song_timer = timer
-            timer.start()
+                self._pending_song_call = self._scheduler.call_later(
+                    self._timing.play_song_delay_sec,
+                    self._dispatch,
+                    lambda: self._play_selected_song(number),
+                )
 
     def _play_digit_feedback(self, digit: str) -> None:
         digit_file = self._digit_audio_dir / f"{digit}.mp3"
-        self._player.play_file(digit_file)
+        self._player.play_effect(digit_file)
 
     def _play_selected_song(self, code: str) -> None:
         with self._lock:
-            self._pending_song_timer = None
-            if self._state != DialState.PLAYING:
+            self._pending_song_call = None
+            if self._jukebox:
+                # The next code may already be half dialed: only hanging up cancels.
+                if self._state == DialState.IDLE:
+                    return
+            elif self._state != DialState.PLAYING:
                 return
-            self._state = DialState.PLAYING
-            self._ctx = DialContext()
+            else:
+                self._ctx = DialContext()
 
         if code == self.CODE_IP:
             self._play_ip_address()
@@ -151,6 +175,9 @@ class DialController:
             return
 
         song_file = self._songs.get(code, self._fallback_song_file)
+        if self._jukebox:
+            self._queue_song(code, song_file)
+            return
         if song_file == self._fallback_song_file:
             logging.warning("Song code not found: %s, using fallback", code)
             self._stats.record_song_started(code=code, found=False, title=self._fallback_song_file.stem)
@@ -161,6 +188,30 @@ class DialController:
             self._stats.record_error("missing_song_file", str(song_file))
         self._player.play_file(song_file)
 
+    def _queue_song(self, code: str, song_file: Path) -> None:
+        found = song_file != self._fallback_song_file
+        if not found:
+            logging.warning("Song code not found: %s, queueing fallback", code)
+        if not song_file.exists():
+            self._stats.record_error("missing_song_file", str(song_file))
+            if not self._fallback_song_file.exists():
+                self._stats.record_song_started(code=code, found=False, title=self._fallback_song_file.stem)
+                return
+            logging.warning("Song file missing for code %s, queueing fallback", code)
+            song_file = self._fallback_song_file
+            found = False
+
+        def started() -> None:
+            # Runs on the audio thread: hand the stats write back to the line worker.
+            self._dispatch(lambda: self._stats.record_song_started(code=code, found=found, title=song_file.stem))
+
+        position = self._player.enqueue(song_file, on_start=started)
+        if position is None:
+            logging.warning("Jukebox queue full, dropped code %s", code)
+            self._stats.record_error("jukebox_queue_full", code)
+        elif position > 0:
+            logging.info("Queued song code %s at position %s", code, position)
+
     @staticmethod
     def _digit_from_pulses(pulses: int) -> str | None:
         if pulses == 10:
@@ -189,10 +240,12 @@ class DialController:
             if i < len(octets) - 1:
                 sequence.append(point)
 
+        self._expect_block(BLOCKING_CALL_GRACE_SEC)
         self._player.play_sequence_blocking(sequence)
         logging.info("Announced IP address: %s", ip)
 
     def _play_and_system_action(self, audio_name: str, command: list[str], action_name: str) -> None:
+        self._expect_block(BLOCKING_CALL_GRACE_SEC)
         self._player.play_file_blocking(self._media_dir / audio_name)
         logging.info("Running system action: %s", action_name)
         if self._run_system_command(command):
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+import threading
+from typing import Any
+
+from .stats import _files_for_month, _parse_ts_to_day, _session_name
+
+INDEX_DIR = ".index"
+INDEX_VERSION = 1
+MAX_LINE_BYTES = 64 * 1024
+MAX_PAGE_SIZE = 200
+
+
+class EventIndex:
+    # Sidecar index of byte offsets per (session file, day, event type).
+    # Session files are append-only, so an index is extended from its last indexed byte.
+    def __init__(self, stats_dir: Path) -> None:
+        self._stats_dir = stats_dir
+        self._index_dir = stats_dir / INDEX_DIR
+        self._lock = threading.Lock()
+        self._cache: dict[str, dict[str, Any]] = {}
+
+    def _sidecar_path(self, path: Path) -> Path:
+        name = _session_name(self._stats_dir, path).replace("/", "__")
+        return self._index_dir / f"{name}.idx.json"
+
+    def _load_sidecar(self, path: Path) -> dict[str, Any] | None:
+        try:
+            data = json.loads(self._sidecar_path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return None
+        return data
+
+    def _save_sidecar(self, path: Path, index: dict[str, Any]) -> None:
+        target = self._sidecar_path(path)
+        tmp = target.with_suffix(".tmp")
+        try:
+            self._index_dir.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(index, separators=(",", ":")), encoding="utf-8")
+            tmp.replace(target)
+        except OSError as exc:
+            # Read-only stats storage: keep the index in memory only.
+            logging.debug("Cannot write event index %s: %s", target, exc)
+
+    @staticmethod
+    def _extend(path: Path, index: dict[str, Any]) -> bool:
+        days: dict[str, dict[str, list[int]]] = index["days"]
+        changed = False
+        with path.open("rb") as fh:
+            fh.seek(index["size"])
+            offset = index["size"]
+            for raw in fh:
+                if not raw.endswith(b"\n"):
+                    # Entry still being written, index it on the next call.
+                    break
+                line_offset = offset
+                offset += len(raw)
+                changed = True
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                if not isinstance(entry, dict):
+                    continue
+                day = _parse_ts_to_day(str(entry.get("ts", "")))
+                if not day:
+                    continue
+                days.setdefault(day, {}).setdefault(str(entry.get("event", "")), []).append(line_offset)
+        index["size"] = offset
+        return changed
+
+    def file_index(self, path: Path) -> dict[str, Any]:
+        key = _session_name(self._stats_dir, path)
+        size = path.stat().st_size
+        with self._lock:
+            index = self._cache.get(key)
+            if index is None:
+                index = self._load_sidecar(path)
+            if index is None or index["size"] > size:
+                index = {"version": INDEX_VERSION, "size": 0, "days": {}}
+            if index["size"] < size and self._extend(path, index):
+                self._save_sidecar(path, index)
+            self._cache[key] = index
+            return index
+
+    def events_for_day(
+        self,
+        day: str,
+        offset: int = 0,
+        limit: int = 50,
+        event_types: set[str] | None = None,
+    ) -> dict[str, Any]:
+        offset = max(0, offset)
+        limit = max(1, min(MAX_PAGE_SIZE, limit))
+        result: dict[str, Any] = {
+            "day": day,
+            "types": sorted(event_types) if event_types else [],
+            "offset": offset,
+            "limit": limit,
+            "total": 0,
+            "next_offset": None,
+            "items": [],
+        }
+        try:
+            y, m, _d = [int(x) for x in day.split("-")]
+        except ValueError:
+            return result
+
+        groups: list[tuple[Path, list[int]]] = []
+        for path in _files_for_month(self._stats_dir, y, m):
+            try:
+                per_type = self.file_index(path)["days"].get(day, {})
+            except OSError:
+                continue
+            offsets = [o for event, values in per_type.items() if not event_types or event in event_types for o in values]
+            if offsets:
+                groups.append((path, sorted(offsets)))
+
+        total = sum(len(offsets) for _path, offsets in groups)
+        result["total"] = total
+        skip = offset
+        items = result["items"]
+        for path, offsets in groups:
+            if skip >= len(offsets):
+                skip -= len(offsets)
+                continue
+            page = offsets[skip : skip + limit - len(items)]
+            skip = 0
+            session = _session_name(self._stats_dir, path)
+            try:
+                with path.open("rb") as fh:
+                    for line_offset in page:
+                        fh.seek(line_offset)
+                        raw = fh.readline(MAX_LINE_BYTES)
+                        try:
+                            entry = json.loads(raw)
+                        except ValueError:
+                            continue
+                        items.append({"session": session, **entry})
+            except OSError:
+                continue
+            if len(items) >= limit:
+                break
+        if offset + limit < total:
+            result["next_offset"] = offset + limit
+        return result
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from collections import deque
+import itertools
+import logging
+import threading
+import time
+from typing import Any
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+
+
+class PulseCounter:
+    # next() on itertools.count is atomic under the GIL, so edge callbacks never lock.
+    def __init__(self) -> None:
+        self._counter = itertools.count(1)
+        self._last = 0
+        self._base = 0
+
+    def pulse(self) -> None:
+        self._last = next(self._counter)
+
+    def reset(self) -> None:
+        self._base = self._last
+
+    def take(self) -> int:
+        last = self._last
+        pulses = last - self._base
+        self._base = last
+        return pulses
+
+
+class EventQueue:
+    def __init__(self, maxsize: int = 64, overflow: str = OVERFLOW_DROP_OLDEST) -> None:
+        self._maxsize = max(1, maxsize)
+        self._overflow = overflow
+        self._items: deque[tuple[str, float, Any]] = deque()
+        self._cond = threading.Condition()
+        self._enqueued = 0
+        self._dequeued = 0
+        self._dropped = 0
+        # Items taken off the front, dequeued or dropped: a probe runs once the ones ahead of it are gone.
+        self._removed = 0
+        self._probe: tuple[float, Any] | None = None
+        self._probe_mark = 0
+        self._max_depth = 0
+        self._last_age = 0.0
+        self._max_age = 0.0
+        self._avg_age = 0.0
+
+    def put(self, name: str, value: Any = None) -> bool:
+        item = (name, time.monotonic(), value)
+        with self._cond:
+            if len(self._items) >= self._maxsize:
+                self._dropped += 1
+                if self._overflow == OVERFLOW_DROP_NEWEST:
+                    logging.warning("Event queue full, dropped %s", name)
+                    return False
+                dropped = self._items.popleft()
+                self._removed += 1
+                logging.warning("Event queue full, dropped %s", dropped[0])
+            self._items.append(item)
+            self._enqueued += 1
+            self._max_depth = max(self._max_depth, len(self._items))
+            self._cond.notify()
+        return True
+
+    def probe(self, fn: Any) -> None:
+        # Runs fn as a "call" behind the items queued now, without taking a slot or
+        # counting in the metrics: the watchdog measures loop lag with it.
+        with self._cond:
+            self._probe = (time.monotonic(), fn)
+            self._probe_mark = self._removed + len(self._items)
+            self._cond.notify()
+
+    def get(self, timeout: float | None = None) -> tuple[str, float, Any] | None:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._probe is not None, timeout):
+                return None
+            if self._probe is not None and self._removed >= self._probe_mark:
+                (sent_at, fn), self._probe = self._probe, None
+                return ("call", sent_at, fn)
+            item = self._items.popleft()
+            self._removed += 1
+            self._dequeued += 1
+            age = time.monotonic() - item[1]
+            self._last_age = age
+            self._max_age = max(self._max_age, age)
+            self._avg_age = age if self._dequeued == 1 else self._avg_age * 0.9 + age * 0.1
+        return item
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "capacity": self._maxsize,
+                "overflow": self._overflow,
+                "enqueued_total": self._enqueued,
+                "dequeued_total": self._dequeued,
+                "dropped_total": self._dropped,
+                "max_depth": self._max_depth,
+                "last_age_ms": round(self._last_age * 1000, 3),
+                "avg_age_ms": round(self._avg_age * 1000, 3),
+                "max_age_ms": round(self._max_age * 1000, 3),
+            }
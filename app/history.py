@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+import json
+from pathlib import Path
+import random
+
+from .catalog import load_catalog_entries
+from .stats import DEFAULT_LINE_ID
+
+ERROR_KINDS = ("missing_song_file", "invalid_pulse_group", "system_action_failed")
+FALLBACK_TITLE = "Utaimashou"
+# Regular sessions start between 09:00 and 22:00, month boundary ones at 22:00.
+FIRST_START_SEC = 9 * 3600
+START_WINDOW_SEC = 13 * 3600
+
+
+@dataclass(frozen=True)
+class HistoryProfile:
+    days: int = 30
+    end_day: date | None = None
+    sessions_per_day: int = 1
+    session_hours: float = 6.0
+    songs_per_hour: float = 20.0
+    error_ratio: float = 0.02
+    fallback_ratio: float = 0.05
+    corrupted_ratio: float = 0.001
+    month_boundary_sessions: bool = True
+    lines: tuple[str, ...] = (DEFAULT_LINE_ID,)
+    seed: int = 1
+
+
+def _dump(ts: datetime, event: str, data: dict) -> str:
+    entry = {"ts": ts.isoformat(timespec="seconds"), "event": event, "data": data}
+    return json.dumps(entry, ensure_ascii=True, separators=(",", ":")) + "\n"
+
+
+def _write_session(
+    out_dir: Path,
+    start: datetime,
+    hours: float,
+    profile: HistoryProfile,
+    titles: dict[str, str],
+    codes: list[str],
+    unknown_codes: list[str],
+    rng: random.Random,
+) -> int:
+    path = out_dir / f"stats_{start.strftime('%Y-%m-%d_%H-%M-%S')}.txt"
+    end = start + timedelta(hours=hours)
+    lines = [_dump(start, "session_started", {})]
+    ts = start
+    mean_gap = 3600.0 / max(0.01, profile.songs_per_hour)
+    while True:
+        ts += timedelta(seconds=rng.expovariate(1.0 / mean_gap))
+        if ts >= end:
+            break
+        line_id = rng.choice(profile.lines)
+        roll = rng.random()
+        if roll < profile.error_ratio:
+            kind = rng.choice(ERROR_KINDS)
+            lines.append(_dump(ts, "error", {"error": kind, "details": f"synthetic {kind}", "line": line_id}))
+        elif roll < profile.error_ratio + profile.fallback_ratio and unknown_codes:
+            code = rng.choice(unknown_codes)
+            lines.append(_dump(ts, "song_started", {"code": code, "found": False, "title": FALLBACK_TITLE, "line": line_id}))
+        else:
+            # Popularity is skewed so top-song rankings look like real use.
+            code = codes[min(len(codes) - 1, int(rng.paretovariate(1.2)) - 1)]
+            lines.append(_dump(ts, "song_started", {"code": code, "found": True, "title": titles[code], "line": line_id}))
+        if rng.random() < profile.corrupted_ratio:
+            good = lines[-1]
+            lines.append(good[: rng.randint(1, len(good) - 2)] + "\n")
+    lines.append(_dump(end, "session_stopped", {}))
+
+    with path.open("w", encoding="utf-8") as fh:
+        fh.writelines(lines)
+    return len(lines)
+
+
+def generate_history(out_dir: Path, songs_file: Path, profile: HistoryProfile) -> dict[str, int]:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(profile.seed)
+    # Titles as the dialer records them: the song file name without extension.
+    titles = {entry.code: entry.name for entry in load_catalog_entries(songs_file, songs_file.parent)}
+    codes = list(titles)
+    rng.shuffle(codes)
+    # Fallback plays are codes with no song, so they never count as a real title.
+    unknown_codes = [code for code in (f"{n:03d}" for n in range(1000)) if code not in titles]
+    end_day = profile.end_day or datetime.now(timezone.utc).date()
+
+    # Each session gets its own slot of the day, so start seconds (the file names) never repeat.
+    slot_sec = START_WINDOW_SEC / max(1, profile.sessions_per_day)
+    if slot_sec < 1:
+        raise ValueError(f"at most {START_WINDOW_SEC} sessions per day")
+    files = 0
+    events = 0
+    for offset in range(profile.days - 1, -1, -1):
+        day = end_day - timedelta(days=offset)
+        midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        crosses_month = (day + timedelta(days=1)).month != day.month
+        for session in range(profile.sessions_per_day):
+            hours = profile.session_hours
+            if crosses_month and profile.month_boundary_sessions and session == profile.sessions_per_day - 1:
+                start = midnight + timedelta(seconds=FIRST_START_SEC + START_WINDOW_SEC)
+                hours = max(hours, 4.0)
+            else:
+                jitter = rng.randrange(max(1, int(slot_sec) // 2))
+                start = midnight + timedelta(seconds=FIRST_START_SEC + int(session * slot_sec) + jitter)
+            events += _write_session(out_dir, start, hours, profile, titles, codes, unknown_codes, rng)
+            files += 1
+    return {"files": files, "events": events}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic Marrabbio stats history")
+    parser.add_argument("--out", type=Path, required=True, help="target stats directory")
+    parser.add_argument("--songs", type=Path, default=Path(__file__).resolve().parent.parent / "songs.txt")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--end-day", type=date.fromisoformat, default=None)
+    parser.add_argument("--sessions-per-day", type=int, default=1)
+    parser.add_argument("--session-hours", type=float, default=6.0)
+    parser.add_argument("--songs-per-hour", type=float, default=20.0)
+    parser.add_argument("--error-ratio", type=float, default=0.02)
+    parser.add_argument("--fallback-ratio", type=float, default=0.05)
+    parser.add_argument("--corrupted-ratio", type=float, default=0.001)
+    parser.add_argument("--no-month-boundary", action="store_true", help="never span sessions across months")
+    parser.add_argument("--lines", default=DEFAULT_LINE_ID, help="comma separated line ids")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    lines = tuple(x.strip() for x in args.lines.split(",") if x.strip())
+    if not lines:
+        parser.error("--lines needs at least one line id")
+
+    profile = HistoryProfile(
+        days=args.days,
+        end_day=args.end_day,
+        sessions_per_day=args.sessions_per_day,
+        session_hours=args.session_hours,
+        songs_per_hour=args.songs_per_hour,
+        error_ratio=args.error_ratio,
+        fallback_ratio=args.fallback_ratio,
+        corrupted_ratio=args.corrupted_ratio,
+        month_boundary_sessions=not args.no_month_boundary,
+        lines=lines,
+        seed=args.seed,
+    )
+    try:
+        result = generate_history(args.out, args.songs, profile)
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(f"Wrote {result['files']} session files, {result['events']} lines to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Callable
+
+from .config import Debounce, Line
+from .dialer import DialController
+from .events import EventQueue, PulseCounter
+from .player import AudioPlayer, MixerAudioPlayer
+
+
+class PhoneLine:
+    # One telephone: its own player, dial controller, input queue and worker thread.
+    def __init__(
+        self,
+        line: Line,
+        player: AudioPlayer | MixerAudioPlayer,
+        dial: DialController,
+        events: EventQueue,
+        heartbeat: Callable[[], None] | None = None,
+    ) -> None:
+        self.line = line
+        self.player = player
+        self.dial = dial
+        self.events = events
+        self.pulses = PulseCounter()
+        self._heartbeat = heartbeat or (lambda: None)
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._buttons: list[Any] = []
+
+    @property
+    def id(self) -> str:
+        return self.line.id
+
+    def on_rotary_start(self) -> None:
+        self.pulses.reset()
+        self.events.put("rotary_start")
+
+    def on_rotary_stop(self) -> None:
+        self.events.put("digit", self.pulses.take())
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._worker, name=f"marrabbio-events-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        for button in self._buttons:
+            try:
+                button.close()
+            except Exception:
+                pass
+        self._buttons = []
+        self.player.close()
+
+    def _worker(self) -> None:
+        dial = self.dial
+        while not self._stop_event.is_set():
+            self._heartbeat()
+            item = self.events.get(timeout=0.2)
+            if item is None:
+                continue
+
+            name, _ts, value = item
+            try:
+                if name == "hook_on":
+                    dial.on_hook_lifted()
+                elif name == "hook_off":
+                    dial.on_hook_replaced()
+                elif name == "rotary_start":
+                    dial.on_rotary_engaged()
+                elif name == "digit":
+                    dial.on_rotary_released(value)
+                elif name == "call":
+                    value()
+            except Exception:
+                logging.exception("Line %s failed handling %s", self.id, name)
+
+    def attach_gpio(self, debounce: Debounce) -> None:
+        import gpiozero
+
+        pins = self.line.pins
+        rotary_enable = gpiozero.Button(pins.rotary_enable, pull_up=False, bounce_time=debounce.rotary_enable)
+        rotary_pulse = gpiozero.Button(pins.rotary_pulse, pull_up=False, bounce_time=debounce.rotary_pulse)
+        hook = gpiozero.Button(pins.hook, pull_up=False, bounce_time=debounce.hook)
+
+        hook.when_activated = lambda: self.events.put("hook_on")
+        hook.when_deactivated = lambda: self.events.put("hook_off")
+        rotary_enable.when_activated = self.on_rotary_start
+        rotary_enable.when_deactivated = self.on_rotary_stop
+        rotary_pulse.when_activated = self.pulses.pulse
+        self._buttons = [rotary_enable, rotary_pulse, hook]
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "state": self.dial.state.value,
+            "events": self.events.metrics(),
+            "jukebox": self.player.queue_snapshot(),
+        }
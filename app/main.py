@@ -2,17 +2,25 @@ from __future__ import annotations
 
 from pathlib import Path
 import logging
-import queue
 import signal
+import socket
 import threading
 import time
+from typing import Any, Callable
 
-from .catalog import load_song_catalog
-from .config import load_config
+from .catalog import SongCatalog, load_catalog_entries
+from .config import AppConfig, load_config
 from .dialer import DialController
-from .player import AudioPlayer
+from .events import EventQueue
+from .line import PhoneLine
+from .mediaprep import MANIFEST_FILE, load_media_manifest
+from .player import create_player
+from .scheduler import Scheduler
 from .stats import StatsRecorder
+from .uplink import StatsAggregator, StatsUplink
+from .watchdog import Heartbeat, Watchdog, process_memory
 from .web import StatsWebServer
+from .webproc import WebProcess
 
 SONGS_LIST_FILE = "songs.txt"
 MEDIA_DIR = "media"
@@ -31,6 +39,48 @@ def _setup_logging(level_name: str) -> None:
     )
 
 
+def _wait_for_shutdown() -> None:
+    stop_event = threading.Event()
+
+    def shutdown(*_args: object) -> None:
+        logging.info("Shutdown signal received")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    while not stop_event.is_set():
+        time.sleep(0.5)
+
+
+def _run_aggregator(config: AppConfig, stats_dir: Path) -> int:
+    aggregator = StatsAggregator(stats_dir, token=config.web.ingest_token)
+    watchdog = Watchdog(None, check_interval_sec=config.watchdog.check_interval_sec)
+    web_heartbeat = None
+    if config.watchdog.enabled:
+        web_heartbeat = watchdog.register("web", config.watchdog.stall_timeout_sec).beat
+    web = StatsWebServer(
+        host=config.web.host,
+        port=config.web.port,
+        stats_dir=stats_dir,
+        get_live_snapshot=aggregator.snapshot,
+        refresh_seconds=config.web.refresh_seconds,
+        aggregator=aggregator,
+        heartbeat=web_heartbeat,
+        trace_allocations=config.web.trace_allocations,
+    )
+    web.start()
+    watchdog.start()
+    watchdog.ready()
+    logging.info("Stats aggregator ready on http://%s:%s", config.web.host, config.web.port)
+    try:
+        _wait_for_shutdown()
+    finally:
+        watchdog.stop()
+        web.stop()
+        logging.info("Marrabbio aggregator stopped")
+    return 0
+
+
 def run() -> int:
     project_root = Path(__file__).resolve().parent.parent
     config = load_config(project_root)
@@ -45,106 +95,155 @@ def run() -> int:
     fallback_song_file = sounds_dir / FALLBACK_SONG_FILE
 
     logging.info("Starting Marrabbio")
-
-    songs = load_song_catalog(songs_list_file, songs_dir)
-    player = AudioPlayer()
-    stats = StatsRecorder(stats_dir)
-    dial = DialController(
-        player=player,
-        songs_by_code=songs,
-        fallback_song_file=fallback_song_file,
-        digit_audio_dir=sounds_dir,
-        media_dir=media_dir,
-        dial_tone_file=dial_tone_file,
-        timing=config.timing,
-        stats=stats,
-    )
-    web = StatsWebServer(
-        host=config.web.host,
-        port=config.web.port,
-        stats_dir=stats_dir,
-        get_live_snapshot=stats.snapshot,
-        refresh_seconds=config.web.refresh_seconds,
-    )
+    if config.web.mode == "aggregator":
+        return _run_aggregator(config, stats_dir)
+
+    catalog = SongCatalog(load_catalog_entries(songs_list_file, songs_dir))
+    songs = {entry.code: entry.path for entry in catalog.entries}
+    logging.info("Loaded %s songs from %s", len(songs), songs_list_file)
+    media_hints = load_media_manifest(songs_dir / MANIFEST_FILE)
+    stats = StatsRecorder(stats_dir, titles={entry.code: entry.name for entry in catalog.entries})
+    watchdog = Watchdog(stats, check_interval_sec=config.watchdog.check_interval_sec)
+    stall_timeout = config.watchdog.stall_timeout_sec
+
+    def heartbeat(name: str) -> Heartbeat | None:
+        if not config.watchdog.enabled:
+            return None
+        return watchdog.register(name, stall_timeout)
+
+    def beat(name: str) -> Callable[[], None] | None:
+        registered = heartbeat(name)
+        return registered.beat if registered is not None else None
+
+    scheduler = Scheduler()
+    scheduler.start()
+    preload = [dial_tone_file, *(sounds_dir / f"{digit}.mp3" for digit in "0123456789")]
+
+    lines: list[PhoneLine] = []
+    for line_cfg in config.lines:
+        wav_file = ""
+        if config.audio.wav_file and len(config.lines) > 1:
+            wav_path = Path(config.audio.wav_file)
+            wav_file = str(wav_path.with_name(f"{wav_path.stem}_{line_cfg.id}{wav_path.suffix}"))
+        player = create_player(
+            config.audio,
+            device=line_cfg.audio_device,
+            preload=preload,
+            wav_file=wav_file,
+            hints=media_hints,
+            register_heartbeat=lambda name=f"player-{line_cfg.id}": beat(name),
+            jukebox=config.jukebox,
+        )
+        events = EventQueue(maxsize=config.events.queue_size, overflow=config.events.overflow)
+        worker = heartbeat(f"events-{line_cfg.id}")
+        dial = DialController(
+            player=player,
+            songs_by_code=songs,
+            fallback_song_file=fallback_song_file,
+            digit_audio_dir=sounds_dir,
+            media_dir=media_dir,
+            dial_tone_file=dial_tone_file,
+            timing=config.timing,
+            stats=stats.for_line(line_cfg.id),
+            scheduler=scheduler,
+            dispatch=lambda fn, events=events: events.put("call", fn),
+            jukebox=config.jukebox.enabled,
+            expect_block=worker.expect_block if worker is not None else None,
+        )
+        line = PhoneLine(line_cfg, player, dial, events, heartbeat=worker.beat if worker is not None else None)
+        if config.watchdog.enabled:
+            watchdog.add_probe(f"events-{line_cfg.id}", events.probe)
+        line.start()
+        lines.append(line)
+    logging.info("Telephone lines: %s", ", ".join(line.id for line in lines))
+
+    uplink = None
+    if config.uplink.enabled and config.uplink.url:
+        uplink = StatsUplink(
+            stats_dir,
+            url=config.uplink.url,
+            device_id=config.uplink.device_id or socket.gethostname(),
+            token=config.uplink.token,
+            interval_sec=config.uplink.interval_sec,
+            batch_max_bytes=config.uplink.batch_max_bytes,
+        )
+        uplink.start()
+        logging.info("Stats uplink enabled to %s", config.uplink.url)
+
+    def live_snapshot() -> dict[str, Any]:
+        snapshot = stats.snapshot()
+        snapshot["lines"] = [line.snapshot() for line in lines]
+        if uplink is not None:
+            snapshot["uplink"] = uplink.snapshot()
+        snapshot["watchdog"] = watchdog.snapshot()
+        snapshot["memory"] = process_memory()
+        if isinstance(web, WebProcess):
+            snapshot["web"] = web.snapshot()
+        return snapshot
+
+    web: StatsWebServer | WebProcess
+    if config.web.process:
+        web = WebProcess(
+            host=config.web.host,
+            port=config.web.port,
+            stats_dir=stats_dir,
+            get_live_snapshot=live_snapshot,
+            refresh_seconds=config.web.refresh_seconds,
+            snapshot_interval_sec=config.web.snapshot_interval_sec,
+            hang_timeout_sec=stall_timeout,
+            stats=stats,
+            heartbeat=beat("web-supervisor"),
+            catalog=catalog,
+            max_media_streams=config.web.max_media_streams,
+            trace_allocations=config.web.trace_allocations,
+        )
+    else:
+        web = StatsWebServer(
+            host=config.web.host,
+            port=config.web.port,
+            stats_dir=stats_dir,
+            get_live_snapshot=live_snapshot,
+            refresh_seconds=config.web.refresh_seconds,
+            heartbeat=beat("web"),
+            catalog=catalog,
+            max_media_streams=config.web.max_media_streams,
+            trace_allocations=config.web.trace_allocations,
+        )
     web.start()
     logging.info("Web dashboard ready on http://%s:%s", config.web.host, config.web.port)
 
-    stop_event = threading.Event()
-    events: queue.Queue[tuple[str, float]] = queue.Queue()
-
-    def push(name: str) -> None:
-        events.put((name, time.monotonic()))
-
-    def worker() -> None:
-        while not stop_event.is_set():
-            try:
-                name, _ts = events.get(timeout=0.2)
-            except queue.Empty:
-                continue
-
-            if name == "hook_on":
-                dial.on_hook_lifted()
-            elif name == "hook_off":
-                dial.on_hook_replaced()
-            elif name == "rotary_start":
-                dial.on_rotary_engaged()
-            elif name == "rotary_stop":
-                dial.on_rotary_released()
-            elif name == "pulse":
-                dial.on_rotary_pulse()
-
-            events.task_done()
-
-    worker_thread = threading.Thread(target=worker, name="marrabbio-events", daemon=True)
-    worker_thread.start()
-
     if config.runtime.gpio_enabled:
         try:
-            import gpiozero
             from gpiozero import Device
 
             logging.info("gpiozero pin factory: %s", Device.pin_factory)
-            rotary_enable = gpiozero.Button(
-                config.pins.rotary_enable,
-                pull_up=False,
-                bounce_time=config.debounce.rotary_enable,
-            )
-            rotary_pulse = gpiozero.Button(
-                config.pins.rotary_pulse,
-                pull_up=False,
-                bounce_time=config.debounce.rotary_pulse,
-            )
-            hook = gpiozero.Button(
-                config.pins.hook,
-                pull_up=False,
-                bounce_time=config.debounce.hook,
-            )
-
-            hook.when_activated = lambda: push("hook_on")
-            hook.when_deactivated = lambda: push("hook_off")
-            rotary_enable.when_activated = lambda: push("rotary_start")
-            rotary_enable.when_deactivated = lambda: push("rotary_stop")
-            rotary_pulse.when_activated = lambda: push("pulse")
         except Exception as exc:
             stats.record_error("gpio_init_failed", str(exc))
             logging.exception("GPIO init failed, running in web-only mode")
+        else:
+            for line in lines:
+                try:
+                    line.attach_gpio(config.debounce)
+                except Exception as exc:
+                    stats.record_error("gpio_init_failed", str(exc), line=line.id)
+                    logging.exception("GPIO init failed for line %s, running it in web-only mode", line.id)
     else:
         logging.info("GPIO disabled by config, running in web-only mode")
 
-    def shutdown(*_args: object) -> None:
-        logging.info("Shutdown signal received")
-        stop_event.set()
-
-    signal.signal(signal.SIGINT, shutdown)
-    signal.signal(signal.SIGTERM, shutdown)
+    watchdog.start()
+    watchdog.ready()
 
     try:
-        while not stop_event.is_set():
-            time.sleep(0.5)
+        _wait_for_shutdown()
     finally:
+        watchdog.stop()
         web.stop()
+        if uplink is not None:
+            uplink.stop()
+        scheduler.stop()
+        for line in lines:
+            line.stop()
         stats.close()
-        player.stop()
         logging.info("Marrabbio stopped")
 
     return 0
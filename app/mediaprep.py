@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import math
+import os
+from pathlib import Path
+import subprocess
+from typing import Any
+import warnings
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:  # Removed in Python 3.13, fall back to pure Python analysis.
+    audioop = None
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+ANALYSIS_RATE = 22050
+WINDOW_SEC = 0.01
+PRE_ROLL_SEC = 0.05
+MAX_GAIN_DB = 12.0
+PEAK_CEILING_DBFS = -1.0
+
+# MPEG audio header tables: sample rates per version id, samples per frame per (version, layer).
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_SAMPLES_PER_FRAME = {(3, 3): 384, (3, 2): 1152, (3, 1): 1152, (2, 3): 384, (2, 2): 1152, (2, 1): 576}
+
+
+@dataclass(frozen=True)
+class MediaHints:
+    skip_frames: int = 0
+    gain_db: float = 0.0
+
+    @property
+    def gain(self) -> float:
+        return 10 ** (self.gain_db / 20)
+
+
+def load_media_manifest(manifest_file: Path) -> dict[str, MediaHints]:
+    try:
+        data = json.loads(manifest_file.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        logging.warning("Ignoring invalid media manifest %s: %s", manifest_file, exc)
+        return {}
+    hints = {}
+    for name, entry in data.get("files", {}).items():
+        try:
+            hints[name] = MediaHints(skip_frames=int(entry.get("skip_frames", 0)), gain_db=float(entry.get("gain_db", 0.0)))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    logging.info("Loaded media hints for %s files from %s", len(hints), manifest_file)
+    return hints
+
+
+def mp3_frame_info(path: Path) -> tuple[int, int] | None:
+    # Returns (sample_rate, samples_per_frame) of the first MPEG audio frame.
+    with path.open("rb") as fh:
+        head = fh.read(10)
+        start = 0
+        if head[:3] == b"ID3" and len(head) == 10:
+            start = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+        fh.seek(start)
+        data = fh.read(64 * 1024)
+    for i in range(len(data) - 3):
+        if data[i] != 0xFF or (data[i + 1] & 0xE0) != 0xE0:
+            continue
+        version = (data[i + 1] >> 3) & 0x03
+        layer = (data[i + 1] >> 1) & 0x03
+        rate_index = (data[i + 2] >> 2) & 0x03
+        if version == 1 or layer == 0 or rate_index == 3:
+            continue
+        spf = _SAMPLES_PER_FRAME[(3 if version == 3 else 2, layer)]
+        return _SAMPLE_RATES[version][rate_index], spf
+    return None
+
+
+def _window_peak(chunk: bytes) -> int:
+    if audioop is not None:
+        return audioop.max(chunk, 2)
+    samples = array("h")
+    samples.frombytes(chunk)
+    return max((abs(s) for s in samples), default=0)
+
+
+def _sum_squares(chunk: bytes) -> float:
+    if audioop is not None:
+        rms = audioop.rms(chunk, 2)
+        return float(rms) * rms * (len(chunk) // 2)
+    samples = array("h")
+    samples.frombytes(chunk)
+    return float(sum(s * s for s in samples))
+
+
+def _dbfs(value: float) -> float:
+    return 20 * math.log10(value / 32768) if value > 0 else -120.0
+
+
+def analyze_file(audio_file: Path, threshold_dbfs: float = -50.0, target_dbfs: float = -16.0) -> dict[str, Any]:
+    process = subprocess.Popen(
+        ["mpg123", "-q", "-s", "-m", "-r", str(ANALYSIS_RATE), "-e", "s16", str(audio_file)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    window_bytes = int(ANALYSIS_RATE * WINDOW_SEC) * 2
+    threshold = 32768 * 10 ** (threshold_dbfs / 20)
+    first_audible: int | None = None
+    samples = 0
+    squares = 0.0
+    peak = 0
+    try:
+        assert process.stdout is not None
+        while True:
+            chunk = process.stdout.read(window_bytes * 100)
+            if not chunk:
+                break
+            chunk = chunk[: len(chunk) - len(chunk) % 2]
+            if first_audible is None:
+                for pos in range(0, len(chunk), window_bytes):
+                    if _window_peak(chunk[pos : pos + window_bytes]) >= threshold:
+                        first_audible = samples + pos // 2
+                        break
+            peak = max(peak, _window_peak(chunk))
+            squares += _sum_squares(chunk)
+            samples += len(chunk) // 2
+    finally:
+        process.wait()
+
+    if samples == 0:
+        raise ValueError(f"no audio decoded from {audio_file}")
+
+    loudness = _dbfs(math.sqrt(squares / samples))
+    peak_db = _dbfs(peak)
+    gain_db = max(-MAX_GAIN_DB, min(MAX_GAIN_DB, target_dbfs - loudness, PEAK_CEILING_DBFS - peak_db))
+    start_sec = max(0.0, (first_audible or 0) / ANALYSIS_RATE - PRE_ROLL_SEC)
+
+    skip_frames = 0
+    info = mp3_frame_info(audio_file)
+    if info is not None:
+        sample_rate, samples_per_frame = info
+        skip_frames = int(start_sec * sample_rate / samples_per_frame)
+
+    return {
+        "start_sec": round(start_sec, 3),
+        "skip_frames": skip_frames,
+        "gain_db": round(gain_db, 2),
+        "loudness_dbfs": round(loudness, 2),
+        "peak_dbfs": round(peak_db, 2),
+        "duration_sec": round(samples / ANALYSIS_RATE, 2),
+    }
+
+
+def file_sha1(path: Path) -> str:
+    digest = hashlib.sha1()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _analyze_job(path: str, sha1: str, threshold_dbfs: float, target_dbfs: float) -> dict[str, Any]:
+    audio_file = Path(path)
+    stat = audio_file.stat()
+    entry = analyze_file(audio_file, threshold_dbfs, target_dbfs)
+    entry.update({"sha1": sha1, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+    return entry
+
+
+def build_manifest(
+    songs_dir: Path,
+    manifest_file: Path,
+    jobs: int | None = None,
+    force: bool = False,
+    threshold_dbfs: float = -50.0,
+    target_dbfs: float = -16.0,
+) -> dict[str, int]:
+    previous: dict[str, Any] = {}
+    if manifest_file.exists() and not force:
+        try:
+            old_manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            old_manifest = {}
+        # Entries computed with other thresholds (or an older format) are analyzed again.
+        settings = (old_manifest.get("version"), old_manifest.get("threshold_dbfs"), old_manifest.get("target_dbfs"))
+        if settings == (MANIFEST_VERSION, threshold_dbfs, target_dbfs):
+            previous = old_manifest.get("files", {})
+
+    files: dict[str, Any] = {}
+    todo: list[tuple[Path, str]] = []
+    for path in sorted(songs_dir.glob("*.mp3")):
+        old = previous.get(path.name)
+        stat = path.stat()
+        if old and old.get("size") == stat.st_size and old.get("mtime_ns") == stat.st_mtime_ns:
+            files[path.name] = old
+            continue
+        sha1 = file_sha1(path)
+        if old and old.get("sha1") == sha1:
+            files[path.name] = {**old, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            continue
+        todo.append((path, sha1))
+
+    failed = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+            futures = {
+                pool.submit(_analyze_job, str(path), sha1, threshold_dbfs, target_dbfs): path for path, sha1 in todo
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    files[path.name] = future.result()
+                    logging.info("Analyzed %s: %s", path.name, files[path.name])
+                except Exception as exc:
+                    failed += 1
+                    logging.error("Cannot analyze %s: %s", path.name, exc)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "threshold_dbfs": threshold_dbfs,
+        "target_dbfs": target_dbfs,
+        "files": dict(sorted(files.items())),
+    }
+    tmp = manifest_file.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(manifest_file)
+    return {"files": len(files), "analyzed": len(todo) - failed, "failed": failed}
+
+
+def main(argv: list[str] | None = None) -> int:
+    default_songs_dir = Path(__file__).resolve().parent.parent / "media" / "songs"
+    parser = argparse.ArgumentParser(description="Detect leading silence and loudness of the songs")
+    parser.add_argument("--songs-dir", type=Path, default=default_songs_dir)
+    parser.add_argument("--manifest", type=Path, help=f"default: <songs-dir>/{MANIFEST_FILE}")
+    parser.add_argument("--jobs", type=int, default=None, help="parallel decoders (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-analyze every file")
+    parser.add_argument("--threshold-db", type=float, default=-50.0, help="audible level in dBFS")
+    parser.add_argument("--target-db", type=float, default=-16.0, help="target RMS loudness in dBFS")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    manifest_file = args.manifest or args.songs_dir / MANIFEST_FILE
+    result = build_manifest(args.songs_dir, manifest_file, args.jobs, args.force, args.threshold_db, args.target_db)
+    print(f"{result['files']} files in {manifest_file}, {result['analyzed']} analyzed, {result['failed']} failed")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
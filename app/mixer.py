@@ -0,0 +1,638 @@
+from __future__ import annotations
+
+from array import array
+from collections import deque
+from dataclasses import dataclass
+import logging
+from pathlib import Path
+import subprocess
+import threading
+import time
+from typing import Any, Callable
+import warnings
+import wave
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:  # Removed in Python 3.13, the audioop-lts package brings it back.
+    audioop = None
+
+RAMP_BLOCKS = 8
+PREFETCH_READ_BYTES = 64 * 1024
+STREAM_AHEAD_SEC = 1.0
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    sample_rate: int = 44100
+    channels: int = 2
+    sample_width: int = 2
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.channels * self.sample_width
+
+
+def _scale(chunk: bytes, gain: float) -> bytes:
+    if gain >= 0.9999 and gain <= 1.0001:
+        return chunk
+    if gain <= 0.0001:
+        return bytes(len(chunk))
+    if audioop is not None:
+        return audioop.mul(chunk, 2, gain)
+    samples = array("h")
+    samples.frombytes(chunk)
+    return array("h", (max(-32768, min(32767, int(s * gain))) for s in samples)).tobytes()
+
+
+def _add(a: bytes, b: bytes) -> bytes:
+    if audioop is not None:
+        return audioop.add(a, b, 2)
+    left = array("h")
+    left.frombytes(a)
+    right = array("h")
+    right.frombytes(b)
+    return array("h", (max(-32768, min(32767, x + y)) for x, y in zip(left, right))).tobytes()
+
+
+def mixing_supported() -> bool:
+    # The pure Python fallback cannot mix in real time on a Pi Zero.
+    return audioop is not None
+
+
+def decoder_command(audio_file: Path, fmt: AudioFormat, skip_frames: int = 0) -> list[str]:
+    command = ["mpg123", "-q", "-s", "-r", str(fmt.sample_rate), "-e", "s16"]
+    command.append("--stereo" if fmt.channels == 2 else "--mono")
+    if skip_frames > 0:
+        command += ["-k", str(skip_frames)]
+    command.append(str(audio_file))
+    return command
+
+
+def decode_file(audio_file: Path, fmt: AudioFormat, skip_frames: int = 0) -> bytes:
+    completed = subprocess.run(
+        decoder_command(audio_file, fmt, skip_frames),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=False,
+    )
+    data = completed.stdout
+    return data[: len(data) - len(data) % fmt.frame_bytes]
+
+
+class Voice:
+    def __init__(self, gain: float = 1.0, fade_in_sec: float = 0.0, name: str = "") -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._gain = 0.0 if fade_in_sec > 0 else gain
+        self._target = gain
+        self._rate = gain / fade_in_sec if fade_in_sec > 0 else 0.0
+        self._stopping = False
+        self._done = threading.Event()
+
+    def open(self, fmt: AudioFormat) -> None:
+        self._fmt = fmt
+
+    def read(self, nbytes: int) -> bytes:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        return
+
+    def set_gain(self, gain: float, fade_sec: float = 0.0) -> None:
+        with self._lock:
+            self._target = max(0.0, gain)
+            if fade_sec <= 0:
+                self._gain = self._target
+                self._rate = 0.0
+            else:
+                self._rate = abs(self._target - self._gain) / fade_sec
+
+    def stop(self, fade_sec: float = 0.0) -> None:
+        with self._lock:
+            self._stopping = True
+        self.set_gain(0.0, fade_sec)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def pull(self, nbytes: int, chunk_sec: float) -> bytes | None:
+        # Returns None once the voice is finished (stopped, faded out or drained).
+        with self._lock:
+            start = self._gain
+            if self._rate > 0 and start != self._target:
+                step = self._rate * chunk_sec
+                if start < self._target:
+                    end = min(self._target, start + step)
+                else:
+                    end = max(self._target, start - step)
+            else:
+                end = self._target
+            self._gain = end
+            stopping = self._stopping
+
+        if stopping and start <= 0.0001:
+            return None
+
+        data = self.read(nbytes)
+        if not data:
+            return None
+
+        if start == end:
+            data = _scale(data, end)
+        else:
+            data = self._ramp(data, start, end)
+
+        if stopping and end <= 0.0001:
+            # Last faded chunk is still emitted, the next pull ends the voice.
+            with self._lock:
+                self._gain = 0.0
+        return data
+
+    def _ramp(self, data: bytes, start: float, end: float) -> bytes:
+        frame_bytes = self._fmt.frame_bytes
+        frames = len(data) // frame_bytes
+        block = max(1, frames // RAMP_BLOCKS) * frame_bytes
+        parts = []
+        blocks = max(1, (len(data) + block - 1) // block)
+        for i in range(blocks):
+            gain = start + (end - start) * (i + 1) / blocks
+            parts.append(_scale(data[i * block : (i + 1) * block], gain))
+        return b"".join(parts)
+
+    def _finish(self) -> None:
+        try:
+            self.close()
+        finally:
+            self._done.set()
+
+
+class BufferVoice(Voice):
+    def __init__(self, pcm: bytes, loops: int = 1, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._pcm = pcm
+        self._loops_left = max(1, loops)
+        self._pos = 0
+
+    def read(self, nbytes: int) -> bytes:
+        parts = []
+        wanted = nbytes
+        while wanted > 0 and self._loops_left > 0 and self._pcm:
+            piece = self._pcm[self._pos : self._pos + wanted]
+            parts.append(piece)
+            wanted -= len(piece)
+            self._pos += len(piece)
+            if self._pos >= len(self._pcm):
+                self._pos = 0
+                self._loops_left -= 1
+        return b"".join(parts)
+
+
+class StreamVoice(Voice):
+    # mpg123 decodes on a reader thread into a bounded buffer, so the mixer thread never
+    # waits on the pipe: it gets silence until the decoder has produced something.
+    def __init__(self, audio_file: Path, skip_frames: int = 0, ahead_bytes: int | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.audio_file = audio_file
+        self._skip_frames = skip_frames
+        self._ahead_bytes = ahead_bytes
+        self._process: subprocess.Popen | None = None
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._eof = False
+
+    def open(self, fmt: AudioFormat) -> None:
+        super().open(fmt)
+        if self._ahead_bytes is None:
+            self._ahead_bytes = int(fmt.sample_rate * STREAM_AHEAD_SEC) * fmt.frame_bytes
+        threading.Thread(target=self._decode, name="marrabbio-decoder", daemon=True).start()
+
+    def _decode(self) -> None:
+        try:
+            with self._cond:
+                # close() may already have run (e.g. hang up right after queueing).
+                if self._closed:
+                    return
+                self._process = subprocess.Popen(
+                    decoder_command(self.audio_file, self._fmt, self._skip_frames),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                )
+                stdout = self._process.stdout
+            assert stdout is not None
+            while True:
+                with self._cond:
+                    while not self._closed and len(self._buffer) >= self._ahead_bytes:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                data = stdout.read1(PREFETCH_READ_BYTES)
+                if not data:
+                    return
+                with self._cond:
+                    self._buffer += data
+        except (OSError, ValueError) as exc:
+            if not self._closed:
+                logging.error("Cannot decode %s: %s", self.audio_file, exc)
+        finally:
+            with self._cond:
+                self._eof = True
+                del self._buffer[len(self._buffer) - len(self._buffer) % self._fmt.frame_bytes :]
+
+    @property
+    def buffered_bytes(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def drained(self) -> bool:
+        with self._cond:
+            return self._eof and not self._buffer
+
+    def take(self, nbytes: int) -> bytes:
+        # Whole frames already decoded, up to nbytes; never blocks.
+        with self._cond:
+            available = min(nbytes, len(self._buffer))
+            available -= available % self._fmt.frame_bytes
+            data = bytes(self._buffer[:available])
+            del self._buffer[:available]
+            self._cond.notify()
+        return data
+
+    def read(self, nbytes: int) -> bytes:
+        data = self.take(nbytes)
+        if data or self.drained:
+            return data
+        # Decoder still starting or behind: silence keeps the voice, and the mix, going.
+        return bytes(nbytes)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            process, self._process = self._process, None
+            self._buffer.clear()
+            self._cond.notify_all()
+        if process is None:
+            return
+        try:
+            process.kill()
+            process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        finally:
+            if process.stdout is not None:
+                process.stdout.close()
+
+
+@dataclass(frozen=True)
+class QueuedTrack:
+    audio_file: Path
+    skip_frames: int = 0
+    gain: float = 1.0
+    # Called from the mixer thread when the track becomes audible, must not block.
+    on_start: Callable[[], None] | None = None
+
+
+class _Prefetch:
+    # Decoder for one queued track, kept up to limit bytes ahead of playback.
+    def __init__(self, track: QueuedTrack, fmt: AudioFormat, limit: int) -> None:
+        self.track = track
+        self._stream = StreamVoice(track.audio_file, skip_frames=track.skip_frames, ahead_bytes=limit)
+        self._stream.open(fmt)
+        self.finished = False
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._stream.buffered_bytes
+
+    def read(self, nbytes: int) -> bytes:
+        data = self._stream.take(nbytes)
+        if not data and self._stream.drained:
+            self.finished = True
+        if data and self.track.gain != 1.0:
+            data = _scale(data, self.track.gain)
+        return data
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class QueueVoice(Voice):
+    # Plays queued tracks back to back inside one voice, so the change of track falls in
+    # the middle of a mixer chunk with no gap. Only the next track is decoded ahead.
+    def __init__(self, tracks: list[QueuedTrack], prebuffer_bytes: int, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._pending: deque[QueuedTrack] = deque(tracks)
+        self._prebuffer_bytes = prebuffer_bytes
+        self._current: _Prefetch | None = None
+        self._next: _Prefetch | None = None
+        self._ended = False
+
+    def open(self, fmt: AudioFormat) -> None:
+        super().open(fmt)
+        with self._lock:
+            started = self._advance()
+        self._started(started)
+
+    def append(self, track: QueuedTrack) -> bool:
+        # False once the queue has played out or was stopped: the caller starts a new voice.
+        with self._lock:
+            if self._ended or self._stopping:
+                return False
+            self._pending.append(track)
+            self._prefetch_next()
+            return True
+
+    def queued_count(self) -> int:
+        with self._lock:
+            return len(self._pending) + (1 if self._next is not None else 0)
+
+    def _prefetch_next(self) -> None:
+        if self._next is None and self._pending and self._current is not None:
+            self._next = _Prefetch(self._pending.popleft(), self._fmt, self._prebuffer_bytes)
+
+    def _advance(self) -> _Prefetch | None:
+        if self._current is not None:
+            self._current.close()
+        if self._next is not None:
+            self._current, self._next = self._next, None
+        elif self._pending:
+            # Nothing decoded ahead (first track): start decoding now, playback may start
+            # with a few chunks of silence.
+            self._current = _Prefetch(self._pending.popleft(), self._fmt, self._prebuffer_bytes)
+        else:
+            self._current = None
+            self._ended = True
+            return None
+        self._prefetch_next()
+        return self._current
+
+    @staticmethod
+    def _started(source: _Prefetch | None) -> None:
+        if source is not None and source.track.on_start is not None:
+            try:
+                source.track.on_start()
+            except Exception:
+                logging.exception("Track start callback failed")
+
+    def read(self, nbytes: int) -> bytes:
+        parts = []
+        wanted = nbytes
+        while wanted > 0:
+            with self._lock:
+                current = self._current
+            if current is None:
+                break
+            data = current.read(wanted)
+            if data:
+                parts.append(data)
+                wanted -= len(data)
+                continue
+            if not current.finished:
+                # Decoder not ready yet: keep the voice alive with silence.
+                parts.append(bytes(wanted))
+                break
+            with self._lock:
+                started = self._advance()
+            self._started(started)
+        return b"".join(parts)
+
+    def stop(self, fade_sec: float = 0.0) -> None:
+        with self._lock:
+            self._pending.clear()
+            upcoming, self._next = self._next, None
+        if upcoming is not None:
+            upcoming.close()
+        super().stop(fade_sec)
+
+    def close(self) -> None:
+        with self._lock:
+            sources = [s for s in (self._current, self._next) if s is not None]
+            self._current = self._next = None
+            self._pending.clear()
+            self._ended = True
+        for source in sources:
+            source.close()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            current, upcoming, pending = self._current, self._next, list(self._pending)
+        bytes_per_sec = self._fmt.sample_rate * self._fmt.frame_bytes
+        queued = ([upcoming.track] if upcoming is not None else []) + pending
+        return {
+            "playing": current.track.audio_file.stem if current is not None else None,
+            "queued": [track.audio_file.stem for track in queued],
+            "prebuffered_sec": round(upcoming.buffered_bytes / bytes_per_sec, 2) if upcoming is not None else 0.0,
+        }
+
+
+class NullSink:
+    blocking = False
+
+    def __init__(self) -> None:
+        self.frames_written = 0
+
+    def open(self, fmt: AudioFormat) -> None:
+        self._fmt = fmt
+
+    def write(self, data: bytes) -> None:
+        self.frames_written += len(data) // self._fmt.frame_bytes
+
+    def close(self) -> None:
+        return
+
+
+class WavFileSink:
+    blocking = False
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._wav: wave.Wave_write | None = None
+
+    def open(self, fmt: AudioFormat) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._wav = wave.open(str(self._path), "wb")
+        self._wav.setnchannels(fmt.channels)
+        self._wav.setsampwidth(fmt.sample_width)
+        self._wav.setframerate(fmt.sample_rate)
+
+    def write(self, data: bytes) -> None:
+        if self._wav is not None:
+            self._wav.writeframes(data)
+
+    def close(self) -> None:
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+
+class AplaySink:
+    # aplay blocks on a full device buffer, which paces the mixer thread.
+    blocking = True
+
+    def __init__(self, device: str = "", buffer_usec: int = 100000) -> None:
+        self._device = device
+        self._buffer_usec = buffer_usec
+        self._process: subprocess.Popen | None = None
+
+    def open(self, fmt: AudioFormat) -> None:
+        self._fmt = fmt
+        command = [
+            "aplay",
+            "-q",
+            "-t",
+            "raw",
+            "-f",
+            "S16_LE",
+            "-r",
+            str(fmt.sample_rate),
+            "-c",
+            str(fmt.channels),
+            "-B",
+            str(self._buffer_usec),
+        ]
+        if self._device:
+            command += ["-D", self._device]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def write(self, data: bytes) -> None:
+        if self._process is None or self._process.stdin is None:
+            self.open(self._fmt)
+        try:
+            self._process.stdin.write(data)
+        except (BrokenPipeError, OSError, ValueError):
+            logging.error("Audio output stream lost, reopening")
+            self.close()
+            self.open(self._fmt)
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        try:
+            if self._process.stdin is not None:
+                self._process.stdin.close()
+            self._process.terminate()
+            self._process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+        finally:
+            self._process = None
+
+
+class Mixer:
+    def __init__(
+        self,
+        sink,
+        fmt: AudioFormat | None = None,
+        chunk_frames: int = 1024,
+        on_tick: Callable[[], None] | None = None,
+    ) -> None:
+        self._sink = sink
+        self._fmt = fmt or AudioFormat()
+        self._chunk_frames = chunk_frames
+        self._on_tick = on_tick
+        self._voices: list[Voice] = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def format(self) -> AudioFormat:
+        return self._fmt
+
+    def start(self) -> None:
+        self._sink.open(self._fmt)
+        self._thread = threading.Thread(target=self._run, name="marrabbio-mixer", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        with self._lock:
+            voices = list(self._voices)
+            self._voices.clear()
+        for voice in voices:
+            voice._finish()
+        self._sink.close()
+
+    def play(self, voice: Voice) -> Voice:
+        voice.open(self._fmt)
+        with self._lock:
+            self._voices.append(voice)
+        return voice
+
+    def stop_all(self, fade_sec: float = 0.0) -> None:
+        with self._lock:
+            voices = list(self._voices)
+        for voice in voices:
+            voice.stop(fade_sec)
+
+    def voices(self) -> list[Voice]:
+        with self._lock:
+            return list(self._voices)
+
+    def render(self, frames: int | None = None) -> bytes:
+        frames = frames or self._chunk_frames
+        nbytes = frames * self._fmt.frame_bytes
+        chunk_sec = frames / self._fmt.sample_rate
+        out = bytes(nbytes)
+
+        with self._lock:
+            voices = list(self._voices)
+
+        finished = []
+        for voice in voices:
+            try:
+                data = voice.pull(nbytes, chunk_sec)
+            except Exception:
+                logging.exception("Mixer voice failed: %s", voice.name)
+                data = None
+            if data is None:
+                finished.append(voice)
+                continue
+            if len(data) < nbytes:
+                data += bytes(nbytes - len(data))
+            out = _add(out, data)
+
+        if finished:
+            with self._lock:
+                self._voices = [v for v in self._voices if v not in finished]
+            for voice in finished:
+                voice._finish()
+        return out
+
+    def _run(self) -> None:
+        chunk_sec = self._chunk_frames / self._fmt.sample_rate
+        deadline = time.monotonic()
+        while not self._stop_event.is_set():
+            chunk = self.render()
+            try:
+                self._sink.write(chunk)
+            except Exception:
+                logging.exception("Mixer sink write failed")
+            if self._on_tick is not None:
+                self._on_tick()
+            if not self._sink.blocking:
+                deadline += chunk_sec
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    deadline = time.monotonic()
+
+
+def build_sink(kind: str, device: str = "", wav_file: Path | None = None):
+    if kind == "null":
+        return NullSink()
+    if kind == "wav":
+        return WavFileSink(wav_file or Path("mixer_output.wav"))
+    return AplaySink(device=device)
+
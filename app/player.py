@@ -1,17 +1,65 @@
 from __future__ import annotations
 
+from collections import OrderedDict, deque
 from pathlib import Path
 import logging
 import subprocess
-from typing import Sequence
+import threading
+from typing import Any, Callable, Sequence
+
+from .config import Audio, Jukebox
+from .mediaprep import MediaHints
+from .mixer import (
+    AudioFormat,
+    BufferVoice,
+    Mixer,
+    QueuedTrack,
+    QueueVoice,
+    StreamVoice,
+    Voice,
+    build_sink,
+    decode_file,
+    mixing_supported,
+)
+
+# Files up to this size are decoded once and kept in memory, longer ones are streamed.
+BUFFER_MAX_FILE_BYTES = 512 * 1024
+
+
+MPG123_UNITY_SCALE = 32768
 
 
 class AudioPlayer:
-    def __init__(self) -> None:
+    # One mpg123 process at a time: effects replace the song instead of overlaying it.
+    overlays_effects = False
+
+    def __init__(self, device: str = "", hints: dict[str, MediaHints] | None = None, max_queue: int = 10) -> None:
+        self._device = device
+        self._hints = hints or {}
+        self._max_queue = max_queue
         self._process: subprocess.Popen | None = None
+        self._queue_lock = threading.Lock()
+        self._queue: deque[tuple[Path, Callable[[], None] | None]] = deque()
+        self._playing: Path | None = None
+
+    def _command(self, audio_file: Path, loop_count: int | None = None) -> list[str]:
+        command = ["mpg123"]
+        if self._device:
+            command += ["-o", "alsa", "-a", self._device]
+        if loop_count is not None:
+            command += ["--loop", str(loop_count)]
+        hint = self._hints.get(audio_file.name)
+        if hint is not None:
+            # Precomputed by app.mediaprep: skip leading silence and level the loudness.
+            if hint.skip_frames > 0:
+                command += ["-k", str(hint.skip_frames)]
+            if hint.gain_db:
+                command += ["-f", str(int(MPG123_UNITY_SCALE * hint.gain))]
+        command += ["-q", str(audio_file)]
+        return command
 
     def _spawn(self, args: Sequence[str]) -> None:
-        self.stop()
+        self._kill()
         self._process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
     def play_file(self, audio_file: Path, loop_count: int | None = None) -> None:
@@ -19,19 +67,66 @@ class AudioPlayer:
             logging.error("Audio file not found: %s", audio_file)
             return
 
-        command = ["mpg123"]
-        if loop_count is not None:
-            command += ["--loop", str(loop_count)]
-        command += ["-q", str(audio_file)]
         logging.info("Playing: %s", audio_file.name)
-        self._spawn(command)
+        self.stop()
+        self._spawn(self._command(audio_file, loop_count))
+
+    def enqueue(self, audio_file: Path, on_start: Callable[[], None] | None = None) -> int | None:
+        # Returns the queue position (0 = playing now), None when the queue is full.
+        if not audio_file.exists():
+            logging.error("Audio file not found: %s", audio_file)
+            return None
+        with self._queue_lock:
+            if self._playing is not None:
+                if len(self._queue) >= self._max_queue:
+                    return None
+                self._queue.append((audio_file, on_start))
+                return len(self._queue)
+            self._start_track(audio_file, on_start)
+            return 0
+
+    def _start_track(self, audio_file: Path, on_start: Callable[[], None] | None) -> None:
+        # Caller holds _queue_lock. Without a mixer there is no pre-decoding: a waiter
+        # thread starts the next song as soon as mpg123 exits.
+        logging.info("Playing: %s", audio_file.name)
+        self._spawn(self._command(audio_file))
+        self._playing = audio_file
+        if on_start is not None:
+            on_start()
+        process = self._process
+        threading.Thread(target=self._wait_track, args=(process,), name="marrabbio-jukebox", daemon=True).start()
+
+    def _wait_track(self, process: subprocess.Popen) -> None:
+        process.wait()
+        with self._queue_lock:
+            if self._process is not process:
+                # Stopped or replaced, whoever did it owns the queue now.
+                return
+            self._playing = None
+            while self._queue:
+                audio_file, on_start = self._queue.popleft()
+                if audio_file.exists():
+                    self._start_track(audio_file, on_start)
+                    return
+
+    def queue_snapshot(self) -> dict[str, Any]:
+        with self._queue_lock:
+            return {
+                "playing": self._playing.stem if self._playing is not None else None,
+                "queued": [audio_file.stem for audio_file, _on_start in self._queue],
+                "prebuffered_sec": 0.0,
+            }
+
+    def play_effect(self, audio_file: Path) -> None:
+        # A single mpg123 process cannot overlay sounds.
+        self.play_file(audio_file)
 
     def play_file_blocking(self, audio_file: Path) -> None:
         if not audio_file.exists():
             logging.error("Audio file not found: %s", audio_file)
             return
         self.stop()
-        subprocess.run(["mpg123", "-q", str(audio_file)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        subprocess.run(self._command(audio_file), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
 
     def play_sequence_blocking(self, files: Sequence[Path]) -> None:
         self.stop()
@@ -39,9 +134,9 @@ class AudioPlayer:
             if not audio_file.exists():
                 logging.error("Audio file not found: %s", audio_file)
                 continue
-            subprocess.run(["mpg123", "-q", str(audio_file)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+            subprocess.run(self._command(audio_file), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
 
-    def stop(self) -> None:
+    def _kill(self) -> None:
         if self._process is None:
             return
         try:
@@ -50,3 +145,168 @@ class AudioPlayer:
             pass
         finally:
             self._process = None
+
+    def stop(self) -> None:
+        with self._queue_lock:
+            self._queue.clear()
+            self._playing = None
+            self._kill()
+
+    def close(self) -> None:
+        self.stop()
+
+
+class MixerAudioPlayer:
+    overlays_effects = True
+
+    def __init__(
+        self,
+        mixer: Mixer,
+        cache_size: int = 32,
+        fade_sec: float = 0.02,
+        hints: dict[str, MediaHints] | None = None,
+        max_queue: int = 10,
+        prebuffer_sec: float = 10.0,
+    ) -> None:
+        self._mixer = mixer
+        self._hints = hints or {}
+        self._fmt: AudioFormat = mixer.format
+        self._cache_size = cache_size
+        self._fade_sec = fade_sec
+        self._cache: OrderedDict[Path, bytes] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._main: Voice | None = None
+        self._effects: list[Voice] = []
+        self._max_queue = max_queue
+        self._prebuffer_bytes = int(prebuffer_sec * self._fmt.sample_rate) * self._fmt.frame_bytes
+        self._queue: QueueVoice | None = None
+
+    def preload(self, files: Sequence[Path]) -> None:
+        for audio_file in files:
+            if audio_file.exists():
+                self._buffer(audio_file)
+
+    def _buffer(self, audio_file: Path) -> bytes:
+        with self._cache_lock:
+            pcm = self._cache.get(audio_file)
+            if pcm is not None:
+                self._cache.move_to_end(audio_file)
+                return pcm
+        # Cached per path: the manifest skip of a file is the same every time it plays.
+        hint = self._hints.get(audio_file.name, MediaHints())
+        pcm = decode_file(audio_file, self._fmt, skip_frames=hint.skip_frames)
+        with self._cache_lock:
+            self._cache[audio_file] = pcm
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return pcm
+
+    def _voice_for(self, audio_file: Path, loop_count: int | None = None) -> Voice:
+        hint = self._hints.get(audio_file.name, MediaHints())
+        if loop_count is not None or audio_file.stat().st_size <= BUFFER_MAX_FILE_BYTES:
+            return BufferVoice(self._buffer(audio_file), loops=loop_count or 1, gain=hint.gain, name=audio_file.name)
+        return StreamVoice(
+            audio_file,
+            skip_frames=hint.skip_frames,
+            gain=hint.gain,
+            name=audio_file.name,
+            fade_in_sec=self._fade_sec,
+        )
+
+    def play_file(self, audio_file: Path, loop_count: int | None = None) -> Voice | None:
+        if not audio_file.exists():
+            logging.error("Audio file not found: %s", audio_file)
+            return None
+        logging.info("Playing: %s", audio_file.name)
+        voice = self._voice_for(audio_file, loop_count)
+        self.stop()
+        self._main = self._mixer.play(voice)
+        return voice
+
+    def enqueue(self, audio_file: Path, on_start: Callable[[], None] | None = None) -> int | None:
+        # Returns the queue position (0 = playing now), None when the queue is full.
+        if not audio_file.exists():
+            logging.error("Audio file not found: %s", audio_file)
+            return None
+        hint = self._hints.get(audio_file.name, MediaHints())
+        track = QueuedTrack(audio_file, skip_frames=hint.skip_frames, gain=hint.gain, on_start=on_start)
+        queue = self._queue
+        if queue is not None and not queue.done:
+            if queue.queued_count() >= self._max_queue:
+                return None
+            if queue.append(track):
+                return queue.queued_count()
+        logging.info("Playing: %s", audio_file.name)
+        voice = QueueVoice([track], self._prebuffer_bytes, name="jukebox", fade_in_sec=self._fade_sec)
+        self.stop()
+        self._main = self._queue = self._mixer.play(voice)
+        return 0
+
+    def queue_snapshot(self) -> dict[str, Any]:
+        queue = self._queue
+        if queue is None or queue.done:
+            return {"playing": None, "queued": [], "prebuffered_sec": 0.0}
+        return queue.snapshot()
+
+    def play_effect(self, audio_file: Path) -> None:
+        if not audio_file.exists():
+            logging.error("Audio file not found: %s", audio_file)
+            return
+        voice = self._mixer.play(self._voice_for(audio_file))
+        self._effects = [v for v in self._effects if not v.done]
+        self._effects.append(voice)
+
+    def play_file_blocking(self, audio_file: Path) -> None:
+        voice = self.play_file(audio_file)
+        if voice is not None:
+            voice.wait()
+
+    def play_sequence_blocking(self, files: Sequence[Path]) -> None:
+        self.stop()
+        for audio_file in files:
+            if not audio_file.exists():
+                logging.error("Audio file not found: %s", audio_file)
+                continue
+            voice = self._mixer.play(self._voice_for(audio_file))
+            self._main = voice
+            voice.wait()
+
+    def stop(self) -> None:
+        voices = [v for v in [self._main, *self._effects] if v is not None]
+        self._main = None
+        self._queue = None
+        self._effects = []
+        for voice in voices:
+            voice.stop(self._fade_sec)
+
+    def close(self) -> None:
+        self.stop()
+        self._mixer.close()
+
+
+def create_player(
+    audio: Audio,
+    device: str = "",
+    preload: Sequence[Path] = (),
+    wav_file: str = "",
+    hints: dict[str, MediaHints] | None = None,
+    register_heartbeat: Callable[[], Callable[[], None] | None] | None = None,
+    jukebox: Jukebox | None = None,
+) -> AudioPlayer | MixerAudioPlayer:
+    device = device or audio.device
+    wav_file = wav_file or audio.wav_file
+    jukebox = jukebox or Jukebox()
+    if audio.backend == "mixer" and not mixing_supported():
+        logging.error("backend = \"mixer\" needs audioop (pip install audioop-lts on Python 3.13+), using mpg123")
+    if audio.backend != "mixer" or not mixing_supported():
+        return AudioPlayer(device=device, hints=hints, max_queue=jukebox.max_queue)
+
+    fmt = AudioFormat(sample_rate=audio.sample_rate, channels=audio.channels)
+    sink = build_sink(audio.sink, device=device, wav_file=Path(wav_file) if wav_file else None)
+    # Registered only here: the mpg123 fallback has no mixer thread to beat it.
+    heartbeat = register_heartbeat() if register_heartbeat is not None else None
+    mixer = Mixer(sink, fmt, on_tick=heartbeat)
+    mixer.start()
+    player = MixerAudioPlayer(mixer, hints=hints, max_queue=jukebox.max_queue, prebuffer_sec=jukebox.prebuffer_sec)
+    player.preload(preload)
+    return player
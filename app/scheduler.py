@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+
+class ScheduledCall:
+    __slots__ = ("when", "seq", "fn", "args", "index", "_scheduler")
+
+    def __init__(self, scheduler: Scheduler, when: float, seq: int, fn: Callable[..., Any], args: tuple) -> None:
+        self.when = when
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        # Position in the scheduler heap, -1 once fired or cancelled.
+        self.index = -1
+        self._scheduler = scheduler
+
+    def __lt__(self, other: ScheduledCall) -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    @property
+    def pending(self) -> bool:
+        return self.index >= 0
+
+    def cancel(self) -> bool:
+        return self._scheduler.cancel(self)
+
+
+class Scheduler:
+    def __init__(self, clock: Callable[[], float] = time.monotonic, name: str = "marrabbio-scheduler") -> None:
+        self._clock = clock
+        self._name = name
+        self._heap: list[ScheduledCall] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread: threading.Thread | None = None
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def call_later(self, delay: float, fn: Callable[..., Any], *args: Any) -> ScheduledCall:
+        return self.call_at(self._clock() + max(0.0, delay), fn, *args)
+
+    def call_at(self, when: float, fn: Callable[..., Any], *args: Any) -> ScheduledCall:
+        with self._cond:
+            call = ScheduledCall(self, when, next(self._seq), fn, args)
+            call.index = len(self._heap)
+            self._heap.append(call)
+            self._sift_up(call.index)
+            if self._heap[0] is call:
+                self._cond.notify()
+        return call
+
+    def cancel(self, call: ScheduledCall) -> bool:
+        with self._cond:
+            if call.index < 0 or call.index >= len(self._heap) or self._heap[call.index] is not call:
+                return False
+            self._remove_at(call.index)
+            return True
+
+    def next_deadline(self) -> float | None:
+        with self._cond:
+            return self._heap[0].when if self._heap else None
+
+    def run_pending(self) -> int:
+        # Runs every call due at the current clock time on the calling thread.
+        ran = 0
+        while True:
+            with self._cond:
+                if not self._heap or self._heap[0].when > self._clock():
+                    return ran
+                call = self._remove_at(0)
+            self._invoke(call)
+            ran += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0].when - self._clock()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if self._stopped:
+                    return
+            self.run_pending()
+
+    @staticmethod
+    def _invoke(call: ScheduledCall) -> None:
+        try:
+            call.fn(*call.args)
+        except Exception:
+            logging.exception("Scheduled call failed: %r", call.fn)
+
+    def _remove_at(self, index: int) -> ScheduledCall:
+        heap = self._heap
+        call = heap[index]
+        last = heap.pop()
+        if last is not call:
+            heap[index] = last
+            last.index = index
+            self._sift_down(index)
+            self._sift_up(last.index)
+        call.index = -1
+        return call
+
+    def _swap(self, i: int, j: int) -> None:
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        heap[i].index = i
+        heap[j].index = j
+
+    def _sift_up(self, index: int) -> None:
+        heap = self._heap
+        while index > 0:
+            parent = (index - 1) // 2
+            if not heap[index] < heap[parent]:
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _sift_down(self, index: int) -> None:
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and heap[child] < heap[smallest]:
+                    smallest = child
+            if smallest == index:
+                return
+            self._swap(index, smallest)
+            index = smallest
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+from array import array
 from collections import Counter, deque
 from datetime import datetime, timezone
+import heapq
 import json
 import os
 from pathlib import Path
+import sys
 import threading
+import time
 from typing import Any
 
 
+DEFAULT_LINE_ID = "main"
+
+
 def _utc_now() -> datetime:
     return datetime.now(timezone.utc)
 
@@ -17,8 +24,47 @@ def _iso(ts: datetime) -> str:
     return ts.isoformat(timespec="seconds")
 
 
+class EventRecord:
+    # One recorded event: interned strings and an integer epoch instead of nested dicts.
+    __slots__ = ("ts", "event", "line", "code", "title", "found", "error", "details")
+
+    def __init__(
+        self,
+        ts: int,
+        event: str,
+        line: str = "",
+        code: str = "",
+        title: str = "",
+        found: bool = False,
+        error: str = "",
+        details: str = "",
+    ) -> None:
+        self.ts = ts
+        self.event = event
+        self.line = line
+        self.code = code
+        self.title = title
+        self.found = found
+        self.error = error
+        self.details = details
+
+    def data(self) -> dict[str, Any]:
+        if self.event == "song_started":
+            return {"code": self.code, "found": self.found, "title": self.title, "line": self.line}
+        if self.event == "error":
+            data: dict[str, Any] = {"error": self.error, "details": self.details}
+            if self.line:
+                data["line"] = self.line
+            return data
+        return {}
+
+    def to_dict(self) -> dict[str, Any]:
+        # Same shape as a line of the session file.
+        return {"ts": _iso(datetime.fromtimestamp(self.ts, timezone.utc)), "event": self.event, "data": self.data()}
+
+
 class StatsRecorder:
-    def __init__(self, stats_dir: Path) -> None:
+    def __init__(self, stats_dir: Path, titles: dict[str, str] | None = None) -> None:
         stats_dir.mkdir(parents=True, exist_ok=True)
         now = _utc_now()
         self._startup_day = now.strftime("%Y-%m-%d")
@@ -26,38 +72,39 @@ class StatsRecorder:
         self._file_path = stats_dir / f"stats_{self._session_id}.txt"
         self._fh = self._file_path.open("a", encoding="utf-8")
         self._lock = threading.Lock()
+        # Song titles by code from the catalog: recorded titles share these strings.
+        self._titles = titles or {}
         self._counts: Counter[str] = Counter()
-        self._recent_events: deque[dict[str, Any]] = deque(maxlen=40)
-        self._write("session_started")
+        self._line_counts: dict[str, Counter[str]] = {}
+        self._recent_events: deque[EventRecord] = deque(maxlen=40)
+        self._write(EventRecord(int(time.time()), "session_started"))
 
-    def record_song_started(self, code: str, found: bool, title: str = "") -> None:
-        self._write("song_started", code=code, found=found, title=title)
+    def record_song_started(self, code: str, found: bool, title: str = "", line: str = DEFAULT_LINE_ID) -> None:
+        code = sys.intern(code)
+        known = self._titles.get(code)
+        title = known if known == title else sys.intern(title)
+        self._write(EventRecord(int(time.time()), "song_started", sys.intern(line), code, title, found))
 
-    def record_error(self, error: str, details: str = "") -> None:
-        self._write("error", error=error, details=details)
+    def record_error(self, error: str, details: str = "", line: str = "") -> None:
+        record = EventRecord(int(time.time()), "error", sys.intern(line), error=sys.intern(error), details=details)
+        self._write(record)
 
-    def _write(self, event: str, **data: Any) -> None:
-        entry = {"ts": _iso(_utc_now()), "event": event, "data": data}
+    def for_line(self, line: str) -> LineStats:
+        return LineStats(self, line)
+
+    def _write(self, record: EventRecord) -> None:
         with self._lock:
-            self._apply(entry)
-            self._recent_events.append(entry)
+            self._apply(record)
+            self._recent_events.append(record)
             # One line per log entry.
-            self._fh.write(json.dumps(entry, ensure_ascii=True, separators=(",", ":")) + "\n")
+            self._fh.write(json.dumps(record.to_dict(), ensure_ascii=True, separators=(",", ":")) + "\n")
             self._fh.flush()
             os.fsync(self._fh.fileno())
 
-    def _apply(self, entry: dict[str, Any]) -> None:
-        event = entry.get("event")
-        data = entry.get("data", {})
-        self._counts["events_total"] += 1
-        if event == "song_started":
-            self._counts["song_started_total"] += 1
-            if data.get("found"):
-                self._counts["song_found_total"] += 1
-            else:
-                self._counts["song_fallback_total"] += 1
-        elif event == "error":
-            self._counts["error_total"] += 1
+    def _apply(self, record: EventRecord) -> None:
+        _count_event(self._counts, record.event, record.found)
+        if record.line:
+            _count_event(self._line_counts.setdefault(record.line, Counter()), record.event, record.found)
 
     def snapshot(self) -> dict[str, Any]:
         with self._lock:
@@ -66,18 +113,49 @@ class StatsRecorder:
                 "startup_day": self._startup_day,
                 "stats_file": str(self._file_path),
                 "counters": dict(self._counts),
-                "recent_events": list(self._recent_events),
+                "counters_by_line": {line: dict(c) for line, c in sorted(self._line_counts.items())},
+                "recent_events": [record.to_dict() for record in self._recent_events],
             }
 
     def close(self) -> None:
         with self._lock:
-            entry = {"ts": _iso(_utc_now()), "event": "session_stopped", "data": {}}
+            entry = EventRecord(int(time.time()), "session_stopped").to_dict()
             self._fh.write(json.dumps(entry, ensure_ascii=True, separators=(",", ":")) + "\n")
             self._fh.flush()
             os.fsync(self._fh.fileno())
             self._fh.close()
 
 
+class LineStats:
+    # StatsRecorder view that tags every event with one telephone line id.
+    def __init__(self, recorder: StatsRecorder, line: str) -> None:
+        self._recorder = recorder
+        self.line = line
+
+    def record_song_started(self, code: str, found: bool, title: str = "") -> None:
+        self._recorder.record_song_started(code=code, found=found, title=title, line=self.line)
+
+    def record_error(self, error: str, details: str = "") -> None:
+        self._recorder.record_error(error, details, line=self.line)
+
+
+def _count_event(counts: Counter[str], event: object, found: object) -> None:
+    counts["events_total"] += 1
+    if event == "song_started":
+        counts["song_started_total"] += 1
+        if found:
+            counts["song_found_total"] += 1
+        else:
+            counts["song_fallback_total"] += 1
+    elif event == "error":
+        counts["error_total"] += 1
+
+
+def _line_of(data: dict[str, Any]) -> str:
+    # Events written before multi-line support belong to the single default line.
+    return str(data.get("line") or DEFAULT_LINE_ID)
+
+
 def _parse_stats_file(path: Path) -> Counter[str]:
     counts: Counter[str] = Counter()
     try:
@@ -135,79 +213,182 @@ def _files_for_month(stats_dir: Path, year: int, month: int) -> list[Path]:
     return files
 
 
-def _song_counter_from_files(files: list[Path]) -> Counter[tuple[str, str]]:
-    songs: Counter[tuple[str, str]] = Counter()
-    for path in files:
-        try:
-            with path.open("r", encoding="utf-8") as fh:
-                for line in fh:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        entry = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    if entry.get("event") != "song_started":
-                        continue
-                    code = str(entry.get("data", {}).get("code", "")).strip()
-                    title = str(entry.get("data", {}).get("title", "")).strip()
-                    if code:
-                        songs[(code, title)] += 1
-        except OSError:
-            continue
-    return songs
-
-
-def top_songs_all_time(stats_dir: Path, limit: int = 10) -> list[dict[str, Any]]:
-    counts = _song_counter_from_files(list_session_files(stats_dir))
-    return [
-        {"code": code, "title": title, "count": count}
-        for (code, title), count in counts.most_common(limit)
-    ]
-
-
-def top_songs_for_day(stats_dir: Path, day: str, limit: int = 10) -> list[dict[str, Any]]:
+CODE_SLOTS = 1000
+
+
+class SongCounter:
+    # Play counts per (code, title) in an array indexed by the three digit song code.
+    # The first title seen for a code owns its slot; other titles and codes go to a dict.
+    __slots__ = ("_counts", "_titles", "_other")
+
+    def __init__(self) -> None:
+        self._counts = array("I", bytes(4 * CODE_SLOTS))
+        self._titles: list[str | None] = [None] * CODE_SLOTS
+        self._other: Counter[tuple[str, str]] = Counter()
+
+    def add(self, code: str, title: str) -> None:
+        if len(code) == 3 and code.isdigit():
+            slot = int(code)
+            known = self._titles[slot]
+            if known is None:
+                self._titles[slot] = known = title
+            if known == title:
+                self._counts[slot] += 1
+                return
+        self._other[(code, title)] += 1
+
+    def most_common(self, limit: int) -> list[tuple[str, str, int]]:
+        rows = [(f"{slot:03d}", self._titles[slot] or "", count) for slot, count in enumerate(self._counts) if count]
+        rows.extend((code, title, count) for (code, title), count in self._other.items())
+        # Ties ordered by code, so the ranking does not depend on file order.
+        return heapq.nsmallest(limit, rows, key=lambda row: (-row[2], row[0], row[1]))
+
+
+class StatsAggregation:
+    # Computes any mix of calendar, day summary and top-song views in one pass over the files.
+    def __init__(
+        self,
+        stats_dir: Path,
+        month: tuple[int, int] | None = None,
+        day: str | None = None,
+        top_day: bool = False,
+        top_all: bool = False,
+        line_id: str | None = None,
+    ) -> None:
+        self._stats_dir = stats_dir
+        self._month_prefix = f"{month[0]:04d}-{month[1]:02d}-" if month else None
+        self._day = day
+        self._top_day = top_day
+        self._top_all = top_all
+        self._line_id = line_id
+
+        self._days: dict[str, Counter[str]] = {}
+        self._songs_per_line: dict[str, Counter[str]] = {}
+        self._files_per_day: dict[str, set[str]] = {}
+        self._day_total: Counter[str] = Counter()
+        self._day_by_line: dict[str, Counter[str]] = {}
+        self._day_sessions: set[str] = set()
+        self._day_songs = SongCounter()
+        self._all_songs = SongCounter()
+
+    def scan(self, files: list[Path]) -> StatsAggregation:
+        for path in files:
+            try:
+                self._scan_file(path)
+            except OSError:
+                continue
+        return self
+
+    def _scan_file(self, path: Path) -> None:
+        session = _session_name(self._stats_dir, path)
+        month_prefix = self._month_prefix
+        wanted_day = self._day
+        needs_day = month_prefix is not None or wanted_day is not None
+        line_id = self._line_id
+        with path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                event = entry.get("event")
+                data = entry.get("data", {})
+                code = ""
+                if event == "song_started" and (line_id is None or _line_of(data) == line_id):
+                    code = str(data.get("code", "")).strip()
+                    title = str(data.get("title", "")).strip()
+                if code and self._top_all:
+                    self._all_songs.add(code, title)
+                if not needs_day:
+                    continue
+
+                day = _parse_ts_to_day(str(entry.get("ts", "")))
+                if not day:
+                    continue
+                if month_prefix is not None and day.startswith(month_prefix):
+                    self._files_per_day.setdefault(day, set()).add(session)
+                    counts = self._days.setdefault(day, Counter())
+                    _count_event(counts, event, data.get("found"))
+                    if event == "song_started":
+                        self._songs_per_line.setdefault(day, Counter())[_line_of(data)] += 1
+                if day == wanted_day:
+                    self._day_sessions.add(session)
+                    _count_event(self._day_total, event, data.get("found"))
+                    if event == "song_started" or data.get("line"):
+                        _count_event(self._day_by_line.setdefault(_line_of(data), Counter()), event, data.get("found"))
+                    if code and self._top_day:
+                        self._day_songs.add(code, title)
+
+    def calendar(self) -> list[dict[str, Any]]:
+        result = []
+        for day in sorted(self._days.keys(), reverse=True):
+            row = {"day": day, "sessions": len(self._files_per_day.get(day, set()))}
+            row.update(dict(self._days[day]))
+            row["lines"] = dict(sorted(self._songs_per_line.get(day, Counter()).items()))
+            result.append(row)
+        return result
+
+    def day_detail(self) -> dict[str, Any]:
+        return {
+            "day": self._day,
+            "sessions": sorted(self._day_sessions),
+            "summary": dict(self._day_total),
+            "lines": {line: dict(c) for line, c in sorted(self._day_by_line.items())},
+        }
+
+    @staticmethod
+    def _top(counts: SongCounter, limit: int) -> list[dict[str, Any]]:
+        return [{"code": code, "title": title, "count": count} for code, title, count in counts.most_common(limit)]
+
+    def top_songs_for_day(self, limit: int = 10) -> list[dict[str, Any]]:
+        return self._top(self._day_songs, limit)
+
+    def top_songs_all_time(self, limit: int = 10) -> list[dict[str, Any]]:
+        return self._top(self._all_songs, limit)
+
+
+def _parse_day(day: str) -> tuple[int, int] | None:
     try:
         y, m, _d = [int(x) for x in day.split("-")]
     except ValueError:
-        return []
+        return None
+    return y, m
 
-    counts: Counter[tuple[str, str]] = Counter()
-    files = _files_for_month(stats_dir, y, m)
-    for path in files:
-        try:
-            with path.open("r", encoding="utf-8") as fh:
-                for line in fh:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        entry = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    if entry.get("event") != "song_started":
-                        continue
-                    if _parse_ts_to_day(str(entry.get("ts", ""))) != day:
-                        continue
-                    data = entry.get("data", {})
-                    code = str(data.get("code", "")).strip()
-                    title = str(data.get("title", "")).strip()
-                    if code:
-                        counts[(code, title)] += 1
-        except OSError:
-            continue
 
-    return [
-        {"code": code, "title": title, "count": count}
-        for (code, title), count in counts.most_common(limit)
-    ]
+def top_songs_all_time(stats_dir: Path, limit: int = 10, line_id: str | None = None) -> list[dict[str, Any]]:
+    aggregation = StatsAggregation(stats_dir, top_all=True, line_id=line_id)
+    return aggregation.scan(list_session_files(stats_dir)).top_songs_all_time(limit)
+
+
+def top_songs_for_day(
+    stats_dir: Path,
+    day: str,
+    limit: int = 10,
+    line_id: str | None = None,
+) -> list[dict[str, Any]]:
+    ym = _parse_day(day)
+    if ym is None:
+        return []
+    aggregation = StatsAggregation(stats_dir, day=day, top_day=True, line_id=line_id)
+    return aggregation.scan(_files_for_month(stats_dir, *ym)).top_songs_for_day(limit)
 
 
 def list_session_files(stats_dir: Path) -> list[Path]:
+    # On an aggregator, files received from other devices live in devices/<id>/.
     if not stats_dir.exists():
         return []
-    return sorted(stats_dir.glob("stats_*.txt"))
+    return sorted(stats_dir.glob("stats_*.txt")) + sorted(stats_dir.glob("devices/*/stats_*.txt"))
+
+
+def _session_name(stats_dir: Path, path: Path) -> str:
+    try:
+        return path.relative_to(stats_dir).as_posix()
+    except ValueError:
+        return path.name
 
 
 def list_calendar(stats_dir: Path) -> list[dict[str, Any]]:
@@ -216,93 +397,118 @@ def list_calendar(stats_dir: Path) -> list[dict[str, Any]]:
 
 
 def list_calendar_for_month(stats_dir: Path, year: int, month: int) -> list[dict[str, Any]]:
-    days: dict[str, Counter[str]] = {}
-    files_per_day: dict[str, set[str]] = {}
-    files = _files_for_month(stats_dir, year, month)
-
-    for path in files:
-        try:
-            with path.open("r", encoding="utf-8") as fh:
-                for line in fh:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        entry = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    day = _parse_ts_to_day(str(entry.get("ts", "")))
-                    if not day:
-                        continue
-                    if not day.startswith(f"{year:04d}-{month:02d}-"):
-                        continue
-                    counts = days.setdefault(day, Counter())
-                    files_set = files_per_day.setdefault(day, set())
-                    files_set.add(path.name)
-
-                    event = entry.get("event")
-                    data = entry.get("data", {})
-                    counts["events_total"] += 1
-                    if event == "song_started":
-                        counts["song_started_total"] += 1
-                        if data.get("found"):
-                            counts["song_found_total"] += 1
-                        else:
-                            counts["song_fallback_total"] += 1
-                    elif event == "error":
-                        counts["error_total"] += 1
-        except OSError:
-            continue
-
-    result = []
-    for day in sorted(days.keys(), reverse=True):
-        row = {"day": day, "sessions": len(files_per_day.get(day, set()))}
-        row.update(dict(days.get(day, Counter())))
-        result.append(row)
-    return result
+    aggregation = StatsAggregation(stats_dir, month=(year, month))
+    return aggregation.scan(_files_for_month(stats_dir, year, month)).calendar()
 
 
 def day_detail(stats_dir: Path, day: str) -> dict[str, Any]:
-    try:
-        y, m, _d = [int(x) for x in day.split("-")]
-    except ValueError:
-        return {"day": day, "sessions": [], "summary": {}}
-
-    files = _files_for_month(stats_dir, y, m)
-    total = Counter()
-    sessions: set[str] = set()
-    for path in files:
-        try:
-            with path.open("r", encoding="utf-8") as fh:
-                matched = False
-                for line in fh:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        entry = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    if _parse_ts_to_day(str(entry.get("ts", ""))) != day:
-                        continue
-                    matched = True
-                    event = entry.get("event")
-                    data = entry.get("data", {})
-                    total["events_total"] += 1
-                    if event == "song_started":
-                        total["song_started_total"] += 1
-                        if data.get("found"):
-                            total["song_found_total"] += 1
-                        else:
-                            total["song_fallback_total"] += 1
-                    elif event == "error":
-                        total["error_total"] += 1
-                if matched:
-                    sessions.add(path.name)
-        except OSError:
-            continue
-    return {
-        "day": day,
-        "sessions": sorted(sessions),
-        "summary": dict(total),
+    ym = _parse_day(day)
+    if ym is None:
+        return {"day": day, "sessions": [], "summary": {}, "lines": {}}
+    aggregation = StatsAggregation(stats_dir, day=day)
+    return aggregation.scan(_files_for_month(stats_dir, *ym)).day_detail()
+
+
+def day_full(stats_dir: Path, day: str, limit: int = 10, line_id: str | None = None) -> dict[str, Any]:
+    # Day summary and its top songs from a single scan of the month files.
+    ym = _parse_day(day)
+    if ym is None:
+        return {"day": day, "sessions": [], "summary": {}, "lines": {}, "top": []}
+    aggregation = StatsAggregation(stats_dir, day=day, top_day=True, line_id=line_id)
+    aggregation.scan(_files_for_month(stats_dir, *ym))
+    return {**aggregation.day_detail(), "top": aggregation.top_songs_for_day(limit)}
+
+
+def dashboard(
+    stats_dir: Path,
+    year: int,
+    month: int,
+    day: str | None = None,
+    limit: int = 10,
+    line_id: str | None = None,
+) -> dict[str, Any]:
+    # Calendar, all-time top and (optionally) one day's summary and top in one pass.
+    # The all-time ranking needs every file anyway, so month and day views ride along.
+    if day is not None and _parse_day(day) is None:
+        day = None
+    aggregation = StatsAggregation(
+        stats_dir,
+        month=(year, month),
+        day=day,
+        top_day=day is not None,
+        top_all=True,
+        line_id=line_id,
+    )
+    aggregation.scan(list_session_files(stats_dir))
+    result: dict[str, Any] = {
+        "year": year,
+        "month": month,
+        "calendar": aggregation.calendar(),
+        "top_all": aggregation.top_songs_all_time(limit),
     }
+    if day is not None:
+        result["day"] = {**aggregation.day_detail(), "top": aggregation.top_songs_for_day(limit)}
+    return result
+
+
+class PlayCounts:
+    # All-time song_started counts per code, kept up to date incrementally: session files
+    # are append-only, so each one is only read past the last byte already counted.
+    def __init__(self, stats_dir: Path, refresh_sec: float = 5.0) -> None:
+        self._stats_dir = stats_dir
+        self._refresh_sec = refresh_sec
+        self._lock = threading.Lock()
+        self._files: dict[str, tuple[int, Counter[str]]] = {}
+        self._totals: Counter[str] = Counter()
+        self._checked_at: float | None = None
+
+    @staticmethod
+    def _count(path: Path, start: int, counts: Counter[str]) -> int:
+        offset = start
+        with path.open("rb") as fh:
+            fh.seek(start)
+            for raw in fh:
+                if not raw.endswith(b"\n"):
+                    break
+                offset += len(raw)
+                if b'"song_started"' not in raw:
+                    continue
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                if not isinstance(entry, dict) or entry.get("event") != "song_started":
+                    continue
+                code = str(entry.get("data", {}).get("code", "")).strip()
+                if code:
+                    counts[code] += 1
+        return offset
+
+    def refresh(self) -> None:
+        files: dict[str, tuple[int, Counter[str]]] = {}
+        for path in list_session_files(self._stats_dir):
+            key = _session_name(self._stats_dir, path)
+            try:
+                size = path.stat().st_size
+                offset, counts = self._files.get(key, (0, Counter()))
+                if offset > size:
+                    offset, counts = 0, Counter()
+                if offset < size:
+                    counts = counts.copy()
+                    offset = self._count(path, offset, counts)
+            except OSError:
+                continue
+            files[key] = (offset, counts)
+        totals: Counter[str] = Counter()
+        for _offset, counts in files.values():
+            totals.update(counts)
+        self._files = files
+        self._totals = totals
+
+    def counts(self) -> Counter[str]:
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self._refresh_sec:
+                self.refresh()
+                self._checked_at = now
+            return self._totals
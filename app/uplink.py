@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime, timezone
+import gzip
+import io
+import json
+import logging
+import os
+from pathlib import Path
+import random
+import re
+import threading
+from typing import Any
+import urllib.error
+import urllib.request
+
+STATE_FILE = ".uplink_state.json"
+DEVICES_DIR = "devices"
+MAX_INGEST_BYTES = 8 * 1024 * 1024
+
+_DEVICE_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+_SESSION_FILE_RE = re.compile(r"^stats_[0-9_-]+\.txt$")
+
+
+def _utc_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class StatsUplink:
+    # Ships new lines of the local session files to a central aggregator.
+    # The append-only session files are the outbox; only acked byte offsets are stored.
+    def __init__(
+        self,
+        stats_dir: Path,
+        url: str,
+        device_id: str,
+        token: str = "",
+        interval_sec: float = 30.0,
+        batch_max_bytes: int = 256 * 1024,
+        max_backoff_sec: float = 600.0,
+        timeout_sec: float = 10.0,
+    ) -> None:
+        self._stats_dir = stats_dir
+        self._url = url
+        self._device_id = device_id
+        self._token = token
+        self._interval_sec = interval_sec
+        self._batch_max_bytes = batch_max_bytes
+        self._max_backoff_sec = max_backoff_sec
+        self._timeout_sec = timeout_sec
+        self._state_path = stats_dir / STATE_FILE
+        self._offsets: dict[str, int] = self._load_state()
+        self._failures = 0
+        self._last_error = ""
+        self._last_sync = ""
+        self._sent_bytes = 0
+        # Refreshed by the uplink thread after each round: snapshot() runs on every live
+        # publish and must not touch the disk.
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _load_state(self) -> dict[str, int]:
+        try:
+            data = json.loads(self._state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        offsets = data.get("offsets", {}) if isinstance(data, dict) else {}
+        return {str(k): int(v) for k, v in offsets.items() if isinstance(v, int)}
+
+    def _save_state(self) -> None:
+        tmp = self._state_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump({"device": self._device_id, "offsets": self._offsets}, fh, sort_keys=True)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self._state_path)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="marrabbio-uplink", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self._timeout_sec + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                ok = self.sync_once()
+            except Exception as exc:
+                logging.exception("Stats uplink failed")
+                self._last_error = str(exc)
+                ok = False
+            self._pending_bytes = self._count_pending()
+            self._stop_event.wait(self._next_delay(ok))
+
+    def _next_delay(self, ok: bool) -> float:
+        if ok:
+            self._failures = 0
+            return self._interval_sec
+        self._failures += 1
+        backoff = min(self._max_backoff_sec, self._interval_sec * (2 ** min(self._failures, 16)))
+        return backoff * random.uniform(0.5, 1.0)
+
+    def sync_once(self) -> bool:
+        # Sends batches until everything is acked. Returns False on transport errors.
+        while not self._stop_event.is_set():
+            segments = self._next_batch()
+            if not segments:
+                self._last_sync = _utc_iso()
+                return True
+            try:
+                reply = self._post(segments)
+            except (OSError, ValueError, urllib.error.URLError) as exc:
+                self._last_error = str(exc)
+                logging.warning("Stats uplink to %s failed: %s", self._url, exc)
+                return False
+            if not self._apply_acks(reply):
+                self._last_error = "aggregator acknowledged nothing"
+                return False
+        return True
+
+    def _next_batch(self) -> list[dict[str, Any]]:
+        segments = []
+        budget = self._batch_max_bytes
+        for path in sorted(self._stats_dir.glob("stats_*.txt")):
+            if budget <= 0:
+                break
+            offset = self._offsets.get(path.name, 0)
+            try:
+                size = path.stat().st_size
+                if size <= offset:
+                    continue
+                with path.open("rb") as fh:
+                    fh.seek(offset)
+                    chunk = fh.read(min(budget, size - offset))
+                    if b"\n" not in chunk and not segments:
+                        # A line longer than the whole budget goes out alone, or it would block the file.
+                        fh.seek(offset)
+                        chunk = fh.readline(size - offset)
+            except OSError:
+                continue
+            # Only complete lines are shipped, a half-written entry waits for the next round.
+            end = chunk.rfind(b"\n")
+            if end < 0:
+                continue
+            chunk = chunk[: end + 1]
+            budget -= len(chunk)
+            # Base64 keeps the bytes exact, so offsets and acks match even on a corrupt line.
+            segments.append({"file": path.name, "offset": offset, "data": base64.b64encode(chunk).decode("ascii")})
+        return segments
+
+    def _post(self, segments: list[dict[str, Any]]) -> dict[str, Any]:
+        body = gzip.compress(json.dumps({"device": self._device_id, "segments": segments}).encode("utf-8"))
+        request = urllib.request.Request(self._url, data=body, method="POST")
+        request.add_header("Content-Type", "application/json")
+        request.add_header("Content-Encoding", "gzip")
+        if self._token:
+            request.add_header("Authorization", f"Bearer {self._token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self._timeout_sec) as response:
+                reply = json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as exc:
+            if exc.code != 409:
+                raise
+            # Offset mismatch: the aggregator tells us where to resume from.
+            reply = json.loads(exc.read().decode("utf-8"))
+        self._sent_bytes += len(body)
+        return reply
+
+    def _apply_acks(self, reply: dict[str, Any]) -> bool:
+        changed = False
+        with self._lock:
+            for ack in reply.get("segments", []):
+                name = str(ack.get("file", ""))
+                acked = ack.get("acked")
+                if not _SESSION_FILE_RE.match(name) or not isinstance(acked, int):
+                    continue
+                if self._offsets.get(name) != acked:
+                    self._offsets[name] = acked
+                    changed = True
+        if changed:
+            self._save_state()
+        return changed
+
+    def _count_pending(self) -> int:
+        pending = 0
+        for path in self._stats_dir.glob("stats_*.txt"):
+            try:
+                pending += max(0, path.stat().st_size - self._offsets.get(path.name, 0))
+            except OSError:
+                continue
+        return pending
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "url": self._url,
+            "device": self._device_id,
+            "pending_bytes": self._pending_bytes,
+            "sent_bytes": self._sent_bytes,
+            "failures": self._failures,
+            "last_sync": self._last_sync,
+            "last_error": self._last_error,
+        }
+
+
+class StatsAggregator:
+    # Receives uplink batches and appends them to devices/<device>/stats_*.txt.
+    # The size of each received file is the acknowledged offset, so resends are idempotent.
+    def __init__(self, stats_dir: Path, token: str = "") -> None:
+        self._root = stats_dir / DEVICES_DIR
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._token = token
+        self._lock = threading.Lock()
+        self._devices: dict[str, dict[str, Any]] = {}
+
+    def authorized(self, header: str | None) -> bool:
+        if not self._token:
+            return True
+        return header == f"Bearer {self._token}"
+
+    def ingest(self, payload: dict[str, Any]) -> tuple[int, dict[str, Any]]:
+        device = str(payload.get("device", ""))
+        if not _DEVICE_ID_RE.match(device):
+            return 400, {"error": "invalid device id"}
+        segments = payload.get("segments")
+        if not isinstance(segments, list):
+            return 400, {"error": "invalid segments"}
+
+        # Validate the whole batch first: a bad segment must not leave earlier ones written.
+        parsed: list[tuple[str, int, bytes]] = []
+        for segment in segments:
+            if not isinstance(segment, dict):
+                return 400, {"error": "invalid segment"}
+            name = str(segment.get("file", ""))
+            offset = segment.get("offset")
+            data = segment.get("data")
+            if not _SESSION_FILE_RE.match(name) or not isinstance(data, str):
+                return 400, {"error": "invalid segment"}
+            if not isinstance(offset, int) or offset < 0:
+                return 400, {"error": "invalid segment"}
+            try:
+                parsed.append((name, offset, base64.b64decode(data, validate=True)))
+            except (binascii.Error, ValueError):
+                return 400, {"error": "invalid segment"}
+
+        device_dir = self._root / device
+        # The id pattern already rules out "." and "..", this also guards against symlinks.
+        if device_dir.resolve().parent != self._root.resolve():
+            return 400, {"error": "invalid device id"}
+        device_dir.mkdir(parents=True, exist_ok=True)
+        acks = []
+        status = 200
+        received = 0
+        with self._lock:
+            for name, offset, raw in parsed:
+                path = device_dir / name
+                size = path.stat().st_size if path.exists() else 0
+                if offset > size:
+                    status = 409
+                elif offset + len(raw) > size:
+                    with path.open("ab") as fh:
+                        fh.write(raw[size - offset :])
+                        fh.flush()
+                        os.fsync(fh.fileno())
+                    received += offset + len(raw) - size
+                    size = offset + len(raw)
+                acks.append({"file": name, "acked": size})
+
+            info = self._devices.setdefault(device, {"received_bytes": 0, "batches": 0})
+            info["received_bytes"] += received
+            info["batches"] += 1
+            info["last_seen"] = _utc_iso()
+        return status, {"device": device, "segments": acks}
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            known = {p.name for p in self._root.iterdir() if p.is_dir()} if self._root.exists() else set()
+            return {
+                "mode": "aggregator",
+                "devices": {name: dict(self._devices.get(name, {})) for name in sorted(known | set(self._devices))},
+            }
+
+
+def decode_ingest_body(body: bytes, content_encoding: str | None) -> dict[str, Any]:
+    if (content_encoding or "").lower() == "gzip":
+        with gzip.GzipFile(fileobj=io.BytesIO(body)) as gz:
+            body = gz.read(MAX_INGEST_BYTES + 1)
+        if len(body) > MAX_INGEST_BYTES:
+            raise ValueError("payload too large")
+    payload = json.loads(body.decode("utf-8"))
+    if not isinstance(payload, dict):
+        raise ValueError("payload must be an object")
+    return payload
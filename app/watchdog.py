@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable
+
+from .stats import StatsRecorder
+
+# A probe that never comes back (e.g. its loop was restarted) is sent again after this.
+PROBE_RETRY_SEC = 30.0
+_STATUS_FIELDS = {"VmRSS": "rss_kb", "VmHWM": "peak_rss_kb"}
+
+
+def process_memory() -> dict[str, int]:
+    # Resident set size and its high-water mark in KiB, empty where /proc is missing.
+    memory: dict[str, int] = {}
+    try:
+        with open("/proc/self/status", encoding="ascii", errors="replace") as fh:
+            for line in fh:
+                key, _, value = line.partition(":")
+                if key in _STATUS_FIELDS:
+                    memory[_STATUS_FIELDS[key]] = int(value.split()[0])
+    except (OSError, ValueError, IndexError):
+        return {}
+    return memory
+
+
+class SdNotifier:
+    # Minimal sd_notify(3): one datagram per state change on $NOTIFY_SOCKET.
+    def __init__(self, socket_path: str | None = None) -> None:
+        path = os.environ.get("NOTIFY_SOCKET", "") if socket_path is None else socket_path
+        if path.startswith("@"):
+            path = "\0" + path[1:]
+        self._path = path
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._path)
+
+    def notify(self, state: str) -> bool:
+        if not self._path:
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.sendto(state.encode("utf-8"), self._path)
+            return True
+        except OSError as exc:
+            logging.debug("sd_notify %s failed: %s", state, exc)
+            return False
+        finally:
+            sock.close()
+
+    @staticmethod
+    def watchdog_interval() -> float | None:
+        # Seconds between required WATCHDOG=1 pings, None when systemd does not expect any.
+        usec = os.environ.get("WATCHDOG_USEC", "")
+        pid = os.environ.get("WATCHDOG_PID", "")
+        if not usec.isdigit() or (pid and pid != str(os.getpid())):
+            return None
+        return int(usec) / 1_000_000
+
+
+class Heartbeat:
+    __slots__ = ("name", "timeout", "last", "ident", "stalled", "busy_until", "_clock")
+
+    def __init__(self, name: str, timeout: float, clock: Callable[[], float]) -> None:
+        self.name = name
+        self.timeout = timeout
+        self._clock = clock
+        self.last = clock()
+        self.ident: int | None = None
+        self.stalled = False
+        self.busy_until = 0.0
+
+    def beat(self) -> None:
+        self.last = self._clock()
+        self.ident = threading.get_ident()
+        self.busy_until = 0.0
+
+    def expect_block(self, seconds: float) -> None:
+        # The owner is about to block on purpose (e.g. a spoken sequence): allow up to
+        # seconds of silence, until its next beat.
+        self.beat()
+        self.busy_until = self.last + seconds
+
+
+class LagProbe:
+    __slots__ = ("name", "post", "sent_at", "last", "max")
+
+    def __init__(self, name: str, post: Callable[[Callable[[], None]], Any]) -> None:
+        self.name = name
+        self.post = post
+        self.sent_at: float | None = None
+        self.last = 0.0
+        self.max = 0.0
+
+
+class Watchdog:
+    def __init__(
+        self,
+        stats: StatsRecorder | None,
+        notifier: SdNotifier | None = None,
+        check_interval_sec: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._stats = stats
+        self._notifier = notifier or SdNotifier()
+        self._clock = clock
+        interval = SdNotifier.watchdog_interval()
+        self._check_interval = min(check_interval_sec, interval / 2) if interval else check_interval_sec
+        self._heartbeats: dict[str, Heartbeat] = {}
+        self._probes: dict[str, LagProbe] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pings = 0
+
+    def register(self, name: str, timeout_sec: float) -> Heartbeat:
+        with self._lock:
+            heartbeat = Heartbeat(name, timeout_sec, self._clock)
+            self._heartbeats[name] = heartbeat
+            return heartbeat
+
+    def add_probe(self, name: str, post: Callable[[Callable[[], None]], Any]) -> None:
+        # post() must run the callback on the monitored event loop.
+        with self._lock:
+            self._probes[name] = LagProbe(name, post)
+
+    def _probe_done(self, probe: LagProbe, sent_at: float) -> None:
+        lag = self._clock() - sent_at
+        probe.last = lag
+        probe.max = max(probe.max, lag)
+        if probe.sent_at == sent_at:
+            probe.sent_at = None
+
+    def _send_probes(self) -> None:
+        with self._lock:
+            probes = list(self._probes.values())
+        now = self._clock()
+        for probe in probes:
+            if probe.sent_at is not None and now - probe.sent_at < PROBE_RETRY_SEC:
+                continue
+            sent_at = now
+            probe.sent_at = sent_at
+            probe.post(lambda probe=probe, sent_at=sent_at: self._probe_done(probe, sent_at))
+
+    def check(self) -> list[str]:
+        # One watchdog pass: reports new stalls, pings systemd only when everything is alive.
+        now = self._clock()
+        with self._lock:
+            heartbeats = list(self._heartbeats.values())
+        stalled = []
+        for heartbeat in heartbeats:
+            age = now - heartbeat.last
+            if age <= heartbeat.timeout or now < heartbeat.busy_until:
+                if heartbeat.stalled:
+                    heartbeat.stalled = False
+                    logging.warning("Watchdog: %s recovered", heartbeat.name)
+                continue
+            stalled.append(heartbeat.name)
+            if not heartbeat.stalled:
+                heartbeat.stalled = True
+                self._report_stall(heartbeat, age)
+
+        self._send_probes()
+        if not stalled and self._notifier.notify("WATCHDOG=1"):
+            self._pings += 1
+        return stalled
+
+    def _report_stall(self, heartbeat: Heartbeat, age: float) -> None:
+        frame = sys._current_frames().get(heartbeat.ident) if heartbeat.ident is not None else None
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "thread not running"
+        logging.error("Watchdog: %s silent for %.1fs\n%s", heartbeat.name, age, stack)
+        if self._stats is not None:
+            self._stats.record_error("watchdog_stall", f"{heartbeat.name} silent for {age:.1f}s\n{stack}")
+
+    def ready(self) -> None:
+        self._notifier.notify("READY=1")
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="marrabbio-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._notifier.notify("STOPPING=1")
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self._check_interval):
+            try:
+                self.check()
+            except Exception:
+                logging.exception("Watchdog check failed")
+
+    def snapshot(self) -> dict[str, Any]:
+        now = self._clock()
+        with self._lock:
+            heartbeats = list(self._heartbeats.values())
+            probes = list(self._probes.values())
+        return {
+            "systemd": self._notifier.enabled,
+            "pings": self._pings,
+            "heartbeats": {
+                hb.name: {"age_ms": round((now - hb.last) * 1000, 1), "stalled": hb.stalled} for hb in heartbeats
+            },
+            "lag": {p.name: {"last_ms": round(p.last * 1000, 3), "max_ms": round(p.max * 1000, 3)} for p in probes},
+        }
@@ -1,14 +1,154 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from datetime import datetime
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import json
+import os
 from pathlib import Path
+import re
+import socket
 import threading
-from typing import Any, Callable
+import time
+import tracemalloc
+from typing import Any, Callable, Iterator
 from urllib.parse import parse_qs, urlparse
 
-from .stats import day_detail, list_calendar_for_month, top_songs_all_time, top_songs_for_day
+from .catalog import SongCatalog
+from .eventindex import EventIndex
+from .stats import (
+    PlayCounts,
+    dashboard,
+    day_detail,
+    day_full,
+    list_calendar_for_month,
+    top_songs_all_time,
+    top_songs_for_day,
+)
+from .uplink import StatsAggregator, decode_ingest_body
+from .watchdog import process_memory
+
+
+MAX_INGEST_BODY_BYTES = 4 * 1024 * 1024
+MEDIA_RETRY_AFTER_SEC = 5
+# A client that takes nothing for this long (paused <audio>, dead tab) is dropped,
+# which also gives its media stream slot back.
+REQUEST_TIMEOUT_SEC = 30
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_DAY_IN_PATH = re.compile(r"^(/api/(?:top/)?day/)[^/]+")
+# History queries whose time and memory cost is tracked, by route.
+MEASURED_ROUTES = frozenset(
+    {
+        "/api/calendar",
+        "/api/dashboard",
+        "/api/top/all",
+        "/api/top/day/<day>",
+        "/api/day/<day>",
+        "/api/day/<day>/events",
+        "/api/day/<day>/full",
+        "/api/catalog/search",
+    }
+)
+
+
+def _parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    # Returns the inclusive (start, end) of a single byte range, None to send the whole
+    # file (no header, another unit or several ranges), raises ValueError when it cannot
+    # be satisfied.
+    header = (header or "").strip()
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    match = _RANGE.match(header)
+    if match is None:
+        raise ValueError(header)
+    first, last = match.groups()
+    if not first and not last:
+        raise ValueError(header)
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+def _year_month(q: dict[str, list[str]]) -> tuple[int, int]:
+    now = datetime.utcnow()
+    try:
+        year = int(q.get("year", [now.year])[0])
+    except (TypeError, ValueError):
+        year = now.year
+    try:
+        month = int(q.get("month", [now.month])[0])
+    except (TypeError, ValueError):
+        month = now.month
+    if month < 1 or month > 12:
+        month = now.month
+    return year, month
+
+
+class QueryMetrics:
+    # Per-route duration and memory of history queries. Peak allocation needs tracemalloc
+    # (trace_allocations), growth of the process RSS high-water mark is always tracked.
+    # Queries running at the same time share the same peak, so values are upper bounds.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._routes: dict[str, dict[str, Any]] = {}
+
+    @contextmanager
+    def measure(self, route: str) -> Iterator[None]:
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        hwm = process_memory().get("peak_rss_kb", 0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            growth_kb = max(0, process_memory().get("peak_rss_kb", 0) - hwm)
+            peak_kb = max(0, tracemalloc.get_traced_memory()[1] - base) // 1024 if tracing else None
+            self._record(route, elapsed_ms, growth_kb, peak_kb)
+
+    def _record(self, route: str, elapsed_ms: float, growth_kb: int, peak_kb: int | None) -> None:
+        with self._lock:
+            row = self._routes.get(route)
+            if row is None:
+                row = self._routes[route] = {
+                    "count": 0,
+                    "last_ms": 0.0,
+                    "max_ms": 0.0,
+                    "rss_growth_kb": 0,
+                    "last_peak_kb": None,
+                    "max_peak_kb": None,
+                }
+            row["count"] += 1
+            row["last_ms"] = round(elapsed_ms, 1)
+            row["max_ms"] = max(row["max_ms"], row["last_ms"])
+            row["rss_growth_kb"] += growth_kb
+            if peak_kb is not None:
+                row["last_peak_kb"] = peak_kb
+                row["max_peak_kb"] = max(row["max_peak_kb"] or 0, peak_kb)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            routes = {route: dict(row) for route, row in sorted(self._routes.items())}
+        return {"memory": process_memory(), "tracing": tracemalloc.is_tracing(), "routes": routes}
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    on_tick: Callable[[], None] | None = None
+
+    def service_actions(self) -> None:
+        # Called by serve_forever() on every poll loop, also when idle.
+        if self.on_tick is not None:
+            self.on_tick()
 
 
 class StatsWebServer:
@@ -19,14 +159,28 @@ class StatsWebServer:
         stats_dir: Path,
         get_live_snapshot: Callable[[], dict[str, Any]],
         refresh_seconds: int,
+        aggregator: StatsAggregator | None = None,
+        heartbeat: Callable[[], None] | None = None,
+        catalog: SongCatalog | None = None,
+        max_media_streams: int = 2,
+        trace_allocations: bool = False,
     ) -> None:
         self._host = host
         self._port = port
         self._stats_dir = stats_dir
         self._get_live_snapshot = get_live_snapshot
         self._refresh_seconds = refresh_seconds
+        self._aggregator = aggregator
+        self._event_index = EventIndex(stats_dir)
+        self._catalog = catalog
+        self._play_counts = PlayCounts(stats_dir)
+        # Previews must not starve the SD card while the phone is playing.
+        self._media_slots = threading.BoundedSemaphore(max(1, max_media_streams))
+        self._trace_allocations = trace_allocations
+        self.query_metrics = QueryMetrics()
         self._static_dir = Path(__file__).resolve().parent.parent / "ui"
-        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server = _HTTPServer((host, port), self._make_handler())
+        self._server.on_tick = heartbeat
         self._thread: threading.Thread | None = None
 
     def _make_handler(self) -> type[BaseHTTPRequestHandler]:
@@ -34,8 +188,16 @@ class StatsWebServer:
         get_live_snapshot = self._get_live_snapshot
         static_dir = self._static_dir
         refresh_seconds = self._refresh_seconds
+        aggregator = self._aggregator
+        event_index = self._event_index
+        catalog = self._catalog
+        play_counts = self._play_counts
+        media_slots = self._media_slots
+        query_metrics = self.query_metrics
 
         class Handler(BaseHTTPRequestHandler):
+            timeout = REQUEST_TIMEOUT_SEC
+
             def _write_json(self, payload: dict[str, Any], status: int = 200) -> None:
                 data = json.dumps(payload).encode("utf-8")
                 self.send_response(status)
@@ -55,10 +217,75 @@ class StatsWebServer:
                 self.end_headers()
                 self.wfile.write(data)
 
+            def _stream_media(self, code: str, head_only: bool = False) -> None:
+                entry = catalog.get(code) if catalog is not None else None
+                if entry is None:
+                    self._write_json({"error": "unknown code"}, status=404)
+                    return
+                if not media_slots.acquire(blocking=False):
+                    self.send_response(503)
+                    self.send_header("Retry-After", str(MEDIA_RETRY_AFTER_SEC))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                try:
+                    try:
+                        fh = entry.path.open("rb")
+                    except OSError:
+                        self._write_json({"error": "media file missing"}, status=404)
+                        return
+                    with fh:
+                        size = os.fstat(fh.fileno()).st_size
+                        try:
+                            byte_range = _parse_range(self.headers.get("Range"), size)
+                        except ValueError:
+                            self.send_response(416)
+                            self.send_header("Content-Range", f"bytes */{size}")
+                            self.send_header("Content-Length", "0")
+                            self.end_headers()
+                            return
+                        start, end = byte_range if byte_range is not None else (0, size - 1)
+                        self.send_response(206 if byte_range is not None else 200)
+                        self.send_header("Content-Type", "audio/mpeg")
+                        self.send_header("Accept-Ranges", "bytes")
+                        self.send_header("Content-Length", str(end - start + 1))
+                        if byte_range is not None:
+                            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                        self.end_headers()
+                        if not head_only:
+                            # sendfile() where the OS has it, plain sends otherwise; both honour the timeout.
+                            self.connection.sendfile(fh, start, end - start + 1)
+                except (BrokenPipeError, ConnectionResetError, socket.timeout):
+                    # Browsers drop the connection whenever the user seeks, paused players stall.
+                    self.close_connection = True
+                finally:
+                    media_slots.release()
+
+            def do_HEAD(self) -> None:  # noqa: N802
+                path = urlparse(self.path).path
+                if path.startswith("/media/"):
+                    self._stream_media(path.split("/", 2)[2], head_only=True)
+                    return
+                self.send_response(405)
+                self.send_header("Allow", "GET")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
             def do_GET(self) -> None:  # noqa: N802
                 parsed = urlparse(self.path)
                 path = parsed.path
                 q = parse_qs(parsed.query)
+                route = _DAY_IN_PATH.sub(r"\1<day>", path)
+                if route not in MEASURED_ROUTES:
+                    self._get(path, q)
+                    return
+                with query_metrics.measure(route):
+                    self._get(path, q)
+
+            def _get(self, path: str, q: dict[str, list[str]]) -> None:
+                if path.startswith("/media/"):
+                    self._stream_media(path.split("/", 2)[2])
+                    return
 
                 if path == "/":
                     self._write_file(static_dir / "index.html", "text/html; charset=utf-8")
@@ -73,31 +300,54 @@ class StatsWebServer:
                     return
 
                 if path == "/api/live":
-                    self._write_json(get_live_snapshot())
+                    self._write_json({**get_live_snapshot(), "queries": query_metrics.snapshot()})
+                    return
+
+                if path == "/api/metrics":
+                    self._write_json(query_metrics.snapshot())
                     return
 
                 if path == "/api/calendar":
-                    now = datetime.utcnow()
-                    try:
-                        year = int(q.get("year", [now.year])[0])
-                    except (TypeError, ValueError):
-                        year = now.year
-                    try:
-                        month = int(q.get("month", [now.month])[0])
-                    except (TypeError, ValueError):
-                        month = now.month
-                    if month < 1 or month > 12:
-                        month = now.month
+                    year, month = _year_month(q)
                     self._write_json({"year": year, "month": month, "days": list_calendar_for_month(stats_dir, year, month)})
                     return
 
+                line_id = q.get("line", [""])[0] or None
+
+                if path == "/api/dashboard":
+                    # Everything the dashboard shows on load, from one pass over the stats files.
+                    year, month = _year_month(q)
+                    day = q.get("day", [""])[0] or None
+                    view = dashboard(stats_dir, year, month, day=day, line_id=line_id)
+                    view["live"] = get_live_snapshot()
+                    view["line"] = line_id
+                    self._write_json(view)
+                    return
+
                 if path == "/api/top/all":
-                    self._write_json({"items": top_songs_all_time(stats_dir)})
+                    self._write_json({"line": line_id, "items": top_songs_all_time(stats_dir, line_id=line_id)})
                     return
 
                 if path.startswith("/api/top/day/"):
                     day = path.split("/", 4)[4]
-                    self._write_json({"day": day, "items": top_songs_for_day(stats_dir, day)})
+                    self._write_json({"day": day, "line": line_id, "items": top_songs_for_day(stats_dir, day, line_id=line_id)})
+                    return
+
+                if path.startswith("/api/day/") and path.endswith("/events"):
+                    day = path.split("/")[3]
+                    try:
+                        offset = int(q.get("offset", ["0"])[0])
+                        limit = int(q.get("limit", ["50"])[0])
+                    except ValueError:
+                        self._write_json({"error": "invalid offset or limit"}, status=400)
+                        return
+                    types = {t for value in q.get("type", []) for t in value.split(",") if t}
+                    self._write_json(event_index.events_for_day(day, offset, limit, types or None))
+                    return
+
+                if path.startswith("/api/day/") and path.endswith("/full"):
+                    day = path.split("/")[3]
+                    self._write_json({**day_full(stats_dir, day, line_id=line_id), "line": line_id})
                     return
 
                 if path.startswith("/api/day/"):
@@ -105,18 +355,61 @@ class StatsWebServer:
                     self._write_json(day_detail(stats_dir, day))
                     return
 
+                if path == "/api/catalog/search":
+                    if catalog is None:
+                        self._write_json({"error": "catalog not available"}, status=404)
+                        return
+                    try:
+                        offset = int(q.get("offset", ["0"])[0])
+                        limit = int(q.get("limit", ["20"])[0])
+                    except ValueError:
+                        self._write_json({"error": "invalid offset or limit"}, status=400)
+                        return
+                    query = q.get("q", [""])[0]
+                    self._write_json(catalog.search_page(query, offset, limit, play_counts.counts()))
+                    return
+
                 if path == "/api/config":
                     self._write_json({"refresh_seconds": refresh_seconds})
                     return
 
                 self._write_json({"error": "not found"}, status=404)
 
+            def do_POST(self) -> None:  # noqa: N802
+                path = urlparse(self.path).path
+                if path != "/api/ingest" or aggregator is None:
+                    self._write_json({"error": "not found"}, status=404)
+                    return
+                if not aggregator.authorized(self.headers.get("Authorization")):
+                    self._write_json({"error": "unauthorized"}, status=401)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", "0"))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > MAX_INGEST_BODY_BYTES:
+                    self._write_json({"error": "invalid length"}, status=413)
+                    return
+                try:
+                    payload = decode_ingest_body(self.rfile.read(length), self.headers.get("Content-Encoding"))
+                except (OSError, ValueError, EOFError):
+                    self._write_json({"error": "invalid payload"}, status=400)
+                    return
+                status, reply = aggregator.ingest(payload)
+                self._write_json(reply, status=status)
+
             def log_message(self, _format: str, *_args: object) -> None:
                 return
 
         return Handler
 
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
     def start(self) -> None:
+        if self._trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
         self._thread = threading.Thread(target=self._server.serve_forever, name="marrabbio-web", daemon=True)
         self._thread.start()
 
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+from pathlib import Path
+import signal
+import struct
+import threading
+import time
+from typing import Any, Callable
+
+from .catalog import CatalogEntry, SongCatalog
+from .stats import StatsRecorder
+from .web import StatsWebServer
+
+# Header: sequence number (odd while the parent writes), child tick counter, payload length.
+_HEADER = struct.Struct("<QQI")
+_HEADER_BYTES = 24
+SNAPSHOT_REGION_BYTES = 1024 * 1024
+READ_ATTEMPTS = 100
+HANG_TIMEOUT_SEC = 30.0
+MAX_RESTART_BACKOFF_SEC = 30.0
+STABLE_RUN_SEC = 60.0
+
+
+class SnapshotRegion:
+    # Seqlock over shared memory: the parent is the only writer of the snapshot and the
+    # child the only writer of the tick counter, so neither side ever takes a lock.
+    def __init__(self, name: str | None = None, size: int = SNAPSHOT_REGION_BYTES) -> None:
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=_HEADER_BYTES + size)
+            _HEADER.pack_into(self._shm.buf, 0, 0, 0, 0)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._capacity = self._shm.size - _HEADER_BYTES
+        self._last: dict[str, Any] = {}
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def publish(self, snapshot: dict[str, Any]) -> None:
+        payload = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(payload) > self._capacity:
+            logging.warning("Live snapshot of %s bytes does not fit the shared region", len(payload))
+            payload = json.dumps({"error": "snapshot too large", "bytes": len(payload)}).encode("utf-8")
+        buf = self._shm.buf
+        seq = struct.unpack_from("<Q", buf, 0)[0]
+        struct.pack_into("<Q", buf, 0, seq + 1)
+        buf[_HEADER_BYTES : _HEADER_BYTES + len(payload)] = payload
+        struct.pack_into("<I", buf, 16, len(payload))
+        struct.pack_into("<Q", buf, 0, seq + 2)
+
+    def read(self) -> dict[str, Any]:
+        buf = self._shm.buf
+        for _ in range(READ_ATTEMPTS):
+            seq, _ticks, length = _HEADER.unpack_from(buf, 0)
+            if seq & 1:
+                time.sleep(0)
+                continue
+            payload = bytes(buf[_HEADER_BYTES : _HEADER_BYTES + length])
+            if struct.unpack_from("<Q", buf, 0)[0] != seq:
+                continue
+            if not length:
+                return {}
+            try:
+                self._last = json.loads(payload)
+            except ValueError:
+                continue
+            return self._last
+        # Writer kept racing us: serve the previous snapshot rather than block the request.
+        return self._last
+
+    def tick(self) -> None:
+        ticks = struct.unpack_from("<Q", self._shm.buf, 8)[0]
+        struct.pack_into("<Q", self._shm.buf, 8, ticks + 1)
+
+    @property
+    def ticks(self) -> int:
+        return struct.unpack_from("<Q", self._shm.buf, 8)[0]
+
+    def close(self) -> None:
+        self._shm.close()
+
+    def unlink(self) -> None:
+        self._shm.unlink()
+
+
+def _serve_child(
+    region_name: str,
+    host: str,
+    port: int,
+    stats_dir: str,
+    refresh_seconds: int,
+    log_level: int,
+    catalog_entries: tuple[CatalogEntry, ...] | None = None,
+    max_media_streams: int = 2,
+    trace_allocations: bool = False,
+) -> None:
+    # The parent decides when the dashboard stops; Ctrl-C on the terminal must not kill it first.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_args: stop_event.set())
+    logging.basicConfig(level=log_level, format="%(asctime)s %(levelname)s [web] %(message)s")
+
+    region = SnapshotRegion(region_name)
+    web = StatsWebServer(
+        host=host,
+        port=port,
+        stats_dir=Path(stats_dir),
+        get_live_snapshot=region.read,
+        refresh_seconds=refresh_seconds,
+        heartbeat=region.tick,
+        catalog=SongCatalog(list(catalog_entries)) if catalog_entries is not None else None,
+        max_media_streams=max_media_streams,
+        trace_allocations=trace_allocations,
+    )
+    web.start()
+    parent = os.getppid()
+    try:
+        while not stop_event.wait(1.0):
+            if os.getppid() != parent:
+                logging.warning("Parent process gone, stopping web dashboard")
+                break
+    finally:
+        web.stop()
+        region.close()
+
+
+class WebProcess:
+    # StatsWebServer in a supervised child process, so history queries never hold the
+    # interpreter lock of the process that handles the telephone.
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        stats_dir: Path,
+        get_live_snapshot: Callable[[], dict[str, Any]],
+        refresh_seconds: int,
+        snapshot_interval_sec: float = 0.5,
+        hang_timeout_sec: float = HANG_TIMEOUT_SEC,
+        stats: StatsRecorder | None = None,
+        heartbeat: Callable[[], None] | None = None,
+        catalog: SongCatalog | None = None,
+        max_media_streams: int = 2,
+        trace_allocations: bool = False,
+    ) -> None:
+        self._host = host
+        self._port = port
+        self._stats_dir = stats_dir
+        self._get_live_snapshot = get_live_snapshot
+        self._refresh_seconds = refresh_seconds
+        self._interval = snapshot_interval_sec
+        self._hang_timeout = hang_timeout_sec
+        self._stats = stats
+        self._heartbeat = heartbeat or (lambda: None)
+        # Entries are pickled to the child, which rebuilds the index itself.
+        self._catalog_entries = catalog.entries if catalog is not None else None
+        self._max_media_streams = max_media_streams
+        self._trace_allocations = trace_allocations
+        self._context = multiprocessing.get_context("spawn")
+        self._region: SnapshotRegion | None = None
+        self._process: multiprocessing.process.BaseProcess | None = None
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started_at = 0.0
+        self._last_ticks = -1
+        self._last_tick_at = 0.0
+        self._restart_at: float | None = None
+        self._failures = 0
+        self._restarts = 0
+        self._last_exit: int | None = None
+
+    def start(self) -> None:
+        self._region = SnapshotRegion()
+        self._publish()
+        self._spawn()
+        self._thread = threading.Thread(target=self._run, name="marrabbio-web-supervisor", daemon=True)
+        self._thread.start()
+
+    def _spawn(self) -> None:
+        assert self._region is not None
+        self._process = self._context.Process(
+            target=_serve_child,
+            args=(
+                self._region.name,
+                self._host,
+                self._port,
+                str(self._stats_dir),
+                self._refresh_seconds,
+                logging.getLogger().getEffectiveLevel(),
+                self._catalog_entries,
+                self._max_media_streams,
+                self._trace_allocations,
+            ),
+            name="marrabbio-web",
+            daemon=True,
+        )
+        self._process.start()
+        now = time.monotonic()
+        self._started_at = now
+        self._last_tick_at = now
+        self._last_ticks = -1
+        self._restart_at = None
+        logging.info("Web dashboard process started (pid %s)", self._process.pid)
+
+    def _publish(self) -> None:
+        assert self._region is not None
+        try:
+            self._region.publish(self._get_live_snapshot())
+        except Exception:
+            logging.exception("Cannot publish live snapshot")
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self._interval):
+            self._heartbeat()
+            self._publish()
+            try:
+                self._supervise()
+            except Exception:
+                logging.exception("Web process supervision failed")
+
+    def _supervise(self) -> None:
+        assert self._region is not None and self._process is not None
+        now = time.monotonic()
+        if self._restart_at is not None:
+            if now >= self._restart_at:
+                self._restarts += 1
+                self._spawn()
+            return
+
+        if self._process.is_alive():
+            ticks = self._region.ticks
+            if ticks != self._last_ticks:
+                self._last_ticks = ticks
+                self._last_tick_at = now
+                return
+            if now - self._last_tick_at <= self._hang_timeout:
+                return
+            self._report(f"web process {self._process.pid} unresponsive for {now - self._last_tick_at:.1f}s")
+            self._process.kill()
+            self._process.join(timeout=2)
+        else:
+            self._report(f"web process {self._process.pid} exited with code {self._process.exitcode}")
+
+        self._last_exit = self._process.exitcode
+        # Back off when the child keeps dying right away (e.g. port already taken).
+        self._failures = 0 if now - self._started_at >= STABLE_RUN_SEC else self._failures + 1
+        self._restart_at = now + min(MAX_RESTART_BACKOFF_SEC, 2.0 ** self._failures)
+
+    def _report(self, details: str) -> None:
+        logging.error("Restarting dashboard: %s", details)
+        if self._stats is not None:
+            self._stats.record_error("web_process_restarted", details)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.kill()
+                self._process.join(timeout=2)
+            self._process = None
+        if self._region is not None:
+            self._region.close()
+            self._region.unlink()
+            self._region = None
+
+    def snapshot(self) -> dict[str, Any]:
+        process = self._process
+        return {
+            "pid": process.pid if process is not None else None,
+            "alive": bool(process is not None and process.is_alive()),
+            "restarts": self._restarts,
+            "last_exit": self._last_exit,
+        }
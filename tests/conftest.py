@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+from typing import Callable
+
+import pytest
+
+from app import mixer as mixer_module
+from app.mixer import AudioFormat
+
+# Stand-in for mpg123: the "mp3" holds "<sample> <frames> [<delay_sec>]", -k skips frames.
+FAKE_DECODER = """
+import sys, time
+value, frames, *delay = open(sys.argv[1]).read().split()
+skip = int(sys.argv[2])
+time.sleep(float(delay[0]) if delay else 0)
+sys.stdout.buffer.write(int(value).to_bytes(2, "little", signed=True) * (2 * max(0, int(frames) - skip)))
+"""
+
+
+@pytest.fixture
+def fake_song(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Callable[..., Path]:
+    # Decodes songs written by the returned factory with a stereo constant sample.
+    def command(audio_file: Path, fmt: AudioFormat, skip_frames: int = 0) -> list[str]:
+        return [sys.executable, "-c", FAKE_DECODER, str(audio_file), str(skip_frames)]
+
+    monkeypatch.setattr(mixer_module, "decoder_command", command)
+
+    def make(name: str, value: int, frames: int, delay: float = 0.0) -> Path:
+        path = tmp_path / name
+        path.write_text(f"{value} {frames} {delay}", encoding="ascii")
+        return path
+
+    return make
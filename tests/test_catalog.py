@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from app.catalog import MAX_SEARCH_LIMIT, SongCatalog, _normalize, load_catalog_entries
+from app.stats import PlayCounts
+
+SONGS_FILE = Path(__file__).resolve().parent.parent / "songs.txt"
+
+
+@pytest.fixture(scope="module")
+def catalog() -> SongCatalog:
+    return SongCatalog(load_catalog_entries(SONGS_FILE, SONGS_FILE.parent))
+
+
+def _scan(catalog: SongCatalog, query: str) -> set[str]:
+    # Reference search: every token is a word prefix (1-2 chars) or part of a word.
+    tokens = _normalize(query).split()
+    found = set()
+    for entry in catalog.entries:
+        words = _normalize(f"{entry.title} {entry.year or ''} {entry.code}").split()
+        if all(any(word.startswith(t) if len(t) < 3 else t in word for word in words) for t in tokens):
+            found.add(entry.code)
+    return found
+
+
+def test_entries_split_title_and_year(tmp_path: Path) -> None:
+    songs = tmp_path / "songs.txt"
+    songs.write_text(
+        "# comment\n001 Lupin III (1978)\n002 RahXephon (2002) (ITA - INTERROTTA)\n003 Untitled\nbroken\n",
+        encoding="utf-8",
+    )
+    entries = load_catalog_entries(songs, tmp_path)
+    assert [(e.code, e.title, e.year) for e in entries] == [
+        ("001", "Lupin III", 1978),
+        ("002", "RahXephon (ITA - INTERROTTA)", 2002),
+        ("003", "Untitled", None),
+    ]
+    assert entries[1].name == "RahXephon (2002) (ITA - INTERROTTA)"
+    assert entries[1].path == tmp_path / "RahXephon (2002) (ITA - INTERROTTA).mp3"
+
+
+@pytest.mark.parametrize(
+    "query", ["lupin", "ale", "Barbapapa", "s", "ca fi", "199", "dragon ball", "zzzz", "o-o", "oo"]
+)
+def test_search_matches_a_full_scan(catalog: SongCatalog, query: str) -> None:
+    total, entries = catalog.search(query, limit=MAX_SEARCH_LIMIT)
+    expected = _scan(catalog, query)
+    assert total == len(expected)
+    if total <= MAX_SEARCH_LIMIT:
+        assert {e.code for e in entries} == expected
+
+
+def test_search_ignores_case_and_accents(catalog: SongCatalog) -> None:
+    assert catalog.search("BARBAPAPA")[1][0].title == "Barbapapà"
+    assert catalog.search("sebastien")[1] == catalog.search("Sébastien")[1]
+
+
+def test_exact_code_comes_first(catalog: SongCatalog) -> None:
+    total, entries = catalog.search("073")
+    assert total >= 1
+    assert entries[0].code == "073"
+
+
+def test_pages_cover_the_results_once(catalog: SongCatalog) -> None:
+    total, everything = catalog.search("a", limit=MAX_SEARCH_LIMIT)
+    seen = []
+    offset = 0
+    while offset < min(total, MAX_SEARCH_LIMIT):
+        seen += catalog.search("a", offset=offset, limit=7)[1]
+        offset += 7
+    assert seen[:MAX_SEARCH_LIMIT] == everything
+
+
+def test_empty_query_browses_by_code(catalog: SongCatalog) -> None:
+    total, entries = catalog.search("  ", offset=10, limit=5)
+    assert total == len(catalog)
+    codes = sorted(e.code for e in catalog.entries)
+    assert [e.code for e in entries] == codes[10:15]
+
+
+def test_search_page(catalog: SongCatalog) -> None:
+    page = catalog.search_page("lupin", limit=1000, play_counts={"001": 4})
+    assert page["limit"] == MAX_SEARCH_LIMIT
+    assert page["next_offset"] is None
+    assert all(item["count"] == 0 for item in page["items"] if item["code"] != "001")
+
+    first = catalog.search_page("", offset=0, limit=2, play_counts={"001": 4})
+    assert first["next_offset"] == 2
+    entry = catalog.get("001")
+    assert first["items"][0] == {"code": "001", "title": entry.title, "year": entry.year, "count": 4}
+
+
+def test_play_counts_follow_appended_and_rewritten_files(tmp_path: Path) -> None:
+    line = '{"ts":"2026-03-01T10:00:00+00:00","event":"%s","data":{"code":"%s"}}\n'
+    first = tmp_path / "stats_2026-03-01_10-00-00.txt"
+    events = [("song_started", "001"), ("error", "001"), ("song_started", "002")]
+    first.write_text("".join(line % event for event in events), encoding="utf-8")
+    device = tmp_path / "devices" / "box-1"
+    device.mkdir(parents=True)
+    (device / first.name).write_text(line % ("song_started", "001") + '{"ts":', encoding="utf-8")
+    counts = PlayCounts(tmp_path, refresh_sec=0.0)
+    assert counts.counts() == {"001": 2, "002": 1}
+
+    with first.open("a", encoding="utf-8") as fh:
+        fh.write(line % ("song_started", "002"))
+    with (device / first.name).open("a", encoding="utf-8") as fh:
+        fh.write('"2026-03-01T10:00:01+00:00","event":"song_started","data":{"code":"003"}}\n')
+    assert counts.counts() == {"001": 2, "002": 2, "003": 1}
+
+    first.write_text(line % ("song_started", "004"), encoding="utf-8")
+    assert counts.counts() == {"001": 1, "003": 1, "004": 1}
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable
+
+from app.config import Timing
+from app.dialer import DialController
+from app.scheduler import Scheduler
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakePlayer:
+    overlays_effects = True
+
+    def __init__(self) -> None:
+        self.queued: list[str] = []
+        self.playing: str | None = None
+
+    def play_file(self, audio_file: Path, loop_count: int | None = None) -> None:
+        pass
+
+    def play_effect(self, audio_file: Path) -> None:
+        pass
+
+    def stop(self) -> None:
+        self.playing = None
+
+    def enqueue(self, audio_file: Path, on_start: Callable[[], None] | None = None) -> int:
+        self.queued.append(audio_file.name)
+        if self.playing is not None:
+            return len(self.queued) - 1
+        self.playing = audio_file.name
+        if on_start is not None:
+            on_start()
+        return 0
+
+    def queue_snapshot(self) -> dict[str, Any]:
+        return {"playing": self.playing, "queued": []}
+
+
+class FakeStats:
+    def __init__(self) -> None:
+        self.events: list[tuple[str, Any]] = []
+
+    def record_song_started(self, code: str, found: bool, title: str = "") -> None:
+        self.events.append(("song_started", (code, found, title)))
+
+    def record_error(self, error: str, details: str = "") -> None:
+        self.events.append(("error", error))
+
+
+def _jukebox(tmp_path: Path, songs: dict[str, Path]) -> tuple[DialController, FakePlayer, FakeStats, Scheduler]:
+    scheduler = Scheduler(clock=FakeClock())
+    player = FakePlayer()
+    stats = FakeStats()
+    dial = DialController(
+        player,
+        songs,
+        fallback_song_file=tmp_path / "Utaimashou.mp3",
+        digit_audio_dir=tmp_path,
+        media_dir=tmp_path,
+        dial_tone_file=tmp_path / "dial.mp3",
+        timing=Timing(),
+        stats=stats,
+        scheduler=scheduler,
+        jukebox=True,
+    )
+    return dial, player, stats, scheduler
+
+
+def _dial(dial: DialController, scheduler: Scheduler, code: str) -> None:
+    for digit in code:
+        dial.on_rotary_engaged()
+        dial.on_rotary_released(int(digit) or 10)
+    scheduler._clock.now += Timing().play_song_delay_sec
+    scheduler.run_pending()
+
+
+def test_jukebox_queues_the_fallback_when_the_song_file_is_missing(tmp_path: Path) -> None:
+    (tmp_path / "Utaimashou.mp3").write_bytes(b"")
+    dial, player, stats, scheduler = _jukebox(tmp_path, {"001": tmp_path / "Gone (2001).mp3"})
+    dial.on_hook_lifted()
+    _dial(dial, scheduler, "001")
+
+    assert player.queued == ["Utaimashou.mp3"]
+    assert stats.events == [
+        ("error", "missing_song_file"),
+        ("song_started", ("001", False, "Utaimashou")),
+    ]
+
+
+def test_jukebox_records_the_start_when_nothing_can_play(tmp_path: Path) -> None:
+    dial, player, stats, scheduler = _jukebox(tmp_path, {"001": tmp_path / "Gone (2001).mp3"})
+    dial.on_hook_lifted()
+    _dial(dial, scheduler, "001")
+
+    assert player.queued == []
+    assert stats.events == [
+        ("error", "missing_song_file"),
+        ("song_started", ("001", False, "Utaimashou")),
+    ]
+
+
+def test_jukebox_queues_codes_dialed_during_playback(tmp_path: Path) -> None:
+    songs = {code: tmp_path / f"{name}.mp3" for code, name in (("001", "A (2001)"), ("002", "B (2002)"))}
+    for path in songs.values():
+        path.write_bytes(b"")
+    dial, player, stats, scheduler = _jukebox(tmp_path, songs)
+    dial.on_hook_lifted()
+    _dial(dial, scheduler, "001")
+    _dial(dial, scheduler, "002")
+
+    assert player.queued == ["A (2001).mp3", "B (2002).mp3"]
+    assert stats.events == [("song_started", ("001", True, "A (2001)"))]
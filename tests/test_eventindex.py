@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from datetime import date
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.eventindex import INDEX_DIR, MAX_PAGE_SIZE, EventIndex
+from app.history import HistoryProfile, generate_history
+from app.stats import _files_for_month, _parse_ts_to_day, _session_name
+
+SONGS_FILE = Path(__file__).resolve().parent.parent / "songs.txt"
+DAY = "2026-03-01"
+
+
+def _full_scan(stats_dir: Path, day: str, event_types: set[str] | None = None) -> list[dict[str, Any]]:
+    year, month, _ = (int(x) for x in day.split("-"))
+    items = []
+    for path in _files_for_month(stats_dir, year, month):
+        for raw in path.read_bytes().splitlines():
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                continue
+            if _parse_ts_to_day(entry["ts"]) != day:
+                continue
+            if event_types and entry["event"] not in event_types:
+                continue
+            items.append({"session": _session_name(stats_dir, path), **entry})
+    return items
+
+
+def _all_pages(index: EventIndex, day: str, limit: int, event_types: set[str] | None = None) -> list[dict[str, Any]]:
+    items: list[dict[str, Any]] = []
+    offset: int | None = 0
+    while offset is not None:
+        page = index.events_for_day(day, offset=offset, limit=limit, event_types=event_types)
+        assert page["total"] >= len(items)
+        items += page["items"]
+        offset = page["next_offset"]
+    return items
+
+
+@pytest.fixture(scope="module")
+def stats_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    # Three sessions a day, the last one of February runs past midnight into March.
+    out = tmp_path_factory.mktemp("stats")
+    profile = HistoryProfile(days=5, end_day=date(2026, 3, 2), sessions_per_day=3, corrupted_ratio=0.02, seed=3)
+    generate_history(out, SONGS_FILE, profile)
+    return out
+
+
+@pytest.mark.parametrize("limit", [1, 7, 50, MAX_PAGE_SIZE])
+def test_pages_match_a_full_scan(stats_dir: Path, limit: int) -> None:
+    expected = _full_scan(stats_dir, DAY)
+    assert len({item["session"] for item in expected}) > 3
+    assert _all_pages(EventIndex(stats_dir), DAY, limit) == expected
+
+
+def test_type_filter_matches_a_full_scan(stats_dir: Path) -> None:
+    types = {"error", "session_stopped"}
+    index = EventIndex(stats_dir)
+    expected = _full_scan(stats_dir, DAY, types)
+    assert expected
+    assert _all_pages(index, DAY, 3, types) == expected
+    assert index.events_for_day(DAY, event_types=types)["total"] == len(expected)
+
+
+def test_page_bounds(stats_dir: Path) -> None:
+    index = EventIndex(stats_dir)
+    total = len(_full_scan(stats_dir, DAY))
+    last = index.events_for_day(DAY, offset=total - 1, limit=10)
+    assert len(last["items"]) == 1 and last["next_offset"] is None
+    assert index.events_for_day(DAY, offset=total, limit=10)["items"] == []
+    assert index.events_for_day(DAY, limit=10_000)["limit"] == MAX_PAGE_SIZE
+    assert index.events_for_day("not-a-day")["total"] == 0
+
+
+def test_appended_lines_extend_the_saved_index(tmp_path: Path) -> None:
+    session = tmp_path / "stats_2026-03-01_10-00-00.txt"
+    line = '{"ts":"2026-03-01T10:00:%02d+00:00","event":"song_started","data":{"code":"001"}}\n'
+    session.write_text(line % 0 + line % 1 + line[:20], encoding="utf-8")
+    assert EventIndex(tmp_path).events_for_day(DAY)["total"] == 2
+    assert list((tmp_path / INDEX_DIR).iterdir())
+
+    # The half-written entry is completed and another one follows.
+    with session.open("a", encoding="utf-8") as fh:
+        fh.write((line % 2)[20:] + line % 3)
+    fresh = EventIndex(tmp_path)
+    assert _all_pages(fresh, DAY, 2) == _full_scan(tmp_path, DAY)
+    assert fresh.events_for_day(DAY)["total"] == 4
+
+
+def test_rewritten_file_is_indexed_again(tmp_path: Path) -> None:
+    session = tmp_path / "stats_2026-03-01_10-00-00.txt"
+    line = '{"ts":"2026-03-01T10:00:%02d+00:00","event":"error","data":{}}\n'
+    session.write_text(line % 0 + line % 1 + line % 2, encoding="utf-8")
+    index = EventIndex(tmp_path)
+    assert index.events_for_day(DAY)["total"] == 3
+
+    session.write_text(line % 5, encoding="utf-8")
+    assert _all_pages(index, DAY, 10) == _full_scan(tmp_path, DAY)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import threading
+
+from app.events import OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, EventQueue, PulseCounter
+
+
+def test_pulse_counter_delivers_each_pulse_once() -> None:
+    pulses = PulseCounter()
+    for _ in range(3):
+        pulses.pulse()
+    assert pulses.take() == 3
+    assert pulses.take() == 0
+    pulses.pulse()
+    pulses.reset()
+    pulses.pulse()
+    pulses.pulse()
+    assert pulses.take() == 2
+
+
+def test_pulse_counter_from_several_threads() -> None:
+    pulses = PulseCounter()
+    threads = [threading.Thread(target=lambda: [pulses.pulse() for _ in range(1000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pulses.take() == 4000
+
+
+def test_queue_keeps_order_and_counts() -> None:
+    events = EventQueue(maxsize=8)
+    for i in range(5):
+        assert events.put("digit", i)
+    assert len(events) == 5
+    assert [events.get(0)[2] for _ in range(5)] == [0, 1, 2, 3, 4]
+    assert events.get(0.01) is None
+    metrics = events.metrics()
+    assert metrics["enqueued_total"] == 5
+    assert metrics["dequeued_total"] == 5
+    assert metrics["max_depth"] == 5
+    assert metrics["depth"] == 0
+    assert metrics["max_age_ms"] >= metrics["last_age_ms"] >= 0
+
+
+def test_full_queue_drops_the_oldest_event() -> None:
+    events = EventQueue(maxsize=3, overflow=OVERFLOW_DROP_OLDEST)
+    for i in range(5):
+        assert events.put("digit", i)
+    assert [events.get(0)[2] for _ in range(3)] == [2, 3, 4]
+    assert events.metrics()["dropped_total"] == 2
+
+
+def test_full_queue_rejects_the_newest_event() -> None:
+    events = EventQueue(maxsize=3, overflow=OVERFLOW_DROP_NEWEST)
+    assert [events.put("digit", i) for i in range(5)] == [True, True, True, False, False]
+    assert [events.get(0)[2] for _ in range(3)] == [0, 1, 2]
+    metrics = events.metrics()
+    assert metrics["dropped_total"] == 2
+    assert metrics["enqueued_total"] == 3
+
+
+def test_get_wakes_up_on_put() -> None:
+    events = EventQueue()
+    timer = threading.Timer(0.05, events.put, ("hook_on",))
+    timer.start()
+    item = events.get(timeout=5)
+    timer.join()
+    assert item is not None and item[0] == "hook_on"
+
+
+def test_probe_waits_behind_queued_events_without_using_the_queue() -> None:
+    events = EventQueue(maxsize=2)
+    events.put("hook_on")
+    events.probe(lambda: None)
+    events.put("digit", 3)
+    assert len(events) == 2
+
+    assert events.get(0)[0] == "hook_on"
+    assert events.get(0)[0] == "call"
+    assert events.get(0)[0] == "digit"
+    assert events.get(0) is None
+    metrics = events.metrics()
+    assert metrics["enqueued_total"] == 2
+    assert metrics["dequeued_total"] == 2
+    assert metrics["dropped_total"] == 0
+
+
+def test_probe_does_not_push_out_events_when_the_queue_is_full() -> None:
+    events = EventQueue(maxsize=2)
+    events.put("hook_on")
+    events.put("digit", 1)
+    events.probe(lambda: None)
+    events.put("digit", 2)
+
+    names = []
+    while (item := events.get(0)) is not None:
+        names.append((item[0], item[2] if item[0] == "digit" else None))
+    # The oldest event was dropped by the overflow, the probe still runs after the events ahead of it.
+    assert names == [("digit", 1), ("call", None), ("digit", 2)]
+    assert events.metrics()["dropped_total"] == 1
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from datetime import date
+import json
+from pathlib import Path
+
+import pytest
+
+from app.catalog import load_catalog_entries
+from app.history import HistoryProfile, generate_history, main
+
+SONGS_FILE = Path(__file__).resolve().parent.parent / "songs.txt"
+
+
+def _events(out_dir: Path) -> list[dict]:
+    events = []
+    for path in sorted(out_dir.glob("stats_*.txt")):
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+
+def test_fallback_codes_never_match_a_catalog_song(tmp_path: Path) -> None:
+    profile = HistoryProfile(days=20, end_day=date(2026, 3, 31), sessions_per_day=3, fallback_ratio=0.3, seed=7)
+    generate_history(tmp_path, SONGS_FILE, profile)
+    catalog = {entry.code for entry in load_catalog_entries(SONGS_FILE, SONGS_FILE.parent)}
+
+    songs = [e["data"] for e in _events(tmp_path) if e["event"] == "song_started"]
+    fallbacks = [s["code"] for s in songs if not s["found"]]
+    assert fallbacks
+    assert not set(fallbacks) & catalog
+    assert {s["code"] for s in songs if s["found"]} <= catalog
+
+
+def test_session_file_names_are_unique(tmp_path: Path) -> None:
+    profile = HistoryProfile(days=3, end_day=date(2026, 1, 31), sessions_per_day=500, session_hours=0.1)
+    result = generate_history(tmp_path, SONGS_FILE, profile)
+    assert result["files"] == 1500
+    assert len(list(tmp_path.glob("stats_*.txt"))) == 1500
+
+
+def test_empty_lines_option_is_rejected(tmp_path: Path) -> None:
+    with pytest.raises(SystemExit) as exc:
+        main(["--out", str(tmp_path), "--days", "1", "--lines", " , "])
+    assert exc.value.code == 2
+    assert not list(tmp_path.glob("stats_*.txt"))
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from pathlib import Path
+import threading
+
+import pytest
+
+from app.config import Line, load_config
+from app.events import EventQueue
+from app.line import PhoneLine
+
+
+class FakeDial:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, int | None]] = []
+        self.done = threading.Event()
+
+    def on_hook_lifted(self) -> None:
+        self.calls.append(("hook_lifted", None))
+
+    def on_hook_replaced(self) -> None:
+        self.calls.append(("hook_replaced", None))
+        self.done.set()
+
+    def on_rotary_engaged(self) -> None:
+        self.calls.append(("rotary_engaged", None))
+
+    def on_rotary_released(self, pulses: int) -> None:
+        self.calls.append(("rotary_released", pulses))
+        if pulses == 0:
+            raise RuntimeError("bad digit")
+
+
+class FakePlayer:
+    def close(self) -> None:
+        pass
+
+
+def test_config_without_lines_has_one_main_line(tmp_path: Path) -> None:
+    (tmp_path / "config.toml").write_text('[pins]\nhook = 4\n[audio]\ndevice = "plughw:0,0"\n', encoding="utf-8")
+    config = load_config(tmp_path)
+    assert [line.id for line in config.lines] == ["main"]
+    assert config.lines[0].pins.hook == 4
+    assert config.lines[0].audio_device == "plughw:0,0"
+
+
+def test_config_lines_inherit_missing_pins(tmp_path: Path) -> None:
+    (tmp_path / "config.toml").write_text(
+        "[pins]\nhook = 4\n"
+        '[[lines]]\nid = "sala"\naudio_device = "plughw:1,0"\n[lines.pins]\nhook = 21\n'
+        "[[lines]]\n[lines.pins]\nrotary_enable = 17\n",
+        encoding="utf-8",
+    )
+    config = load_config(tmp_path)
+    assert [line.id for line in config.lines] == ["sala", "line2"]
+    assert config.lines[0].pins.hook == 21
+    assert config.lines[1].pins.hook == 4
+    assert config.lines[1].pins.rotary_enable == 17
+
+
+def test_duplicate_line_ids_are_rejected(tmp_path: Path) -> None:
+    (tmp_path / "config.toml").write_text('[[lines]]\nid = "a"\n[[lines]]\nid = "a"\n', encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_config(tmp_path)
+
+
+def test_each_line_handles_its_own_events() -> None:
+    lines = []
+    for line_id in ("sala", "ingresso"):
+        lines.append(PhoneLine(Line(id=line_id), FakePlayer(), FakeDial(), EventQueue()))
+    sala, ingresso = lines
+    for line in lines:
+        line.start()
+    try:
+        sala.events.put("hook_on")
+        sala.on_rotary_start()
+        for _ in range(4):
+            sala.pulses.pulse()
+        sala.on_rotary_stop()
+        # A failing handler is logged and the worker goes on.
+        sala.on_rotary_start()
+        sala.on_rotary_stop()
+        sala.events.put("hook_off")
+        ingresso.events.put("hook_off")
+        assert sala.dial.done.wait(5)
+        assert ingresso.dial.done.wait(5)
+    finally:
+        for line in lines:
+            line.stop()
+
+    assert sala.dial.calls == [
+        ("hook_lifted", None),
+        ("rotary_engaged", None),
+        ("rotary_released", 4),
+        ("rotary_engaged", None),
+        ("rotary_released", 0),
+        ("hook_replaced", None),
+    ]
+    assert ingresso.dial.calls == [("hook_replaced", None)]
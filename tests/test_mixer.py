@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+from array import array
+from pathlib import Path
+import time
+import wave
+
+import pytest
+
+from app import mixer as mixer_module
+from app.mixer import AudioFormat, BufferVoice, Mixer, NullSink, QueuedTrack, QueueVoice, StreamVoice, WavFileSink
+
+FMT = AudioFormat()
+
+
+def _pcm(value: int, frames: int) -> bytes:
+    return array("h", [value] * (frames * FMT.channels)).tobytes()
+
+
+def _samples(data: bytes) -> list[int]:
+    return list(array("h", data))
+
+
+def _render_until(mixer: Mixer, voice, timeout: float = 5.0) -> list[int]:
+    out: list[int] = []
+    deadline = time.monotonic() + timeout
+    while not voice.done and time.monotonic() < deadline:
+        out += _samples(mixer.render(256))
+        time.sleep(0.001)
+    assert voice.done
+    return out
+
+
+def test_voices_are_summed_and_clipped() -> None:
+    mixer = Mixer(NullSink(), FMT)
+    mixer.play(BufferVoice(_pcm(20000, 64)))
+    mixer.play(BufferVoice(_pcm(-1000, 64)))
+    mixer.play(BufferVoice(_pcm(20000, 32)))
+    samples = _samples(mixer.render(64))
+    assert samples[: 32 * 2] == [32767] * 64
+    # The shorter voice is padded with silence.
+    assert samples[32 * 2 :] == [19000] * 64
+
+
+def test_buffer_voice_loops_then_leaves_the_mix() -> None:
+    mixer = Mixer(NullSink(), FMT)
+    voice = mixer.play(BufferVoice(_pcm(500, 100), loops=3))
+    samples = []
+    for _ in range(6):
+        samples += _samples(mixer.render(64))
+    assert samples.count(500) == 300 * FMT.channels
+    assert voice.done
+    assert mixer.voices() == []
+
+
+def test_gain_and_fade_out() -> None:
+    mixer = Mixer(NullSink(), FMT)
+    voice = mixer.play(BufferVoice(_pcm(10000, 10_000), gain=0.5))
+    assert set(_samples(mixer.render(64))) == {5000}
+
+    voice.stop(fade_sec=64 / FMT.sample_rate)
+    faded = _samples(mixer.render(64))
+    assert faded[0] < 5000 and faded[-1] == 0
+    assert faded == sorted(faded, reverse=True)
+    assert set(_samples(mixer.render(64))) == {0}
+    assert voice.done
+
+
+def test_fade_in_starts_silent() -> None:
+    mixer = Mixer(NullSink(), FMT)
+    mixer.play(BufferVoice(_pcm(8000, 10_000), fade_in_sec=128 / FMT.sample_rate))
+    first = _samples(mixer.render(64))
+    second = _samples(mixer.render(64))
+    assert 0 < first[0] <= first[-1] < second[0] <= second[-1] == 8000
+
+
+def test_python_fallback_matches_audioop(monkeypatch: pytest.MonkeyPatch) -> None:
+    a = array("h", [30000, -30000, 100, -5, 0, 32767]).tobytes()
+    b = array("h", [5000, -5000, -100, 7, 0, 1]).tobytes()
+    added = _samples(mixer_module._add(a, b))
+    scaled = {gain: _samples(mixer_module._scale(a, gain)) for gain in (0.3, 1.5)}
+    monkeypatch.setattr(mixer_module, "audioop", None)
+    assert not mixer_module.mixing_supported()
+    assert _samples(mixer_module._add(a, b)) == added
+    # audioop rounds negative products down, the fallback truncates: at most one step apart.
+    for gain, reference in scaled.items():
+        assert all(abs(x - y) <= 1 for x, y in zip(_samples(mixer_module._scale(a, gain)), reference))
+
+
+def test_stream_voice_plays_silence_until_the_decoder_catches_up(fake_song) -> None:
+    mixer = Mixer(NullSink(), FMT)
+    voice = mixer.play(StreamVoice(fake_song("slow.mp3", 700, 2000, delay=0.3)))
+    started = time.monotonic()
+    assert set(_samples(mixer.render(256))) == {0}
+    assert time.monotonic() - started < 0.2
+    assert not voice.done
+
+    samples = _render_until(mixer, voice)
+    assert samples.count(700) == 2000 * FMT.channels
+    assert set(samples) == {0, 700}
+
+
+def test_stream_voice_skips_the_requested_frames(fake_song) -> None:
+    mixer = Mixer(NullSink(), FMT)
+    voice = mixer.play(StreamVoice(fake_song("intro.mp3", 300, 1000), skip_frames=400))
+    assert _render_until(mixer, voice).count(300) == 600 * FMT.channels
+
+
+def test_closing_a_stream_voice_kills_its_decoder(fake_song) -> None:
+    voice = StreamVoice(fake_song("long.mp3", 1, 10, delay=30))
+    voice.open(FMT)
+    deadline = time.monotonic() + 5
+    while voice._process is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    process = voice._process
+    assert process is not None
+    voice.close()
+    assert process.poll() is not None
+    assert voice.read(64) == b""
+
+
+def test_mixer_thread_writes_the_sink(tmp_path: Path) -> None:
+    ticks = []
+    out = tmp_path / "out.wav"
+    mixer = Mixer(WavFileSink(out), FMT, chunk_frames=256, on_tick=lambda: ticks.append(1))
+    mixer.start()
+    try:
+        voice = mixer.play(BufferVoice(_pcm(1234, 1024)))
+        assert voice.wait(5)
+    finally:
+        mixer.close()
+    assert ticks
+    with wave.open(str(out), "rb") as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (2, 2, 44100)
+        assert _samples(wav.readframes(wav.getnframes())).count(1234) == 1024 * FMT.channels
+
+
+def _wait(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_queue_plays_tracks_back_to_back(fake_song) -> None:
+    started: list[str] = []
+    tracks = [
+        QueuedTrack(fake_song(f"{name}.mp3", value, frames), on_start=lambda name=name: started.append(name))
+        for name, value, frames in (("a", 100, 3000), ("b", 200, 2000))
+    ]
+    mixer = Mixer(NullSink(), FMT)
+    voice = mixer.play(QueueVoice(tracks[:1], prebuffer_bytes=10**6))
+    assert voice.append(tracks[1])
+    assert voice.snapshot()["queued"] == ["b"]
+    # Both decoders done: the rendered output must not depend on decoder timing.
+    _wait(lambda: voice._current.buffered_bytes == 3000 * FMT.frame_bytes)
+    _wait(lambda: voice._next.buffered_bytes == 2000 * FMT.frame_bytes)
+    assert voice.snapshot()["prebuffered_sec"] > 0
+
+    samples = _render_until(mixer, voice)
+    assert started == ["a", "b"]
+    first = samples.index(100)
+    assert samples[first : first + 5000 * 2] == [100] * 6000 + [200] * 4000
+    assert not voice.append(tracks[0])
+
+
+def test_queue_applies_track_gain(fake_song) -> None:
+    mixer = Mixer(NullSink(), FMT)
+    voice = mixer.play(QueueVoice([QueuedTrack(fake_song("a.mp3", 1000, 500), gain=0.5)], prebuffer_bytes=10**6))
+    assert set(_render_until(mixer, voice)) == {0, 500}
+
+
+def test_stopping_the_queue_closes_the_prefetch(fake_song) -> None:
+    mixer = Mixer(NullSink(), FMT)
+    voice = mixer.play(QueueVoice([QueuedTrack(fake_song("a.mp3", 1, 10, delay=30))], prebuffer_bytes=4096))
+    voice.append(QueuedTrack(fake_song("b.mp3", 1, 10, delay=30)))
+    upcoming = voice._next._stream
+    _wait(lambda: upcoming._process is not None)
+    process = upcoming._process
+
+    voice.stop()
+    assert process.poll() is not None
+    assert voice.snapshot()["queued"] == []
+    assert not voice.append(QueuedTrack(fake_song("c.mp3", 1, 10)))
+    _render_until(mixer, voice)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import array
+from pathlib import Path
+import time
+from typing import Callable
+
+import pytest
+
+from app import player as player_module
+from app.config import Audio
+from app.mediaprep import MediaHints
+from app.mixer import AudioFormat, Mixer, NullSink
+from app.player import AudioPlayer, MixerAudioPlayer, create_player
+
+
+def _pcm(value: int, frames: int, fmt: AudioFormat) -> bytes:
+    return array.array("h", [value] * (frames * fmt.channels)).tobytes()
+
+
+@pytest.fixture
+def decoded(monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, int]]:
+    calls: list[tuple[str, int]] = []
+
+    def fake_decode(audio_file: Path, fmt: AudioFormat, skip_frames: int = 0) -> bytes:
+        calls.append((audio_file.name, skip_frames))
+        return _pcm(1000, 256, fmt)
+
+    monkeypatch.setattr(player_module, "decode_file", fake_decode)
+    return calls
+
+
+def test_buffered_song_uses_manifest_skip_and_gain(tmp_path: Path, decoded) -> None:
+    song = tmp_path / "001.mp3"
+    song.write_bytes(b"\0" * 1024)
+    mixer = Mixer(NullSink(), AudioFormat())
+    hints = {"001.mp3": MediaHints(skip_frames=7, gain_db=-6.0)}
+    player = MixerAudioPlayer(mixer, hints=hints, fade_sec=0.0)
+
+    player.play_file(song)
+    samples = array.array("h", mixer.render(128))
+    assert decoded == [("001.mp3", 7)]
+    assert set(samples) == {round(1000 * hints["001.mp3"].gain)}
+
+
+def test_buffered_file_without_hints_plays_unchanged(tmp_path: Path, decoded) -> None:
+    tone = tmp_path / "dial.mp3"
+    tone.write_bytes(b"\0" * 1024)
+    mixer = Mixer(NullSink(), AudioFormat())
+    player = MixerAudioPlayer(mixer, fade_sec=0.0)
+
+    player.preload([tone])
+    player.play_file(tone, loop_count=2)
+    assert set(array.array("h", mixer.render(128))) == {1000}
+    assert decoded == [("dial.mp3", 0)]
+
+
+def test_heartbeat_is_registered_only_for_a_running_mixer(monkeypatch: pytest.MonkeyPatch) -> None:
+    registered: list[Callable[[], None]] = []
+
+    def register() -> Callable[[], None]:
+        registered.append(lambda: None)
+        return registered[-1]
+
+    audio = Audio(backend="mixer", sink="null")
+    monkeypatch.setattr(player_module, "mixing_supported", lambda: False)
+    assert isinstance(create_player(audio, register_heartbeat=register), AudioPlayer)
+    assert registered == []
+
+    monkeypatch.setattr(player_module, "mixing_supported", lambda: True)
+    player = create_player(audio, register_heartbeat=register)
+    try:
+        assert isinstance(player, MixerAudioPlayer)
+        assert len(registered) == 1
+    finally:
+        player.close()
+
+
+def test_jukebox_queue_positions_and_limit(fake_song) -> None:
+    mixer = Mixer(NullSink(), AudioFormat())
+    player = MixerAudioPlayer(mixer, max_queue=2, prebuffer_sec=0.1)
+    songs = [fake_song(f"{name}.mp3", 100, 44100, delay=30) for name in "abcd"]
+    try:
+        assert [player.enqueue(song) for song in songs] == [0, 1, 2, None]
+        assert player.queue_snapshot()["playing"] == "a"
+        assert player.queue_snapshot()["queued"] == ["b", "c"]
+        assert player.enqueue(songs[0].with_name("missing.mp3")) is None
+
+        # Hanging up empties the queue at once, the next code starts a new one.
+        player.stop()
+        assert player.queue_snapshot() == {"playing": None, "queued": [], "prebuffered_sec": 0.0}
+        assert player.enqueue(songs[3]) == 0
+    finally:
+        player.close()
+
+
+def test_jukebox_tracks_use_manifest_hints(fake_song) -> None:
+    song = fake_song("001.mp3", 1000, 600)
+    mixer = Mixer(NullSink(), AudioFormat())
+    hints = {"001.mp3": MediaHints(skip_frames=100, gain_db=-6.0)}
+    player = MixerAudioPlayer(mixer, hints=hints, fade_sec=0.0)
+    assert player.enqueue(song) == 0
+    voice = player._queue
+
+    samples: list[int] = []
+    for _ in range(500):
+        if voice.done:
+            break
+        samples += array.array("h", mixer.render(256))
+        time.sleep(0.002)
+    assert voice.done
+    level = round(1000 * hints["001.mp3"].gain)
+    assert set(samples) == {0, level}
+    assert samples.count(level) == 500 * 2
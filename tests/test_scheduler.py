@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import random
+import threading
+
+from app.scheduler import ScheduledCall, Scheduler
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _check_heap(scheduler: Scheduler) -> None:
+    heap = scheduler._heap
+    for i, call in enumerate(heap):
+        assert call.index == i
+        if i > 0:
+            assert not call < heap[(i - 1) // 2]
+
+
+def test_runs_due_calls_by_time_then_insertion_order() -> None:
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    fired: list[str] = []
+    scheduler.call_at(2.0, fired.append, "c")
+    scheduler.call_at(1.0, fired.append, "a")
+    scheduler.call_at(2.0, fired.append, "d")
+    scheduler.call_at(1.0, fired.append, "b")
+    scheduler.call_later(5.0, fired.append, "e")
+
+    assert scheduler.next_deadline() == 1.0
+    assert scheduler.run_pending() == 0
+    clock.now = 1.5
+    assert scheduler.run_pending() == 2
+    clock.now = 2.0
+    assert scheduler.run_pending() == 2
+    assert fired == ["a", "b", "c", "d"]
+    assert scheduler.next_deadline() == 5.0
+    assert len(scheduler) == 1
+
+
+def test_call_later_is_relative_to_the_clock_and_never_in_the_past() -> None:
+    clock = FakeClock(10.0)
+    scheduler = Scheduler(clock=clock)
+    assert scheduler.call_later(3.0, lambda: None).when == 13.0
+    assert scheduler.call_later(-1.0, lambda: None).when == 10.0
+
+
+def test_cancel_head_middle_and_last() -> None:
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    fired: list[int] = []
+    calls = [scheduler.call_at(float(i), fired.append, i) for i in range(10)]
+
+    head, middle, last = calls[0], calls[5], scheduler._heap[-1]
+    for call in (head, middle, last):
+        assert call.cancel()
+        assert not call.pending
+        _check_heap(scheduler)
+
+    clock.now = 100.0
+    scheduler.run_pending()
+    cancelled = {head.args[0], middle.args[0], last.args[0]}
+    assert fired == [i for i in range(10) if i not in cancelled]
+
+
+def test_double_cancel_and_cancel_after_firing() -> None:
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    call = scheduler.call_at(1.0, lambda: None)
+    other = scheduler.call_at(2.0, lambda: None)
+    assert call.cancel()
+    assert not call.cancel()
+    assert len(scheduler) == 1
+
+    clock.now = 2.0
+    scheduler.run_pending()
+    assert not other.pending
+    assert not other.cancel()
+    assert len(scheduler) == 0
+
+
+def test_failing_call_does_not_stop_the_others() -> None:
+    clock = FakeClock(1.0)
+    scheduler = Scheduler(clock=clock)
+    fired: list[str] = []
+    scheduler.call_at(0.0, lambda: 1 / 0)
+    scheduler.call_at(0.0, fired.append, "ok")
+    assert scheduler.run_pending() == 2
+    assert fired == ["ok"]
+
+
+def test_call_scheduled_while_running_waits_for_its_time() -> None:
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    fired: list[str] = []
+    scheduler.call_at(0.0, lambda: scheduler.call_later(1.0, fired.append, "later"))
+    assert scheduler.run_pending() == 1
+    assert fired == []
+    clock.now = 1.0
+    assert scheduler.run_pending() == 1
+    assert fired == ["later"]
+
+
+def test_random_schedules_and_cancels_keep_heap_order() -> None:
+    rng = random.Random(1234)
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    fired: list[tuple[float, int]] = []
+    calls: list[ScheduledCall] = []
+    for _ in range(2000):
+        when = float(rng.randrange(500))
+        call = scheduler.call_at(when, lambda: None)
+        call.fn = lambda call=call: fired.append((call.when, call.seq))
+        calls.append(call)
+    cancelled = rng.sample(calls, 900)
+    for call in cancelled:
+        assert call.cancel()
+    _check_heap(scheduler)
+    assert len(scheduler) == 1100
+
+    clock.now = 1000.0
+    assert scheduler.run_pending() == 1100
+    cancelled_keys = {(c.when, c.seq) for c in cancelled}
+    expected = sorted((c.when, c.seq) for c in calls if (c.when, c.seq) not in cancelled_keys)
+    assert fired == expected
+
+
+def test_thread_runs_calls_when_due() -> None:
+    clock = FakeClock(5.0)
+    scheduler = Scheduler(clock=clock)
+    done = threading.Event()
+    scheduler.start()
+    try:
+        scheduler.call_at(1.0, done.set)
+        assert done.wait(2.0)
+    finally:
+        scheduler.stop()
+
+
+def test_stop_with_pending_calls() -> None:
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    fired: list[int] = []
+    scheduler.start()
+    scheduler.call_at(1000.0, fired.append, 1)
+    scheduler.call_at(2000.0, fired.append, 2)
+    thread = scheduler._thread
+    scheduler.stop()
+
+    assert thread is not None and not thread.is_alive()
+    assert fired == []
+    assert len(scheduler) == 2
+    # Calls left behind can still be drained explicitly.
+    clock.now = 3000.0
+    assert scheduler.run_pending() == 2
+    assert fired == [1, 2]
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import date
+import json
+from pathlib import Path
+import random
+
+import pytest
+
+from app.history import HistoryProfile, generate_history
+from app.stats import (
+    CODE_SLOTS,
+    EventRecord,
+    SongCounter,
+    StatsRecorder,
+    _count_event,
+    dashboard,
+    day_full,
+    list_calendar_for_month,
+    top_songs_all_time,
+)
+
+
+def _reference_top(plays: list[tuple[str, str]], limit: int) -> list[tuple[str, str, int]]:
+    # The Counter[tuple[str, str]] the aggregation used before SongCounter, ties by code.
+    counts = Counter(plays)
+    rows = [(code, title, count) for (code, title), count in counts.items()]
+    return sorted(rows, key=lambda row: (-row[2], row[0], row[1]))[:limit]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_song_counter_matches_a_counter(seed: int) -> None:
+    rng = random.Random(seed)
+    plays = []
+    for _ in range(5000):
+        roll = rng.random()
+        if roll < 0.9:
+            code = f"{min(CODE_SLOTS - 1, int(rng.paretovariate(1.1)) - 1):03d}"
+            title = f"Song {code}"
+        elif roll < 0.95:
+            # Same code recorded with another title, e.g. after songs.txt changed.
+            code = f"{rng.randrange(20):03d}"
+            title = f"Renamed {code}"
+        else:
+            code = rng.choice(["1", "0001", "abc", ""])
+            title = "Odd"
+        plays.append((code, title))
+
+    counter = SongCounter()
+    for code, title in plays:
+        counter.add(code, title)
+    for limit in (1, 10, 50, 10_000):
+        assert counter.most_common(limit) == _reference_top(plays, limit)
+
+
+def test_song_counter_first_title_owns_the_slot() -> None:
+    counter = SongCounter()
+    counter.add("007", "Old")
+    counter.add("007", "New")
+    counter.add("007", "New")
+    assert counter.most_common(10) == [("007", "New", 2), ("007", "Old", 1)]
+    assert SongCounter().most_common(10) == []
+
+
+def test_event_record_has_no_instance_dict() -> None:
+    record = EventRecord(0, "song_started", "main", "001", "Lupin III (1978)", True)
+    assert not hasattr(record, "__dict__")
+    assert record.to_dict() == {
+        "ts": "1970-01-01T00:00:00+00:00",
+        "event": "song_started",
+        "data": {"code": "001", "found": True, "title": "Lupin III (1978)", "line": "main"},
+    }
+    error = EventRecord(60, "error", error="missing_song_file", details="x.mp3")
+    assert error.to_dict()["data"] == {"error": "missing_song_file", "details": "x.mp3"}
+
+
+def test_recorder_shares_catalog_titles_and_writes_the_same_lines(tmp_path: Path) -> None:
+    title = "".join(["Lupin", " III (1978)"])
+    recorder = StatsRecorder(tmp_path, titles={"001": title})
+    recorder.record_song_started("001", True, "Lupin III (1978)")
+    recorder.for_line("sala").record_error("invalid_pulse_group", "pulses=12")
+    snapshot = recorder.snapshot()
+    recorder.close()
+
+    assert recorder._recent_events[1].title is title
+    lines = [json.loads(line) for line in recorder._file_path.read_text(encoding="utf-8").splitlines()]
+    assert [line["event"] for line in lines] == ["session_started", "song_started", "error", "session_stopped"]
+    assert lines[:3] == snapshot["recent_events"]
+    assert snapshot["counters"] == {"events_total": 3, "song_started_total": 1, "song_found_total": 1, "error_total": 1}
+    assert snapshot["counters_by_line"] == {
+        "main": {"events_total": 1, "song_started_total": 1, "song_found_total": 1},
+        "sala": {"events_total": 1, "error_total": 1},
+    }
+
+
+SONGS_FILE = Path(__file__).resolve().parent.parent / "songs.txt"
+
+
+@pytest.fixture(scope="module")
+def history(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    out = tmp_path_factory.mktemp("history")
+    profile = HistoryProfile(
+        days=45, end_day=date(2026, 3, 10), sessions_per_day=2, session_hours=2.0, lines=("main", "sala"), seed=5
+    )
+    generate_history(out, SONGS_FILE, profile)
+    return out
+
+
+def _entries(stats_dir: Path) -> list[dict]:
+    entries = []
+    for path in sorted(stats_dir.glob("stats_*.txt")):
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def _plays(stats_dir: Path, line_id: str | None = None, day: str | None = None) -> list[tuple[str, str]]:
+    return [
+        (e["data"]["code"], e["data"]["title"])
+        for e in _entries(stats_dir)
+        if e["event"] == "song_started"
+        and (line_id is None or e["data"]["line"] == line_id)
+        and (day is None or e["ts"].startswith(day))
+    ]
+
+
+@pytest.mark.parametrize("line_id", [None, "sala"])
+def test_dashboard_matches_the_single_views(history: Path, line_id: str | None) -> None:
+    day = "2026-03-01"
+    result = dashboard(history, 2026, 3, day=day, limit=15, line_id=line_id)
+
+    assert result["calendar"] == list_calendar_for_month(history, 2026, 3)
+    assert result["top_all"] == top_songs_all_time(history, limit=15, line_id=line_id)
+    assert result["day"] == day_full(history, day, limit=15, line_id=line_id)
+    rows = [(r["code"], r["title"], r["count"]) for r in result["top_all"]]
+    assert rows == _reference_top(_plays(history, line_id), 15)
+    rows = [(r["code"], r["title"], r["count"]) for r in result["day"]["top"]]
+    assert rows == _reference_top(_plays(history, line_id, day), 15)
+
+
+def test_calendar_counts_every_event_of_the_month(history: Path) -> None:
+    expected: dict[str, Counter[str]] = {}
+    for entry in _entries(history):
+        if entry["ts"].startswith("2026-03-"):
+            _count_event(expected.setdefault(entry["ts"][:10], Counter()), entry["event"], entry["data"].get("found"))
+
+    calendar = dashboard(history, 2026, 3)["calendar"]
+    assert [row["day"] for row in calendar] == sorted(expected, reverse=True)
+    for row in calendar:
+        counts = expected[row["day"]]
+        assert {k: row.get(k, 0) for k in counts} == dict(counts)
+        assert sum(row["lines"].values()) == counts["song_started_total"]
+    # The last February session runs past midnight, so March 1st has a third file.
+    assert calendar[-1]["sessions"] == 3
+
+
+def test_dashboard_ignores_a_malformed_day(history: Path) -> None:
+    result = dashboard(history, 2026, 3, day="yesterday")
+    assert "day" not in result
+    assert day_full(history, "yesterday")["top"] == []
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import base64
+import gzip
+import json
+from pathlib import Path
+import time
+from typing import Any
+
+import pytest
+
+from app.uplink import StatsAggregator, StatsUplink, decode_ingest_body
+
+SESSION = "stats_2026-01-01_10-00-00.txt"
+
+
+class Wire:
+    # Carries uplink batches to an in-process aggregator the way the HTTP handler does.
+    def __init__(self, aggregator: StatsAggregator) -> None:
+        self.aggregator = aggregator
+        self.batches: list[list[dict[str, Any]]] = []
+        self.online = True
+
+    def post(self, uplink: StatsUplink, segments: list[dict[str, Any]]) -> dict[str, Any]:
+        if not self.online:
+            raise OSError("network is unreachable")
+        self.batches.append(segments)
+        body = gzip.compress(json.dumps({"device": uplink._device_id, "segments": segments}).encode("utf-8"))
+        _status, reply = self.aggregator.ingest(decode_ingest_body(body, "gzip"))
+        return reply
+
+
+def _uplink(stats_dir: Path, wire: Wire, **kwargs) -> StatsUplink:
+    uplink = StatsUplink(stats_dir, "http://aggregator/api/ingest", "box-1", **kwargs)
+    uplink._post = lambda segments: wire.post(uplink, segments)
+    return uplink
+
+
+@pytest.fixture
+def box(tmp_path: Path) -> Path:
+    stats_dir = tmp_path / "box"
+    stats_dir.mkdir()
+    return stats_dir
+
+
+@pytest.fixture
+def wire(tmp_path: Path) -> Wire:
+    return Wire(StatsAggregator(tmp_path / "central"))
+
+
+def _received(wire: Wire, name: str = SESSION) -> bytes:
+    return (wire.aggregator._root / "box-1" / name).read_bytes()
+
+
+def test_ships_complete_lines_byte_for_byte(box: Path, wire: Wire) -> None:
+    session = box / SESSION
+    session.write_bytes(b'{"title":"Caf\xc3\xa9"}\n{"bad":"\xff\xfe"}\n{"half":')
+    uplink = _uplink(box, wire)
+    assert uplink.sync_once()
+    assert _received(wire) == session.read_bytes()[: session.read_bytes().rindex(b"\n") + 1]
+
+    with session.open("ab") as fh:
+        fh.write(b'1}\n')
+    assert uplink.sync_once()
+    assert _received(wire) == session.read_bytes()
+    assert uplink._offsets == {SESSION: session.stat().st_size}
+
+
+def test_resumes_from_the_saved_offsets(box: Path, wire: Wire) -> None:
+    session = box / SESSION
+    session.write_bytes(b"one\ntwo\n")
+    assert _uplink(box, wire).sync_once()
+
+    with session.open("ab") as fh:
+        fh.write(b"three\n")
+    wire.batches.clear()
+    assert _uplink(box, wire).sync_once()
+    assert wire.batches == [[{"file": SESSION, "offset": 8, "data": base64.b64encode(b"three\n").decode("ascii")}]]
+    assert _received(wire) == b"one\ntwo\nthree\n"
+
+
+def test_offline_box_keeps_its_offsets_and_catches_up(box: Path, wire: Wire) -> None:
+    session = box / SESSION
+    session.write_bytes(b"one\n")
+    uplink = _uplink(box, wire)
+    assert uplink.sync_once()
+
+    wire.online = False
+    with session.open("ab") as fh:
+        fh.write(b"two\n")
+    assert not uplink.sync_once()
+    assert uplink._offsets == {SESSION: 4}
+    assert uplink._next_delay(False) > uplink._next_delay(True)
+
+    wire.online = True
+    assert uplink.sync_once()
+    assert _received(wire) == b"one\ntwo\n"
+
+
+def test_aggregator_that_lost_data_asks_for_a_resend(box: Path, wire: Wire, tmp_path: Path) -> None:
+    (box / SESSION).write_bytes(b"one\n")
+    uplink = _uplink(box, wire)
+    assert uplink.sync_once()
+
+    wire.aggregator = StatsAggregator(tmp_path / "replacement")
+    with (box / SESSION).open("ab") as fh:
+        fh.write(b"two\n")
+    assert uplink.sync_once()
+    assert [segment["offset"] for batch in wire.batches[-2:] for segment in batch] == [4, 0]
+    assert _received(wire) == b"one\ntwo\n"
+
+
+def test_resent_segments_are_idempotent(wire: Wire) -> None:
+    data = base64.b64encode(b"one\ntwo\n").decode("ascii")
+    for _ in range(2):
+        segment = {"file": SESSION, "offset": 0, "data": data}
+        status, reply = wire.aggregator.ingest({"device": "box-1", "segments": [segment]})
+        assert status == 200
+        assert reply["segments"] == [{"file": SESSION, "acked": 8}]
+    assert _received(wire) == b"one\ntwo\n"
+
+
+def test_line_longer_than_the_batch_goes_out_alone(box: Path, wire: Wire) -> None:
+    (box / SESSION).write_bytes(b"x" * 100 + b"\nshort\n")
+    uplink = _uplink(box, wire, batch_max_bytes=10)
+    assert uplink.sync_once()
+    assert [len(base64.b64decode(s["data"])) for batch in wire.batches for s in batch] == [101, 6]
+
+
+@pytest.mark.parametrize("device, status", [
+    ("box-1", 200),
+    ("Box_2.local", 200),
+    ("a" * 64, 200),
+    ("a" * 65, 400),
+    ("", 400),
+    (".", 400),
+    ("..", 400),
+    (".hidden", 400),
+    ("-box", 400),
+    ("a/b", 400),
+    ("../box", 400),
+])
+def test_device_id_validation(wire: Wire, device: str, status: int) -> None:
+    assert wire.aggregator.ingest({"device": device, "segments": []})[0] == status
+
+
+def test_device_directory_must_stay_under_the_root(wire: Wire, tmp_path: Path) -> None:
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (wire.aggregator._root / "box-1").symlink_to(outside)
+    segment = {"file": SESSION, "offset": 0, "data": base64.b64encode(b"one\n").decode("ascii")}
+    status, _reply = wire.aggregator.ingest({"device": "box-1", "segments": [segment]})
+    assert status == 400
+    assert not list(outside.iterdir())
+
+
+@pytest.mark.parametrize("segment", [
+    "not a dict",
+    {"file": "../stats_1.txt", "offset": 0, "data": ""},
+    {"file": SESSION, "offset": -1, "data": ""},
+    {"file": SESSION, "offset": "0", "data": ""},
+    {"file": SESSION, "offset": 0, "data": "not base64!"},
+    {"file": SESSION, "offset": 0, "data": 5},
+])
+def test_bad_segment_rejects_the_whole_batch(wire: Wire, segment: Any) -> None:
+    good = {"file": "stats_2026-01-02_10-00-00.txt", "offset": 0, "data": base64.b64encode(b"one\n").decode("ascii")}
+    status, _reply = wire.aggregator.ingest({"device": "box-1", "segments": [good, segment]})
+    assert status == 400
+    assert not (wire.aggregator._root / "box-1").exists()
+
+
+def test_oversized_gzip_body_is_rejected(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("app.uplink.MAX_INGEST_BYTES", 16)
+    with pytest.raises(ValueError):
+        decode_ingest_body(gzip.compress(b'{"device": "box-1", "segments": []}'), "gzip")
+
+
+def test_snapshot_reports_the_last_round_without_disk_access(
+    box: Path, wire: Wire, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    (box / SESSION).write_bytes(b"one\n")
+    wire.online = False
+    uplink = _uplink(box, wire, interval_sec=60.0)
+    uplink.start()
+    try:
+        deadline = time.monotonic() + 5
+        while uplink.snapshot()["pending_bytes"] != 4:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        uplink.stop()
+
+    def no_disk(*_args, **_kwargs):
+        raise AssertionError("snapshot() touched the disk")
+
+    monkeypatch.setattr(Path, "stat", no_disk)
+    monkeypatch.setattr(Path, "glob", no_disk)
+    snapshot = uplink.snapshot()
+    assert snapshot["pending_bytes"] == 4
+    assert snapshot["failures"] == 1
+    assert snapshot["last_error"] == "network is unreachable"
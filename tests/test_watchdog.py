@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from pathlib import Path
+import socket
+import tempfile
+
+import pytest
+
+from app.watchdog import PROBE_RETRY_SEC, SdNotifier, Watchdog
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def notify_socket(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("WATCHDOG_USEC", raising=False)
+    monkeypatch.delenv("WATCHDOG_PID", raising=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "notify")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        sock.setblocking(False)
+        try:
+            yield path, sock
+        finally:
+            sock.close()
+
+
+def _received(sock: socket.socket) -> list[str]:
+    messages = []
+    while True:
+        try:
+            messages.append(sock.recv(256).decode("utf-8"))
+        except BlockingIOError:
+            return messages
+
+
+def test_notifier_sends_one_datagram_per_state(notify_socket) -> None:
+    path, sock = notify_socket
+    notifier = SdNotifier(path)
+    assert notifier.enabled
+    assert notifier.notify("READY=1")
+    assert notifier.notify("WATCHDOG=1")
+    assert _received(sock) == ["READY=1", "WATCHDOG=1"]
+
+
+def test_notifier_without_socket_is_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("NOTIFY_SOCKET", raising=False)
+    notifier = SdNotifier()
+    assert not notifier.enabled
+    assert not notifier.notify("READY=1")
+    assert not SdNotifier("/nonexistent/notify").notify("READY=1")
+
+
+def test_watchdog_interval_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("WATCHDOG_USEC", "4000000")
+    monkeypatch.delenv("WATCHDOG_PID", raising=False)
+    assert SdNotifier.watchdog_interval() == 4.0
+    monkeypatch.setenv("WATCHDOG_PID", "1")
+    assert SdNotifier.watchdog_interval() is None
+
+
+def test_check_pings_only_while_every_heartbeat_is_alive(notify_socket) -> None:
+    path, sock = notify_socket
+    clock = FakeClock()
+    watchdog = Watchdog(None, notifier=SdNotifier(path), clock=clock)
+    fast = watchdog.register("fast", 5.0)
+    slow = watchdog.register("slow", 20.0)
+
+    clock.now = 4.0
+    assert watchdog.check() == []
+    clock.now = 6.0
+    slow.beat()
+    assert watchdog.check() == ["fast"]
+    assert watchdog.snapshot()["heartbeats"]["fast"]["stalled"]
+    clock.now = 7.0
+    assert watchdog.check() == ["fast"]
+    fast.beat()
+    assert watchdog.check() == []
+    assert not watchdog.snapshot()["heartbeats"]["fast"]["stalled"]
+    assert _received(sock) == ["WATCHDOG=1", "WATCHDOG=1"]
+    assert watchdog.snapshot()["pings"] == 2
+
+
+def test_expect_block_extends_the_timeout_until_the_next_beat(notify_socket) -> None:
+    path, _sock = notify_socket
+    clock = FakeClock()
+    watchdog = Watchdog(None, notifier=SdNotifier(path), clock=clock)
+    worker = watchdog.register("events-1", 5.0)
+
+    worker.expect_block(60.0)
+    clock.now = 59.0
+    assert watchdog.check() == []
+    clock.now = 61.0
+    assert watchdog.check() == ["events-1"]
+
+    worker.beat()
+    clock.now = 67.0
+    assert watchdog.check() == ["events-1"]
+
+
+def test_probe_measures_lag_and_is_resent_only_after_the_retry_delay(notify_socket) -> None:
+    path, _sock = notify_socket
+    clock = FakeClock()
+    watchdog = Watchdog(None, notifier=SdNotifier(path), clock=clock)
+    posted = []
+    watchdog.add_probe("events-1", posted.append)
+
+    watchdog.check()
+    watchdog.check()
+    assert len(posted) == 1
+    clock.now = 0.25
+    posted.pop()()
+    assert watchdog.snapshot()["lag"]["events-1"] == {"last_ms": 250.0, "max_ms": 250.0}
+
+    watchdog.check()
+    assert len(posted) == 1
+    clock.now += PROBE_RETRY_SEC
+    watchdog.check()
+    assert len(posted) == 2
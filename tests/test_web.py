@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import http.client
+from pathlib import Path
+
+import pytest
+
+from app.catalog import CatalogEntry, SongCatalog
+from app.web import StatsWebServer, _parse_range
+
+SONG = bytes(range(256)) * 4 + b"tail"
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("", None),
+        ("bytes=0-99", (0, 99)),
+        ("bytes=10-", (10, 999)),
+        ("bytes=990-5000", (990, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=999-999", (999, 999)),
+        (" bytes=0-0 ", (0, 0)),
+        # Several ranges and other units get the whole file.
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+        ("none", None),
+    ],
+)
+def test_parse_range(header: str | None, expected: tuple[int, int] | None) -> None:
+    assert _parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5-4", "bytes=-0", "bytes=-", "bytes=a-b", "bytes=0-1-2"])
+def test_unsatisfiable_range(header: str) -> None:
+    with pytest.raises(ValueError):
+        _parse_range(header, 1000)
+
+
+def test_suffix_range_of_an_empty_file() -> None:
+    with pytest.raises(ValueError):
+        _parse_range("bytes=-10", 0)
+    with pytest.raises(ValueError):
+        _parse_range("bytes=0-", 0)
+
+
+@pytest.fixture
+def server(tmp_path: Path):
+    song = tmp_path / "Lupin III (1978).mp3"
+    song.write_bytes(SONG)
+    catalog = SongCatalog(
+        [
+            CatalogEntry("001", "Lupin III", 1978, song),
+            CatalogEntry("002", "Gone", None, tmp_path / "Gone.mp3"),
+        ]
+    )
+    web = StatsWebServer("127.0.0.1", 0, tmp_path / "stats", dict, 2, catalog=catalog, max_media_streams=1)
+    web.start()
+    try:
+        yield web
+    finally:
+        web.stop()
+
+
+def _request(web: StatsWebServer, path: str, method: str = "GET", headers: dict[str, str] | None = None):
+    host, port = web.address
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        connection.request(method, path, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def test_media_full_file(server: StatsWebServer) -> None:
+    status, headers, body = _request(server, "/media/001")
+    assert status == 200
+    assert body == SONG
+    assert headers["Accept-Ranges"] == "bytes"
+    assert headers["Content-Length"] == str(len(SONG))
+    assert "Content-Range" not in headers
+
+
+@pytest.mark.parametrize(
+    "header, start, end", [("bytes=100-199", 100, 199), ("bytes=-4", 1024, 1027), ("bytes=1000-", 1000, 1027)]
+)
+def test_media_byte_range(server: StatsWebServer, header: str, start: int, end: int) -> None:
+    status, headers, body = _request(server, "/media/001", headers={"Range": header})
+    assert status == 206
+    assert body == SONG[start : end + 1]
+    assert headers["Content-Range"] == f"bytes {start}-{end}/{len(SONG)}"
+
+
+def test_media_unsatisfiable_and_foreign_ranges(server: StatsWebServer) -> None:
+    status, headers, body = _request(server, "/media/001", headers={"Range": "bytes=5000-"})
+    assert status == 416
+    assert headers["Content-Range"] == f"bytes */{len(SONG)}"
+    assert body == b""
+    status, _headers, body = _request(server, "/media/001", headers={"Range": "items=0-1"})
+    assert status == 200
+    assert body == SONG
+
+
+def test_media_head_and_missing_files(server: StatsWebServer) -> None:
+    status, headers, body = _request(server, "/media/001", method="HEAD")
+    assert (status, headers["Content-Length"], body) == (200, str(len(SONG)), b"")
+    assert _request(server, "/media/999")[0] == 404
+    assert _request(server, "/media/002")[0] == 404
+
+
+def test_media_streams_are_limited_and_released(server: StatsWebServer) -> None:
+    for _ in range(3):
+        assert _request(server, "/media/001", headers={"Range": "bytes=0-9"})[0] == 206
+    server._media_slots.acquire()
+    try:
+        status, headers, _body = _request(server, "/media/001")
+        assert status == 503
+        assert "Retry-After" in headers
+    finally:
+        server._media_slots.release()
+    assert _request(server, "/media/001")[0] == 200
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import socket
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from app.webproc import SnapshotRegion, WebProcess
+
+
+@pytest.fixture
+def region():
+    owner = SnapshotRegion(size=4096)
+    try:
+        yield owner
+    finally:
+        owner.close()
+        owner.unlink()
+
+
+def test_region_round_trip(region: SnapshotRegion) -> None:
+    reader = SnapshotRegion(region.name)
+    try:
+        assert reader.read() == {}
+        region.publish({"lines": [{"id": "main", "state": "IDLE"}], "title": "Barbapapà"})
+        assert reader.read() == {"lines": [{"id": "main", "state": "IDLE"}], "title": "Barbapapà"}
+        region.publish({"n": 2})
+        assert reader.read() == {"n": 2}
+
+        reader.tick()
+        reader.tick()
+        assert region.ticks == 2
+    finally:
+        reader.close()
+
+
+def test_region_replaces_a_snapshot_that_does_not_fit(region: SnapshotRegion) -> None:
+    snapshot = {"big": "x" * 5000}
+    region.publish(snapshot)
+    assert region.read() == {"error": "snapshot too large", "bytes": len(json.dumps(snapshot, separators=(",", ":")))}
+
+
+def test_reader_serves_the_last_snapshot_while_a_write_is_in_progress(region: SnapshotRegion) -> None:
+    region.publish({"n": 1})
+    assert region.read() == {"n": 1}
+    # An odd sequence number means the parent is halfway through a write.
+    region._shm.buf[0] = region._shm.buf[0] + 1
+    assert region.read() == {"n": 1}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _live(port: int) -> dict | None:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/live", timeout=1) as response:
+            return json.loads(response.read())
+    except (OSError, urllib.error.URLError):
+        return None
+
+
+def _wait_for(predicate, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.05)
+    raise AssertionError("timed out")
+
+
+def test_child_serves_the_live_snapshot_and_is_restarted(tmp_path: Path) -> None:
+    port = _free_port()
+    state = {"calls": 0}
+    web = WebProcess("127.0.0.1", port, tmp_path, lambda: {"calls": state["calls"]}, 2, snapshot_interval_sec=0.05)
+    web.start()
+    try:
+        state["calls"] = 1
+        assert _wait_for(lambda: (_live(port) or {}).get("calls") == 1)
+        first = web.snapshot()
+        assert first["alive"] and first["restarts"] == 0
+
+        web._process.kill()
+        _wait_for(lambda: web.snapshot()["restarts"] == 1 and web.snapshot()["alive"])
+        state["calls"] = 2
+        assert _wait_for(lambda: (_live(port) or {}).get("calls") == 2)
+        assert web.snapshot()["pid"] != first["pid"]
+        assert web.snapshot()["last_exit"] is not None
+    finally:
+        web.stop()
+    assert _live(port) is None
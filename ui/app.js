@@ -18,11 +18,25 @@ const els = {
   mErrors: document.getElementById("m-errors"),
   mFallbacks: document.getElementById("m-fallbacks"),
   mTopDay: document.getElementById("m-top-day"),
+  mLines: document.getElementById("m-lines"),
   mFiles: document.getElementById("m-files"),
+  linesList: document.getElementById("lines-list"),
   mRaw: document.getElementById("m-raw"),
+  mEvents: document.getElementById("m-events"),
+  mEventsType: document.getElementById("m-events-type"),
+  mEventsCount: document.getElementById("m-events-count"),
+  songbookQ: document.getElementById("songbook-q"),
+  songbookCount: document.getElementById("songbook-count"),
+  songbookList: document.getElementById("songbook-list"),
+  songbookMore: document.getElementById("songbook-more"),
+  songbookPlayer: document.getElementById("songbook-player"),
 };
 
 let refreshMs = 2000;
+const EVENTS_PAGE_SIZE = 50;
+const eventsBrowser = { day: null, generation: 0, nextOffset: 0, loading: false, observer: null, sentinel: null };
+const SONGBOOK_PAGE_SIZE = 30;
+const songbook = { query: "", generation: 0, nextOffset: 0, loading: false, timer: null };
 let currentStartupDay = null;
 const calendarCursor = new Date();
 calendarCursor.setDate(1);
@@ -42,10 +56,35 @@ function renderLive(data) {
   const counters = data.counters || {};
   currentStartupDay = data.startup_day || currentStartupDay;
   setText(els.sessionDay, data.startup_day || "-");
-  setText(els.sessionId, `Log file: ${data.session_id || "-"}`);
+  const rss = (data.memory || {}).rss_kb;
+  const ram = rss ? ` · RAM ${(rss / 1024).toFixed(1)} MB` : "";
+  setText(els.sessionId, `Log file: ${data.session_id || "-"}${ram}`);
   setText(els.songsStarted, counters.song_started_total || 0);
   setText(els.errors, counters.error_total || 0);
   setText(els.fallbacks, counters.song_fallback_total || 0);
+  renderLines(data.lines || [], data.counters_by_line || {});
+}
+
+function renderLines(lines, countersByLine) {
+  if (!els.linesList) return;
+  els.linesList.innerHTML = "";
+  lines.forEach((line) => {
+    const counters = countersByLine[line.id] || {};
+    const queue = line.events || {};
+    const li = document.createElement("li");
+    li.textContent = `${line.id} - ${line.state} - canzoni: ${counters.song_started_total || 0}, errori: ${
+      counters.error_total || 0
+    }, coda: ${queue.depth || 0} (max attesa ${Math.round(queue.max_age_ms || 0)} ms, scartati ${queue.dropped_total || 0})`;
+    const jukebox = line.jukebox || {};
+    if (jukebox.playing) {
+      const p = document.createElement("p");
+      p.className = "day-line";
+      const next = (jukebox.queued || []).map((title, i) => `${i + 1}. ${title}`).join(" · ");
+      p.textContent = `In riproduzione: ${jukebox.playing}${next ? ` - in coda: ${next}` : ""}`;
+      li.appendChild(p);
+    }
+    els.linesList.appendChild(li);
+  });
 }
 
 function renderTopList(el, items) {
@@ -76,6 +115,13 @@ function dayCard(row) {
     <p class="day-line">Canzoni: ${row.song_started_total || 0}</p>
     <p class="day-line">Errori: ${row.error_total || 0}</p>
   `;
+  const lines = Object.entries(row.lines || {});
+  if (lines.length > 1) {
+    const p = document.createElement("p");
+    p.className = "day-line";
+    p.textContent = lines.map(([id, count]) => `${id}: ${count}`).join(" · ");
+    node.appendChild(p);
+  }
   node.addEventListener("click", () => openDay(row.day));
   return node;
 }
@@ -101,17 +147,21 @@ function renderMonthLabel() {
 
 async function openDay(day) {
   try {
-    const [data, topDay] = await Promise.all([
-      api(`/api/day/${day}`),
-      api(`/api/top/day/${day}`),
-    ]);
+    const data = await api(`/api/day/${day}/full`);
     const summary = data.summary || {};
     setText(els.modalTitle, `Dettaglio ${data.day}`);
     setText(els.mSessions, (data.sessions || []).length);
     setText(els.mSongs, summary.song_started_total || 0);
     setText(els.mErrors, summary.error_total || 0);
     setText(els.mFallbacks, summary.song_fallback_total || 0);
-    renderTopList(els.mTopDay, topDay.items || []);
+    renderTopList(els.mTopDay, data.top || []);
+
+    els.mLines.innerHTML = "";
+    Object.entries(data.lines || {}).forEach(([id, counters]) => {
+      const li = document.createElement("li");
+      li.textContent = `${id}: ${counters.song_started_total || 0} canzoni, ${counters.error_total || 0} errori`;
+      els.mLines.appendChild(li);
+    });
 
     els.mFiles.innerHTML = "";
     (data.sessions || []).forEach((name) => {
@@ -121,11 +171,76 @@ async function openDay(day) {
     });
     els.mRaw.textContent = JSON.stringify(summary, null, 2);
     els.modal.showModal();
+    resetEvents(data.day);
   } catch (err) {
     console.error(err);
   }
 }
 
+function describeEvent(entry) {
+  const data = entry.data || {};
+  const time = (entry.ts || "").slice(11, 19);
+  if (entry.event === "song_started") {
+    const title = data.title || "Titolo sconosciuto";
+    const status = data.found ? "" : " (fallback)";
+    const line = data.line ? ` [${data.line}]` : "";
+    return `${time} #${data.code} ${title}${status}${line}`;
+  }
+  if (entry.event === "error") {
+    return `${time} ERRORE ${data.error || ""} ${data.details || ""}`.trim();
+  }
+  return `${time} ${entry.event}`;
+}
+
+async function loadMoreEvents() {
+  const browser = eventsBrowser;
+  if (!browser.day || browser.loading || browser.nextOffset === null) return;
+  browser.loading = true;
+  const generation = browser.generation;
+  try {
+    const type = els.mEventsType.value;
+    const params = new URLSearchParams({ offset: browser.nextOffset, limit: EVENTS_PAGE_SIZE });
+    if (type) params.set("type", type);
+    const page = await api(`/api/day/${browser.day}/events?${params}`);
+    if (generation !== browser.generation) return;
+    (page.items || []).forEach((entry) => {
+      const li = document.createElement("li");
+      li.textContent = describeEvent(entry);
+      li.title = entry.session || "";
+      if (entry.event === "error") li.className = "event-error";
+      els.mEvents.insertBefore(li, browser.sentinel);
+    });
+    setText(els.mEventsCount, `${page.total || 0} eventi`);
+    browser.nextOffset = page.next_offset;
+  } catch (err) {
+    console.error(err);
+  } finally {
+    if (generation === browser.generation) browser.loading = false;
+  }
+}
+
+function resetEvents(day) {
+  const browser = eventsBrowser;
+  browser.day = day;
+  browser.generation += 1;
+  browser.loading = false;
+  browser.nextOffset = 0;
+  els.mEvents.innerHTML = "";
+  browser.sentinel = document.createElement("li");
+  browser.sentinel.setAttribute("aria-hidden", "true");
+  els.mEvents.appendChild(browser.sentinel);
+  if (browser.observer) browser.observer.disconnect();
+  // Infinite scroll: fetch the next page whenever the end of the list becomes visible.
+  browser.observer = new IntersectionObserver(
+    (entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) loadMoreEvents();
+    },
+    { root: els.mEvents }
+  );
+  browser.observer.observe(browser.sentinel);
+  loadMoreEvents();
+}
+
 async function tickLive() {
   try {
     const data = await api("/api/live");
@@ -146,24 +261,81 @@ async function loadCalendar() {
   }
 }
 
-async function loadTopSongs() {
+async function loadDashboard() {
+  // Live counters, month calendar and both top lists in a single request.
   try {
-    const all = await api("/api/top/all");
-    renderTopList(els.topAll, all.items || []);
+    const y = calendarCursor.getFullYear();
+    const m = calendarCursor.getMonth() + 1;
+    const params = new URLSearchParams({ year: y, month: m });
+    if (currentStartupDay) params.set("day", currentStartupDay);
+    const data = await api(`/api/dashboard?${params}`);
+    renderLive(data.live || {});
+    renderCalendar(data.calendar || []);
+    renderTopList(els.topAll, data.top_all || []);
+    if (data.day) renderTopList(els.topDay, data.day.top || []);
   } catch (err) {
     console.error(err);
   }
+}
 
-  if (!currentStartupDay) return;
+function songbookItem(row) {
+  const li = document.createElement("li");
+  const year = row.year ? ` (${row.year})` : "";
+  const preview = document.createElement("button");
+  preview.type = "button";
+  preview.className = "song-preview";
+  preview.textContent = "▶";
+  preview.setAttribute("aria-label", `Ascolta ${row.title}`);
+  preview.addEventListener("click", () => {
+    els.songbookPlayer.src = `/media/${encodeURIComponent(row.code)}`;
+    els.songbookPlayer.play().catch((err) => console.error(err));
+  });
+  li.appendChild(preview);
+  li.appendChild(document.createTextNode(`#${row.code} - ${row.title}${year}`));
+  const plays = document.createElement("span");
+  plays.className = "song-plays";
+  plays.textContent = `${row.count} ${row.count === 1 ? "volta" : "volte"}`;
+  li.appendChild(plays);
+  return li;
+}
 
+async function loadSongbook(reset) {
+  // A newer search invalidates pages still in flight for the previous one.
+  if (reset) {
+    songbook.generation += 1;
+    songbook.nextOffset = 0;
+  } else if (songbook.loading || songbook.nextOffset === null) {
+    return;
+  }
+  const generation = songbook.generation;
+  songbook.loading = true;
+  const params = new URLSearchParams({ q: songbook.query, offset: songbook.nextOffset, limit: SONGBOOK_PAGE_SIZE });
   try {
-    const day = await api(`/api/top/day/${currentStartupDay}`);
-    renderTopList(els.topDay, day.items || []);
+    const page = await api(`/api/catalog/search?${params}`);
+    if (generation !== songbook.generation) return;
+    if (reset) els.songbookList.innerHTML = "";
+    (page.items || []).forEach((row) => els.songbookList.appendChild(songbookItem(row)));
+    songbook.nextOffset = page.next_offset;
+    els.songbookMore.hidden = page.next_offset === null;
+    setText(els.songbookCount, `${page.total} canzoni`);
   } catch (err) {
     console.error(err);
+  } finally {
+    if (generation === songbook.generation) songbook.loading = false;
   }
 }
 
+function setupSongbook() {
+  els.songbookQ.addEventListener("input", () => {
+    clearTimeout(songbook.timer);
+    songbook.timer = setTimeout(() => {
+      songbook.query = els.songbookQ.value.trim();
+      loadSongbook(true);
+    }, 150);
+  });
+  els.songbookMore.addEventListener("click", () => loadSongbook(false));
+}
+
 async function initConfig() {
   try {
     const cfg = await api("/api/config");
@@ -177,6 +349,7 @@ async function initConfig() {
 
 function setupModal() {
   els.modalClose.addEventListener("click", () => els.modal.close());
+  els.mEventsType.addEventListener("change", () => resetEvents(eventsBrowser.day));
   els.modal.addEventListener("click", (ev) => {
     const rect = els.modal.getBoundingClientRect();
     const inside =
@@ -207,11 +380,11 @@ async function boot() {
   setupMonthControls();
   await initConfig();
   await tickLive();
-  await loadCalendar();
-  await loadTopSongs();
+  await loadDashboard();
+  setupSongbook();
+  loadSongbook(true);
   setInterval(tickLive, refreshMs);
-  setInterval(loadCalendar, Math.max(5000, refreshMs * 2));
-  setInterval(loadTopSongs, Math.max(5000, refreshMs * 2));
+  setInterval(loadDashboard, Math.max(5000, refreshMs * 2));
 }
 
 boot();